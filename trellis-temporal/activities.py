@@ -1,56 +1,194 @@
 from __future__ import annotations
 import asyncio
-from typing import Dict, Any
-from decimal import Decimal  # <-- add this
+import functools
+from typing import Awaitable, Callable, Dict, Any, List, Optional, TypeVar
 
 from temporalio import activity
+from temporalio.exceptions import ApplicationError
+import activity_profiles
+import contracts
 import db
+import metrics
 import stubs
+from cache import VersionedLRUCache
+from config import DISPATCH_WORKFLOW_PREFIX, TASK_QUEUE_SHIPPING, ORDER_SNAPSHOT_CACHE_SIZE
 
-@activity.defn
-async def receive_order_act(order_id: str) -> Dict[str, Any]:
-    order = await stubs.order_received(order_id)
-    return {"order_id": order_id, "items": order.get("items", [])}
+CARRIER_CALLS = metrics.Counter(
+    "trellis_carrier_calls_total", "Carrier API calls made by dispatch activities", ("mode",))
+CALL_STALLS = metrics.Counter(
+    "trellis_activity_call_stalls_total", "External calls abandoned by the activity call guard", ("activity",))
 
-@activity.defn
+T = TypeVar("T")
+
+def heartbeating(fn: Callable[..., Awaitable[T]]) -> Callable[..., Awaitable[T]]:
+    """
+    Heartbeat every heartbeat_timeout / 3 for the whole activity body (DB reads and
+    pool waits included), so a dead worker is noticed within heartbeat_s and a slow
+    but live attempt is not timed out. No-op without a heartbeat timeout.
+    """
+    @functools.wraps(fn)
+    async def run(*args: Any, **kwargs: Any) -> T:
+        if not activity.in_activity() or not activity.info().heartbeat_timeout:
+            return await fn(*args, **kwargs)
+        every = activity.info().heartbeat_timeout.total_seconds() / 3
+
+        async def beat() -> None:
+            while True:
+                activity.heartbeat()
+                await asyncio.sleep(every)
+
+        beater = asyncio.ensure_future(beat())
+        try:
+            return await fn(*args, **kwargs)
+        finally:
+            beater.cancel()
+    return run
+
+async def guarded_call(call: Awaitable[T]) -> T:
+    """
+    Await one external call under the running activity's profile (activity_profiles):
+    fail the attempt after call_timeout_s, so a hung call is retried instead of holding
+    the attempt until start-to-close. Heartbeats come from @heartbeating.
+    """
+    if not activity.in_activity():  # called directly (tests, scripts): no profile to apply
+        return await call
+    activity_type = activity.info().activity_type
+    call_timeout = activity_profiles.profile(activity_type).call_timeout_s
+    task = asyncio.ensure_future(call)
+    try:
+        done, _ = await asyncio.wait({task}, timeout=call_timeout)
+        if done:
+            return task.result()
+        CALL_STALLS.inc(activity=activity_type)
+        raise ApplicationError(f"{activity_type}: call stalled for {call_timeout}s", type="ActivityCallStalled")
+    finally:
+        if not task.done():
+            task.cancel()
+
+# claim-check snapshots by order_id; a reference's snapshot_version is the minimum acceptable
+_order_snapshots = VersionedLRUCache(ORDER_SNAPSHOT_CACHE_SIZE)
+
+async def resolve_order(order: dict) -> Dict[str, Any]:
+    """Full order for a claim-check reference (cache, then Postgres); full orders pass through."""
+    if not contracts.is_order_ref(order):
+        return order
+    order_id, version = order["order_id"], order["snapshot_version"]
+    snapshot = _order_snapshots.get(order_id, version)
+    if snapshot is None:
+        row = await db.get_order_snapshot(order_id)
+        if row is None or row[0] < version:
+            # retried by the activity's retry policy
+            raise LookupError(f"order snapshot {order_id} v{version} not found")
+        _order_snapshots.set(order_id, *row)
+        snapshot = row[1]
+    return dict(snapshot)  # callers must not mutate the cached copy
+
+@activity.defn(name=contracts.RECEIVE_ORDER)
+@heartbeating
+async def receive_order_act(order_id: str, claim_check: Optional[dict] = None) -> Dict[str, Any]:
+    """
+    Returns the order, or with claim_check={"address", "version"} stores it as a snapshot
+    and returns only a reference (order_id, snapshot_version, address).
+    """
+    order = await guarded_call(stubs.order_received(order_id))
+    order = {"order_id": order_id, "items": order.get("items", [])}
+    if claim_check is None:
+        return order
+    version, address = claim_check["version"], claim_check["address"]
+    snapshot = {**order, "address": address}
+    await db.store_order_snapshot(order_id, snapshot, version)
+    _order_snapshots.set(order_id, version, snapshot)
+    return {"order_id": order_id, "snapshot_version": version, "address": address}
+
+@activity.defn(name=contracts.SET_ORDER_ADDRESS)
+async def set_order_address_act(order_id: str, address: dict, version: int) -> None:
+    """Move a stored snapshot to a new address (after update_address) under a newer version."""
+    await db.set_snapshot_address(order_id, address, version)
+    cached = _order_snapshots.get(order_id)
+    if cached is not None:
+        _order_snapshots.set(order_id, version, {**cached, "address": address})
+
+@activity.defn(name=contracts.VALIDATE_ORDER)
+@heartbeating
 async def validate_order_act(order: dict) -> Dict[str, Any]:
-    valid = await stubs.order_validated(order)
+    order = await resolve_order(order)
+    valid = await guarded_call(stubs.order_validated(order))
     return {"order_id": order.get("order_id"), "valid": bool(valid)}
 
-@activity.defn
+@activity.defn(name=contracts.CHARGE_PAYMENT)
+@heartbeating
 async def charge_payment_act(order: dict, payment_id: str) -> dict:
     """
     Idempotent payment charge:
       - If payment_id already recorded as charged, return that.
-      - Else perform charge and record it exactly once.
+      - Else perform charge and record it exactly once. A row left at 'created' (an
+        earlier attempt abandoned by the call guard or lost with its worker) is
+        charged again; payment_id is the provider's idempotency key.
     """
+    order = await resolve_order(order)
     order_id = order.get("order_id") or ""
 
-    # 1) try to create a payment row (idempotency key = payment_id)
-    created = await db.try_create_payment(payment_id, order_id)
-    if not created:
-        rec = await db.get_payment(payment_id)
-        amount = rec.get("amount")
-        if isinstance(amount, Decimal):  # normalize Decimal
-            amount = int(amount)
-        return {"status": rec["status"], "amount": amount or 0}
+    # 1) create-or-fetch the payment row in one statement (idempotency key = payment_id)
+    rec = await db.claim_payment(payment_id, order_id)
+    if not rec["created"] and rec["status"] != "created":
+        return {"status": rec["status"], "amount": rec.get("amount") or 0}
 
     # 2) perform the (fake) charge
-    res = await stubs.payment_charged(order, payment_id)
+    res = await guarded_call(stubs.payment_charged(order, payment_id))
     amount = int(res.get("amount") or 0)
 
-    # 3) mark charged + append event
-    await db.mark_payment(payment_id, "charged", amount)
-    await db.append_event(order_id, "payment_charged", {"amount": amount})
+    # 3) mark charged + append event in one transaction
+    await db.complete_payment(payment_id, order_id, "charged", amount)
 
     return {"status": "charged", "amount": amount}
 
-@activity.defn
+@activity.defn(name=contracts.PREPARE_PACKAGE)
+@heartbeating
 async def prepare_package_act(order: dict) -> dict:
-    res = await stubs.package_prepared(order)
+    order = await resolve_order(order)
+    res = await guarded_call(stubs.package_prepared(order))
     return {"status": res}
 
-@activity.defn
+@activity.defn(name=contracts.RELEASE_PACKAGE)
+@heartbeating
+async def release_package_act(order: dict) -> dict:
+    """Undo prepare_package_act (restock) when the order is not going to ship."""
+    order = await resolve_order(order)
+    res = await guarded_call(stubs.package_released(order))
+    return {"status": res}
+
+@activity.defn(name=contracts.DISPATCH_CARRIER)
+@heartbeating
 async def dispatch_carrier_act(order: dict) -> dict:
-    res = await stubs.carrier_dispatched(order)
+    order = await resolve_order(order)
+    CARRIER_CALLS.inc(mode="direct")
+    res = await guarded_call(stubs.carrier_dispatched(order))
     return {"status": res}
+
+@activity.defn(name=contracts.ENQUEUE_DISPATCH)
+async def enqueue_dispatch_act(region: str, package: dict) -> str:
+    """Hand a package to the region's DispatchWorkflow, starting it if needed (signal-with-start)."""
+    dispatcher_id = f"{DISPATCH_WORKFLOW_PREFIX}-{region}"
+    await activity.client().start_workflow(
+        contracts.DISPATCH_WORKFLOW,
+        args=[region, []],
+        id=dispatcher_id,
+        task_queue=TASK_QUEUE_SHIPPING,
+        start_signal=contracts.DISPATCH_ENQUEUE_SIGNAL,
+        start_signal_args=[package],
+    )
+    return dispatcher_id
+
+@activity.defn(name=contracts.DISPATCH_BATCH)
+@heartbeating
+async def dispatch_batch_act(orders: List[dict]) -> List[dict]:
+    """One carrier call for a batch; results line up with `orders`."""
+    orders = list(await asyncio.gather(*(resolve_order(o) for o in orders)))
+    CARRIER_CALLS.inc(mode="batched")
+    statuses = await guarded_call(stubs.carrier_batch_dispatched(orders))
+    return [{"order_id": o.get("order_id"), "status": st} for o, st in zip(orders, statuses)]
+
+@activity.defn(name=contracts.PROJECT_STATUS)
+async def project_status_act(order_id: str, status: dict, version: int) -> None:
+    """Write the workflow's status into the orders read model (served by GET /status)."""
+    await db.upsert_order_status(order_id, status, version)
@@ -0,0 +1,109 @@
+# activity_profiles.py
+"""
+Timeout / retry / heartbeat profile per activity.
+
+Workflows take their schedule options from here (activity_options) and the
+activities take their call guard from the same profile (call_timeout_s), so both
+sides always agree. Defaults below; override any field per activity with JSON,
+either inline in TRELLIS_ACTIVITY_PROFILES or in the file named by
+TRELLIS_ACTIVITY_PROFILES_FILE (inline wins):
+    {"dispatch_carrier_act": {"start_to_close_s": 120, "call_timeout_s": 20, "max_attempts": 5}}
+Timeouts and retry policies are not part of workflow determinism, so profiles
+can change while orders are in flight.
+
+Passed through the workflow sandbox: profiles are parsed once per process.
+"""
+from __future__ import annotations
+import dataclasses
+import json
+from dataclasses import dataclass
+from datetime import timedelta
+from typing import Any, Dict, Optional, Tuple
+
+from temporalio.common import RetryPolicy
+
+import contracts
+from config import ACTIVITY_PROFILES_FILE, ACTIVITY_PROFILES_JSON
+
+@dataclass(frozen=True)
+class ActivityProfile:
+    start_to_close_s: float
+    # heartbeat timeout; None = the activity does not heartbeat (short in-memory / DB calls)
+    heartbeat_s: Optional[float] = None
+    # the external call inside one attempt is abandoned (and the attempt failed) after this long
+    call_timeout_s: Optional[float] = None
+    max_attempts: int = 2
+    initial_interval_s: float = 0.5
+    backoff: float = 1.5
+    max_interval_s: float = 5.0
+    non_retryable: Tuple[str, ...] = ()
+
+    def retry_policy(self) -> RetryPolicy:
+        return RetryPolicy(
+            initial_interval=timedelta(seconds=self.initial_interval_s),
+            backoff_coefficient=self.backoff,
+            maximum_attempts=self.max_attempts,
+            maximum_interval=timedelta(seconds=self.max_interval_s),
+            non_retryable_error_types=list(self.non_retryable),
+        )
+
+# Short: in-process work and single-row DB writes. Heartbeat + call guard: calls to outside
+# services (payment, warehouse, carrier). Sized for the demo stubs and the default 15 s order
+# run timeout; raise call_timeout_s / start_to_close_s together for real providers.
+DEFAULT_PROFILES: Dict[str, ActivityProfile] = {
+    contracts.RECEIVE_ORDER: ActivityProfile(2.0, call_timeout_s=1.0, max_attempts=3),
+    # an order without items stays invalid however often it is retried
+    contracts.VALIDATE_ORDER: ActivityProfile(1.0, call_timeout_s=0.5, max_attempts=3,
+                                              non_retryable=("ValueError",)),
+    contracts.CHARGE_PAYMENT: ActivityProfile(10.0, heartbeat_s=1.0, call_timeout_s=2.0, max_attempts=3),
+    contracts.PREPARE_PACKAGE: ActivityProfile(10.0, heartbeat_s=1.0, call_timeout_s=2.0, max_attempts=3),
+    # a rollback: worth more attempts than the forward step
+    contracts.RELEASE_PACKAGE: ActivityProfile(10.0, heartbeat_s=1.0, call_timeout_s=2.0, max_attempts=5),
+    contracts.DISPATCH_CARRIER: ActivityProfile(30.0, heartbeat_s=1.0, call_timeout_s=3.0, max_attempts=3,
+                                                initial_interval_s=1.0, backoff=2.0, max_interval_s=10.0),
+    # all attempts fit inside DISPATCH_REPLY_TIMEOUT_S (30 s), which the waiting orders give up after
+    contracts.DISPATCH_BATCH: ActivityProfile(30.0, heartbeat_s=2.0, call_timeout_s=8.0, max_attempts=3,
+                                              initial_interval_s=1.0, backoff=2.0, max_interval_s=10.0),
+    contracts.ENQUEUE_DISPATCH: ActivityProfile(5.0, max_attempts=3),
+    contracts.PROJECT_STATUS: ActivityProfile(1.0),
+    contracts.SET_ORDER_ADDRESS: ActivityProfile(1.0, max_attempts=3),
+}
+FALLBACK = ActivityProfile(1.0)
+
+def merge(base: Dict[str, ActivityProfile], overrides: Dict[str, Dict[str, Any]]) -> Dict[str, ActivityProfile]:
+    """Apply per-activity field overrides; unknown activities start from FALLBACK."""
+    fields = {f.name for f in dataclasses.fields(ActivityProfile)}
+    out = dict(base)
+    for name, patch in overrides.items():
+        unknown = set(patch) - fields
+        if unknown:
+            raise ValueError(f"activity profile {name!r}: unknown fields {sorted(unknown)}")
+        if "non_retryable" in patch:
+            patch = {**patch, "non_retryable": tuple(patch["non_retryable"])}
+        out[name] = dataclasses.replace(out.get(name, FALLBACK), **patch)
+    return out
+
+def load(file: str = ACTIVITY_PROFILES_FILE, inline: str = ACTIVITY_PROFILES_JSON) -> Dict[str, ActivityProfile]:
+    profiles = DEFAULT_PROFILES
+    if file:
+        with open(file) as f:
+            profiles = merge(profiles, json.load(f))
+    if inline:
+        profiles = merge(profiles, json.loads(inline))
+    return profiles
+
+PROFILES = load()
+
+def profile(name: str) -> ActivityProfile:
+    return PROFILES.get(name, FALLBACK)
+
+def activity_options(name: str, local: bool = False) -> Dict[str, Any]:
+    """Keyword arguments for workflow.execute_activity / execute_local_activity."""
+    p = profile(name)
+    opts: Dict[str, Any] = {
+        "start_to_close_timeout": timedelta(seconds=p.start_to_close_s),
+        "retry_policy": p.retry_policy(),
+    }
+    if p.heartbeat_s and not local:  # local activities cannot heartbeat to the server
+        opts["heartbeat_timeout"] = timedelta(seconds=p.heartbeat_s)
+    return opts
@@ -0,0 +1,184 @@
+# admission.py
+"""
+Backlog-aware admission control for new order starts.
+
+A background task samples DescribeTaskQueue for the orders and shipping
+queues (workflow + activity task queues) every ADMISSION_SAMPLE_INTERVAL_S
+and caches the result; request handlers only read the cache. A start is
+refused (429 + Retry-After) while any sampled queue is over its backlog
+count / age limit or has fewer pollers than ADMISSION_MIN_POLLERS.
+If the samples are missing or stale the controller fails open.
+"""
+from __future__ import annotations
+import asyncio
+import logging
+import math
+import time
+from dataclasses import asdict, dataclass
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Sequence
+
+from temporalio.api.enums.v1 import TaskQueueType
+from temporalio.api.taskqueue.v1 import TaskQueue
+from temporalio.api.workflowservice.v1 import DescribeTaskQueueRequest
+from temporalio.client import Client
+
+import metrics
+from config import (
+    ADMISSION_MAX_BACKLOG,
+    ADMISSION_MAX_BACKLOG_AGE_S,
+    ADMISSION_MIN_POLLERS,
+    ADMISSION_SAMPLE_INTERVAL_S,
+)
+
+log = logging.getLogger(__name__)
+
+KINDS = {"workflow": TaskQueueType.TASK_QUEUE_TYPE_WORKFLOW,
+         "activity": TaskQueueType.TASK_QUEUE_TYPE_ACTIVITY}
+MAX_RETRY_AFTER_S = 60
+
+ADMISSION_OPEN = metrics.Gauge("trellis_admission_open", "1 while new order starts are admitted")
+QUEUE_BACKLOG = metrics.Gauge(
+    "trellis_task_queue_backlog", "Sampled approximate task-queue backlog", ("queue", "kind"))
+QUEUE_POLLERS = metrics.Gauge(
+    "trellis_task_queue_pollers", "Pollers seen on the task queue", ("queue", "kind"))
+REJECTED = metrics.Counter(
+    "trellis_admission_rejected_total", "Order starts refused by admission control", ("reason",))
+
+@dataclass
+class QueueSample:
+    queue: str
+    kind: str
+    backlog: int
+    backlog_age_s: float
+    pollers: int
+    dispatch_rate: float  # tasks/s, 0 when the server does not report stats
+
+@dataclass
+class Decision:
+    admit: bool
+    reason: str = ""
+    retry_after_s: int = 0
+
+def evaluate(samples: Sequence[QueueSample], max_backlog: int = ADMISSION_MAX_BACKLOG,
+             max_age_s: float = ADMISSION_MAX_BACKLOG_AGE_S,
+             min_pollers: int = ADMISSION_MIN_POLLERS, interval_s: float = ADMISSION_SAMPLE_INTERVAL_S) -> Decision:
+    """Pure decision over one round of samples; the worst queue decides Retry-After."""
+    reasons, retry = [], 0
+    for s in samples:
+        name = f"{s.queue}/{s.kind}"
+        if s.pollers < min_pollers:
+            reasons.append(f"{name}: {s.pollers} pollers")
+            retry = max(retry, math.ceil(interval_s * 2))
+        if s.backlog > max_backlog or s.backlog_age_s > max_age_s:
+            reasons.append(f"{name}: backlog {s.backlog} ({s.backlog_age_s:.1f}s old)")
+            # time to drain the excess at the observed dispatch rate, else one sample interval
+            excess = s.backlog - max_backlog
+            drain = excess / s.dispatch_rate if s.dispatch_rate > 0 and excess > 0 else interval_s
+            retry = max(retry, math.ceil(max(drain, s.backlog_age_s - max_age_s, 1)))
+    if not reasons:
+        return Decision(True)
+    return Decision(False, "; ".join(reasons), min(MAX_RETRY_AFTER_S, max(1, retry)))
+
+async def describe(client: Client, queue: str, kind: str) -> QueueSample:
+    resp = await client.workflow_service.describe_task_queue(DescribeTaskQueueRequest(
+        namespace=client.namespace,
+        task_queue=TaskQueue(name=queue),
+        task_queue_type=KINDS[kind],
+        report_stats=True,
+        include_task_queue_status=True,
+    ))
+    if resp.HasField("stats"):
+        backlog = resp.stats.approximate_backlog_count
+        age = resp.stats.approximate_backlog_age.ToTimedelta().total_seconds()
+        rate = resp.stats.tasks_dispatch_rate
+    else:  # older servers: only the legacy status hint
+        backlog, age, rate = resp.task_queue_status.backlog_count_hint, 0.0, 0.0
+    return QueueSample(queue, kind, int(backlog), age, len(resp.pollers), float(rate))
+
+class AdmissionController:
+    def __init__(self, get_client: Callable[[], Awaitable[Client]], queues: Sequence[str],
+                 interval_s: float = ADMISSION_SAMPLE_INTERVAL_S, enabled: bool = True,
+                 clock: Callable[[], float] = time.monotonic) -> None:
+        self._get_client = get_client
+        self.queues = list(queues)
+        self.interval_s = interval_s
+        self.enabled = enabled
+        self._clock = clock
+        self._samples: List[QueueSample] = []
+        self._sampled_at: Optional[float] = None
+        self._decision = Decision(True)
+        self._error: Optional[str] = None
+        self._task: Optional[asyncio.Task] = None
+
+    @property
+    def stale(self) -> bool:
+        return self._sampled_at is None or self._clock() - self._sampled_at > 3 * self.interval_s
+
+    def record(self, samples: List[QueueSample]) -> None:
+        self._samples, self._sampled_at, self._error = samples, self._clock(), None
+        self._decision = evaluate(samples, interval_s=self.interval_s)
+        for s in samples:
+            QUEUE_BACKLOG.set(s.backlog, queue=s.queue, kind=s.kind)
+            QUEUE_POLLERS.set(s.pollers, queue=s.queue, kind=s.kind)
+
+    async def sample_once(self) -> None:
+        client = await self._get_client()
+        self.record(list(await asyncio.gather(*(
+            describe(client, q, kind) for q in self.queues for kind in KINDS
+        ))))
+
+    async def _run(self) -> None:
+        while True:
+            try:
+                await self.sample_once()
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                self._error = repr(e)
+                log.warning("admission sample failed: %s", e)
+            await asyncio.sleep(self.interval_s)
+
+    def start(self) -> None:
+        if self.enabled and self._task is None:
+            self._task = asyncio.create_task(self._run())
+
+    async def close(self) -> None:
+        task, self._task = self._task, None
+        if task is not None:
+            task.cancel()
+            await asyncio.gather(task, return_exceptions=True)
+
+    def decision(self) -> Decision:
+        """Current decision from the cached samples; fails open when disabled or stale."""
+        admit = not self.enabled or self.stale or self._decision.admit
+        ADMISSION_OPEN.set(1 if admit else 0)
+        return Decision(True) if admit else self._decision
+
+    async def admit(self, max_delay_s: float = 0.0) -> Decision:
+        """
+        Decision for one start. With max_delay_s > 0 a refused start waits (re-reading
+        the cache every half interval) for the backlog to clear before giving up.
+        """
+        loop = asyncio.get_running_loop()
+        deadline = loop.time() + max_delay_s
+        d = self.decision()
+        while not d.admit and loop.time() < deadline:
+            await asyncio.sleep(min(self.interval_s / 2, deadline - loop.time()))
+            d = self.decision()
+        if not d.admit:
+            REJECTED.inc(reason="backlog" if "backlog" in d.reason else "pollers")
+        return d
+
+    def state(self) -> Dict[str, Any]:
+        d = self.decision()
+        age = None if self._sampled_at is None else round(self._clock() - self._sampled_at, 2)
+        return {
+            "enabled": self.enabled,
+            "admit": d.admit,
+            "reason": self._decision.reason or None,
+            "retry_after_s": self._decision.retry_after_s or None,
+            "stale": self.stale,
+            "sample_age_s": age,
+            "last_error": self._error,
+            "queues": [asdict(s) for s in self._samples],
+        }
@@ -1,21 +1,113 @@
 from __future__ import annotations
 
 import asyncio
-from datetime import timedelta
-from typing import Any, Dict
+import base64
+import binascii
+import json
+import time
+import uuid
+import weakref
+from contextlib import asynccontextmanager
+from datetime import datetime, timedelta, timezone
+from typing import Any, Dict, List, Literal, Sequence
 
-from fastapi import FastAPI
-from fastapi.responses import JSONResponse
+from fastapi import FastAPI, Request, Response
+from fastapi.responses import JSONResponse, PlainTextResponse, StreamingResponse
 from pydantic import BaseModel
 
+from temporalio.api.batch.v1 import BatchOperationSignal
+from temporalio.api.enums.v1 import BatchOperationState
+from temporalio.api.workflowservice.v1 import DescribeBatchOperationRequest, StartBatchOperationRequest
 from temporalio.client import Client
-from temporalio import service as temporal_service
+from temporalio.common import WorkflowIDReusePolicy
+from temporalio.exceptions import WorkflowAlreadyStartedError
 
-from config import TASK_QUEUE_ORDERS
-from workflows import OrderWorkflow
+import db
+import export
+from admission import AdmissionController
+import metrics
+import search_attributes
+import tracing
+from cache import TTLCache
+from client_pool import ClientPool
+from status_stream import StatusHub, is_terminal
+from config import (
+    TASK_QUEUE_ORDERS,
+    BATCH_START_CONCURRENCY,
+    BATCH_START_MAX_ORDERS,
+    STATUS_CACHE_TTL_S,
+    STATUS_CACHE_MAX_ENTRIES,
+    ORDER_RUN_TIMEOUT_S,
+    EVENTS_PAGE_DEFAULT,
+    EVENTS_PAGE_MAX,
+    ORDERS_PAGE_DEFAULT,
+    ORDERS_PAGE_MAX,
+    STATUS_STREAM_HEARTBEAT_S,
+    STATUS_LONG_POLL_MAX_S,
+    TEMPORAL_ADDRESS,
+    TEMPORAL_CLIENT_POOL_SIZE,
+    TASK_QUEUE_SHIPPING,
+    ADMISSION_ENABLED,
+    ADMISSION_MODE,
+    ADMISSION_MAX_DELAY_S,
+    BULK_SIGNAL_CONCURRENCY,
+    BULK_MAX_ORDERS,
+    EXPORT_MAX_CONCURRENT,
+)
+from workflows import OrderWorkflow, order_options
 
-app = FastAPI()
-_client: Client | None = None
+# None = no cap, for reviews that outlive any fixed timeout (see TRELLIS_ORDER_RUN_TIMEOUT_S)
+ORDER_RUN_TIMEOUT = timedelta(seconds=ORDER_RUN_TIMEOUT_S) if ORDER_RUN_TIMEOUT_S > 0 else None
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    tracing.setup("trellis-api")
+    try:
+        await _clients.connect()
+    except Exception as e:
+        # keep serving DB-backed endpoints; the first Temporal call retries the connect
+        print(f"[api] Temporal not reachable at {TEMPORAL_ADDRESS} yet: {e!r}", flush=True)
+    _admission.start()
+    yield
+    await _admission.close()
+    await _status_hub.close()
+    await db.close_pool()
+
+app = FastAPI(lifespan=lifespan)
+_clients = ClientPool(TEMPORAL_ADDRESS, TEMPORAL_CLIENT_POOL_SIZE)
+_admission = AdmissionController(lambda: _clients.get(), [TASK_QUEUE_ORDERS, TASK_QUEUE_SHIPPING],
+                                 enabled=ADMISSION_ENABLED)
+_status_cache = TTLCache(STATUS_CACHE_TTL_S, STATUS_CACHE_MAX_ENTRIES)
+# one LISTEN connection fans status changes out to every stream / long-poll in this process
+_status_hub = StatusHub()
+metrics.Gauge("trellis_status_stream_subscribers", "Open status streams and long-polls",
+              fn=_status_hub.subscriber_count)
+
+HTTP_SECONDS = metrics.Histogram(
+    "trellis_http_request_seconds", "API request latency until the response starts", ("method", "route", "status"))
+HTTP_IN_FLIGHT = metrics.Gauge("trellis_http_requests_in_flight", "API requests being handled")
+
+@app.middleware("http")
+async def observe_requests(request: Request, call_next):
+    """Latency per route template (not raw path, which would carry order ids), in a trace span."""
+    HTTP_IN_FLIGHT.inc()
+    status = 500
+    t0 = time.perf_counter()
+    try:
+        # the span is current while the endpoint runs, so Temporal calls it makes become its children
+        with tracing.span(f"{request.method} {request.url.path}") as span:
+            response = await call_next(request)
+            status = response.status_code
+            if span is not None:
+                route = request.scope.get("route")
+                span.update_name(f"{request.method} {getattr(route, 'path', request.url.path)}")
+                span.set_attribute("http.status_code", status)
+            return response
+    finally:
+        route = request.scope.get("route")
+        HTTP_SECONDS.observe(time.perf_counter() - t0, method=request.method,
+                             route=getattr(route, "path", "unmatched"), status=str(status))
+        HTTP_IN_FLIGHT.dec()
 
 class StartBody(BaseModel):
     payment_id: str
@@ -24,69 +116,258 @@ class StartBody(BaseModel):
 class AddressBody(BaseModel):
     address: Dict[str, Any]
 
+class BatchItem(BaseModel):
+    order_id: str
+    payment_id: str
+    address: Dict[str, Any]
+
+class BatchStartBody(BaseModel):
+    orders: List[BatchItem]
+
+class BulkSignalBody(BaseModel):
+    # selects running orders through the OrderStep / OrderCity search attributes
+    step: str = "manual_review"
+    city: str | None = None
+    # fanout only (default BULK_MAX_ORDERS); a batch operation signals every match
+    limit: int | None = None
+    # fanout: signals sent from this process; batch: one server-side batch operation
+    mode: Literal["fanout", "batch"] = "fanout"
+    reason: str = ""
+
 async def get_client() -> Client:
-    global _client
-    if _client is None:
-        _client = await Client.connect("localhost:7233")
-    return _client
+    """Next client from the pool (connected at startup; retried here if that failed)."""
+    return await _clients.get()
 
 @app.get("/health")
 async def health():
+    """Real round trip: gRPC health check on every pooled channel."""
     try:
-        await get_client()
-        return {"ok": True}
+        if not await _clients.check_health():
+            return JSONResponse(status_code=500, content={"error": "temporal health check failed"})
+        return {"ok": True, "channels": _clients.size}
     except Exception as e:
         return JSONResponse(status_code=500, content={"error": repr(e)})
 
+async def _admit_start() -> JSONResponse | None:
+    """None if a new order may start now, else the 429 to return (see admission.py)."""
+    d = await _admission.admit(ADMISSION_MAX_DELAY_S if ADMISSION_MODE == "delay" else 0.0)
+    if d.admit:
+        return None
+    return JSONResponse(status_code=429, headers={"Retry-After": str(d.retry_after_s)},
+                        content={"error": "workers are behind; retry later", "reason": d.reason})
+
+@app.get("/admission")
+async def admission_state():
+    return _admission.state()
+
+async def _start_order(client: Client, order_id: str, payment_id: str, address: Dict[str, Any]):
+    return await client.start_workflow(
+        OrderWorkflow.run,
+        id=f"order-{order_id}",
+        task_queue=TASK_QUEUE_ORDERS,
+        args=[order_id, payment_id, address, order_options()],
+        run_timeout=ORDER_RUN_TIMEOUT,
+        rpc_timeout=timedelta(seconds=30),
+    )
+
+@app.get("/metrics")
+async def metrics_endpoint():
+    return PlainTextResponse(metrics.render(), media_type=metrics.CONTENT_TYPE)
+
+# Declared before /orders/{order_id}/start so "batch" is not taken as an order_id
+@app.post("/orders/batch/start")
+async def start_batch(body: BatchStartBody):
+    if len(body.orders) > BATCH_START_MAX_ORDERS:
+        return JSONResponse(status_code=413, content={
+            "error": f"batch has {len(body.orders)} orders; at most {BATCH_START_MAX_ORDERS} per request"})
+    # the whole batch is admitted or refused: partial intake would be harder to retry
+    refused = await _admit_start()
+    if refused is not None:
+        return refused
+    try:
+        client = await get_client()
+    except Exception as e:
+        return JSONResponse(status_code=400, content={"error": repr(e)})
+
+    sem = asyncio.Semaphore(max(1, BATCH_START_CONCURRENCY))
+
+    async def start_one(item: BatchItem) -> Dict[str, Any]:
+        wf_id = f"order-{item.order_id}"
+        async with sem:
+            try:
+                await _start_order(client, item.order_id, item.payment_id, item.address)
+                return {"order_id": item.order_id, "workflow_id": wf_id, "status": "started"}
+            except WorkflowAlreadyStartedError:
+                return {"order_id": item.order_id, "workflow_id": wf_id, "status": "already_exists"}
+            except Exception as e:
+                return {"order_id": item.order_id, "workflow_id": wf_id, "status": "error", "error": repr(e)}
+
+    # gather keeps results in request order
+    results = await asyncio.gather(*(start_one(item) for item in body.orders))
+    counts: Dict[str, int] = {}
+    for r in results:
+        counts[r["status"]] = counts.get(r["status"], 0) + 1
+    return {"results": results, "counts": counts}
+
+def _encode_page_token(token: bytes | None) -> str | None:
+    return base64.urlsafe_b64encode(token).decode() if token else None
+
+def _decode_page_token(token: str | None) -> bytes | None:
+    return base64.urlsafe_b64decode(token.encode()) if token else None
+
+@app.get("/orders")
+async def list_orders(step: str | None = None, city: str | None = None, approved: bool | None = None,
+                      running: bool = True, page_size: int = ORDERS_PAGE_DEFAULT,
+                      next_page_token: str | None = None):
+    """One visibility page of orders matching the search attributes; pass next_page_token back for more."""
+    query = search_attributes.order_query(step, city, approved, running_only=running)
+    try:
+        token = _decode_page_token(next_page_token)
+    except (binascii.Error, ValueError):
+        return JSONResponse(status_code=400, content={"error": "invalid next_page_token"})
+    try:
+        client = await get_client()
+        it = client.list_workflows(query, page_size=max(1, min(page_size, ORDERS_PAGE_MAX)),
+                                   next_page_token=token)
+        await it.fetch_next_page()
+    except Exception as e:
+        return JSONResponse(status_code=400, content={"error": repr(e)})
+    sa = search_attributes
+    orders = [{
+        "workflow_id": wf.id,
+        "run_id": wf.run_id,
+        "status": wf.status.name if wf.status else None,
+        "step": wf.typed_search_attributes.get(sa.ORDER_STEP),
+        "city": wf.typed_search_attributes.get(sa.ORDER_CITY),
+        "approved": wf.typed_search_attributes.get(sa.ORDER_APPROVED),
+        "start_time": wf.start_time.isoformat(),
+    } for wf in it.current_page or []]
+    return {"query": query, "orders": orders, "next_page_token": _encode_page_token(it.next_page_token)}
+
+BULK_SIGNALS = {"approve", "cancel"}
+
+async def _bulk_fanout(client: Client, query: str, signal: str, limit: int) -> Dict[str, Any]:
+    """Signal every running match from here, BULK_SIGNAL_CONCURRENCY at a time, while paging."""
+    sem = asyncio.Semaphore(max(1, BULK_SIGNAL_CONCURRENCY))
+    counts: Dict[str, int] = {}
+    failed: List[Dict[str, str]] = []
+
+    async def signal_one(wf_id: str) -> None:
+        async with sem:
+            try:
+                # plain signal, not signal-with-start: the order may finish in the meantime
+                await client.get_workflow_handle(wf_id).signal(signal)
+                counts["signaled"] = counts.get("signaled", 0) + 1
+            except Exception as e:
+                counts["error"] = counts.get("error", 0) + 1
+                if len(failed) < 100:
+                    failed.append({"workflow_id": wf_id, "error": repr(e)})
+
+    tasks = []
+    async for wf in client.list_workflows(query, limit=limit):
+        tasks.append(asyncio.create_task(signal_one(wf.id)))
+    await asyncio.gather(*tasks)
+    return {"mode": "fanout", "matched": len(tasks), "counts": counts, "failed": failed}
+
+async def _bulk_batch(client: Client, query: str, signal: str, reason: str) -> Dict[str, Any]:
+    """Hand the whole query to the server as one batch operation; poll /orders/bulk/jobs/{job_id}."""
+    job_id = f"orders-{signal}-{uuid.uuid4().hex[:12]}"
+    await client.workflow_service.start_batch_operation(StartBatchOperationRequest(
+        namespace=client.namespace,
+        visibility_query=query,
+        job_id=job_id,
+        reason=reason or f"bulk {signal} via api",
+        signal_operation=BatchOperationSignal(signal=signal, identity=client.identity),
+    ))
+    return {"mode": "batch", "job_id": job_id}
+
+# Declared before the /orders/{order_id}/... routes
+@app.post("/orders/bulk/{action}")
+async def bulk_signal(action: str, body: BulkSignalBody):
+    """
+    Signal every running order matching step/city. Fan-out stops after `limit` orders;
+    batch mode is unbounded (the server signals every match), so `limit` is refused there.
+    """
+    if action not in BULK_SIGNALS:
+        return JSONResponse(status_code=404, content={"error": f"unknown bulk action {action!r}"})
+    if body.mode == "batch" and body.limit is not None:
+        return JSONResponse(status_code=400, content={
+            "error": "limit applies to mode=fanout only; a batch operation signals every match"})
+    query = search_attributes.order_query(body.step, body.city)
+    try:
+        client = await get_client()
+        if body.mode == "batch":
+            result = await _bulk_batch(client, query, action, body.reason)
+        else:
+            limit = BULK_MAX_ORDERS if body.limit is None else body.limit
+            result = await _bulk_fanout(client, query, action, max(1, min(limit, BULK_MAX_ORDERS)))
+        return {"action": action, "query": query, **result}
+    except Exception as e:
+        return JSONResponse(status_code=400, content={"error": repr(e)})
+
+@app.get("/orders/bulk/jobs/{job_id}")
+async def bulk_job(job_id: str):
+    try:
+        client = await get_client()
+        d = await client.workflow_service.describe_batch_operation(
+            DescribeBatchOperationRequest(namespace=client.namespace, job_id=job_id))
+    except Exception as e:
+        return JSONResponse(status_code=400, content={"error": repr(e)})
+    return {
+        "job_id": d.job_id,
+        "state": BatchOperationState.Name(d.state).removeprefix("BATCH_OPERATION_STATE_").lower(),
+        "total": d.total_operation_count,
+        "completed": d.complete_operation_count,
+        "failed": d.failure_operation_count,
+        "reason": d.reason,
+    }
+
 @app.post("/orders/{order_id}/start")
 async def start(order_id: str, body: StartBody):
+    refused = await _admit_start()
+    if refused is not None:
+        return refused
     try:
         client = await get_client()
-        h = await client.start_workflow(
-            OrderWorkflow.run,
-            id=f"order-{order_id}",
-            task_queue=TASK_QUEUE_ORDERS,
-            args=[order_id, body.payment_id, body.address],
-            run_timeout=timedelta(seconds=15),
-            rpc_timeout=timedelta(seconds=30),
-        )
+        h = await _start_order(client, order_id, body.payment_id, body.address)
         return {"workflow_id": h.id}
     except Exception as e:
         return JSONResponse(status_code=400, content={"error": repr(e)})
 
+# Placeholder payment ids for runs created by a signal that beat the real start
+SIGNAL_PLACEHOLDERS = {
+    "approve": "__approve_only__",
+    "update_address": "__update_only__",
+    "cancel": "__cancel_only__",
+}
+
+async def dispatch_signal(client: Client, order_id: str, signal: str, args: Sequence[Any] = (),
+                          address: Dict[str, Any] | None = None,
+                          reuse_policy: WorkflowIDReusePolicy = WorkflowIDReusePolicy.ALLOW_DUPLICATE):
+    """
+    Deliver `signal` to order-{order_id} with one signal-with-start RPC:
+      - running workflow -> signal is appended to it (start args ignored),
+      - otherwise        -> a placeholder run is started with the signal already in history.
+    No polling: the signal is durable once this returns.
+    """
+    return await client.start_workflow(
+        OrderWorkflow.run,
+        id=f"order-{order_id}",
+        task_queue=TASK_QUEUE_ORDERS,
+        args=[order_id, SIGNAL_PLACEHOLDERS[signal], address or {}, order_options()],
+        id_reuse_policy=reuse_policy,
+        run_timeout=ORDER_RUN_TIMEOUT,
+        rpc_timeout=timedelta(seconds=30),
+        start_signal=signal,
+        start_signal_args=args,
+    )
+
 @app.post("/orders/{order_id}/signals/approve")
 async def approve(order_id: str):
     try:
         client = await get_client()
-        wf_id = f"order-{order_id}"
-        h = client.get_workflow_handle(wf_id)
-        try:
-            await h.signal("approve")
-            return {"ok": True, "path": "signal"}
-        except temporal_service.RPCError as e:
-            if getattr(e, "status", None) != temporal_service.RPCStatusCode.NOT_FOUND:
-                return JSONResponse(status_code=400, content={"error": str(e)})
-        try:
-            await client.start_workflow(
-                OrderWorkflow.run,
-                id=wf_id,
-                task_queue=TASK_QUEUE_ORDERS,
-                args=[order_id, "__approve_only__", {}],
-                run_timeout=timedelta(seconds=15),
-                rpc_timeout=timedelta(seconds=30),
-            )
-        except temporal_service.RPCError as se:
-            if getattr(se, "status", None) != temporal_service.RPCStatusCode.ALREADY_EXISTS:
-                return JSONResponse(status_code=400, content={"error": str(se)})
-        for attempt in range(18):
-            try:
-                await h.signal("approve")
-                return {"ok": True, "path": "start_then_signal", "attempt": attempt + 1}
-            except temporal_service.RPCError as e2:
-                if getattr(e2, "status", None) == temporal_service.RPCStatusCode.NOT_FOUND:
-                    await asyncio.sleep(0.2); continue
-                return JSONResponse(status_code=400, content={"error": str(e2)})
-        return JSONResponse(status_code=409, content={"error": "workflow not found after retries"})
+        h = await dispatch_signal(client, order_id, "approve")
+        return {"ok": True, "path": "signal_with_start", "run_id": h.result_run_id}
     except Exception as e:
         return JSONResponse(status_code=400, content={"error": repr(e)})
 
@@ -94,16 +375,12 @@ async def approve(order_id: str):
 async def cancel(order_id: str):
     try:
         client = await get_client()
-        h = client.get_workflow_handle(f"order-{order_id}")
-        for attempt in range(18):
-            try:
-                await h.signal("cancel")
-                return {"ok": True, "attempt": attempt + 1}
-            except temporal_service.RPCError as e:
-                if getattr(e, "status", None) == temporal_service.RPCStatusCode.NOT_FOUND:
-                    await asyncio.sleep(0.2); continue
-                return JSONResponse(status_code=400, content={"error": str(e)})
-        return JSONResponse(status_code=409, content={"error": "workflow not found"})
+        # Never open a new run for an order that already finished
+        h = await dispatch_signal(client, order_id, "cancel",
+                                  reuse_policy=WorkflowIDReusePolicy.REJECT_DUPLICATE)
+        return {"ok": True, "path": "signal_with_start", "run_id": h.result_run_id}
+    except WorkflowAlreadyStartedError:
+        return JSONResponse(status_code=409, content={"error": "workflow already closed"})
     except Exception as e:
         return JSONResponse(status_code=400, content={"error": repr(e)})
 
@@ -111,50 +388,162 @@ async def cancel(order_id: str):
 async def update_address(order_id: str, body: AddressBody):
     try:
         client = await get_client()
-        wf_id = f"order-{order_id}"
-        h = client.get_workflow_handle(wf_id)
-        try:
-            await h.signal("update_address", body.address)
-            return {"ok": True, "path": "signal"}
-        except temporal_service.RPCError as e:
-            if getattr(e, "status", None) != temporal_service.RPCStatusCode.NOT_FOUND:
-                return JSONResponse(status_code=400, content={"error": str(e)})
-        try:
-            await client.start_workflow(
-                OrderWorkflow.run,
-                id=wf_id,
-                task_queue=TASK_QUEUE_ORDERS,
-                args=[order_id, "__update_only__", body.address],
-                run_timeout=timedelta(seconds=15),
-                rpc_timeout=timedelta(seconds=30),
-            )
-        except temporal_service.RPCError as se:
-            if getattr(se, "status", None) != temporal_service.RPCStatusCode.ALREADY_EXISTS:
-                return JSONResponse(status_code=400, content={"error": str(se)})
-        for attempt in range(18):
-            try:
-                await h.signal("update_address", body.address)
-                return {"ok": True, "path": "start_then_signal", "attempt": attempt + 1}
-            except temporal_service.RPCError as e2:
-                if getattr(e2, "status", None) == temporal_service.RPCStatusCode.NOT_FOUND:
-                    await asyncio.sleep(0.2); continue
-                return JSONResponse(status_code=400, content={"error": str(e2)})
-        return JSONResponse(status_code=409, content={"error": "workflow not found after retries"})
+        h = await dispatch_signal(client, order_id, "update_address", [body.address], address=body.address)
+        return {"ok": True, "path": "signal_with_start", "run_id": h.result_run_id}
     except Exception as e:
         return JSONResponse(status_code=400, content={"error": repr(e)})
 
+def _etag_matches(header: str | None, etag: str) -> bool:
+    if not header:
+        return False
+    tags = [t.strip() for t in header.split(",")]
+    return "*" in tags or etag in tags or f"W/{etag}" in tags
+
 @app.get("/orders/{order_id}/status")
-async def status(order_id: str):
+async def status(order_id: str, request: Request, consistency: str = "cached"):
+    """
+    Default: served from the orders read model through a short TTL cache, with
+    ETag / If-None-Match. consistency=strong queries the workflow itself.
+    """
+    if consistency == "strong":
+        try:
+            client = await get_client()
+            h = client.get_workflow_handle(f"order-{order_id}")
+            state = await h.query("status", rpc_timeout=timedelta(seconds=20))
+            return state
+        except Exception as e:
+            msg = repr(e)
+            if "NOT_FOUND" in msg or "not found" in msg.lower():
+                return JSONResponse(status_code=404, content={"error": "workflow not found"})
+            return JSONResponse(status_code=400, content={"error": msg})
+
     try:
-        client = await get_client()
-        h = client.get_workflow_handle(f"order-{order_id}")
-        state = await h.query("status", rpc_timeout=timedelta(seconds=20))
-        return state
+        row = await _status_cache.get_or_load(order_id, lambda: db.get_order_status(order_id))
+    except Exception as e:
+        return JSONResponse(status_code=400, content={"error": repr(e)})
+    if row is None:
+        return JSONResponse(status_code=404, content={"error": "order not found"})
+    etag = f'"{row["version"]}"'
+    if _etag_matches(request.headers.get("if-none-match"), etag):
+        return Response(status_code=304, headers={"ETag": etag})
+    body = {k: row[k] for k in ("approved", "canceled", "step", "active", "address")}
+    return JSONResponse(content=body, headers={"ETag": etag})
+
+@app.get("/orders/{order_id}/events")
+async def order_events(order_id: str, limit: int = EVENTS_PAGE_DEFAULT, cursor: str | None = None):
+    """
+    Audit trail, oldest first, one page at a time. Pass the returned next_cursor
+    back as `cursor` for the next page; next_cursor is null on the last page.
+    Keyset pagination: every page is one index range scan, however deep.
+    """
+    limit = max(1, min(limit, EVENTS_PAGE_MAX))
+    try:
+        after = db.decode_event_cursor(cursor) if cursor else None
+        rows = await db.list_order_events(order_id, limit + 1, after)
+    except Exception as e:
+        return JSONResponse(status_code=400, content={"error": repr(e)})
+    page = rows[:limit]
+    next_cursor = (db.encode_event_cursor(page[-1]["created_at"], page[-1]["id"])
+                   if len(rows) > limit else None)
+    events = [{**r, "created_at": r["created_at"].isoformat()} for r in page]
+    return {"events": events, "next_cursor": next_cursor}
+
+def _naive_utc(ts: datetime) -> datetime:
+    # created_at columns are naive UTC timestamps
+    return ts.astimezone(timezone.utc).replace(tzinfo=None) if ts.tzinfo else ts
+
+@app.get("/export/{table}")
+async def export_rows(table: str, start: datetime, end: datetime,
+                      event_type: str | None = None, format: str = "ndjson"):
+    """
+    Bulk extract of `events` or `payments` with start <= created_at < end (UTC, unordered),
+    as NDJSON or CSV. Streamed from a server-side cursor: memory stays flat at any size.
+    """
+    if table not in db.EXPORT_COLUMNS:
+        return JSONResponse(status_code=404, content={"error": f"unknown table {table!r}"})
+    if format not in export.MEDIA_TYPES:
+        return JSONResponse(status_code=400, content={"error": f"format must be one of {sorted(export.MEDIA_TYPES)}"})
+    if event_type is not None and table != "events":
+        return JSONResponse(status_code=400, content={"error": "event_type only applies to events"})
+    slot = db.reserve_export(EXPORT_MAX_CONCURRENT)
+    if slot is None:
+        return JSONResponse(status_code=429, headers={"Retry-After": "30"},
+                            content={"error": f"{EXPORT_MAX_CONCURRENT} exports already running"})
+
+    rows = db.stream_export(table, _naive_utc(start), _naive_utc(end), event_type,
+                            as_json=format == "ndjson", slot=slot)
+    # a stream that never starts (client gone before the body) never reaches its finally
+    weakref.finalize(rows, slot.release)
+    if format == "ndjson":
+        body = export.ndjson_chunks(rows)
+    else:
+        body = export.csv_chunks(rows, db.EXPORT_COLUMNS[table])
+    filename = f"{table}-{start:%Y%m%dT%H%M%S}-{end:%Y%m%dT%H%M%S}.{format}"
+    return StreamingResponse(body, media_type=export.MEDIA_TYPES[format],
+                             headers={"Content-Disposition": f'attachment; filename="{filename}"'})
+
+STREAM_FIELDS = ("order_id", "step", "active", "approved", "canceled", "version")
+
+def _stream_status(order_id: str, row: Dict[str, Any]) -> Dict[str, Any]:
+    return {k: row[k] for k in STREAM_FIELDS if k in row} | {"order_id": order_id}
+
+def _sse(status: Dict[str, Any]) -> str:
+    return f"event: status\nid: {status['version']}\ndata: {json.dumps(status)}\n\n"
+
+@app.get("/orders/{order_id}/status/stream")
+async def status_stream(order_id: str):
+    """
+    Server-Sent Events: the current status, then one `status` event per step / flag
+    change until the order is done or canceled. Comment heartbeats keep proxies open;
+    each heartbeat also re-reads the read model so a dropped LISTEN connection heals.
+    """
+    try:
+        await _status_hub.start()
     except Exception as e:
-        msg = repr(e)
-        if "NOT_FOUND" in msg or "not found" in msg.lower():
-            return JSONResponse(status_code=404, content={"error": "workflow not found"})
-        return JSONResponse(status_code=400, content={"error": msg})
+        return JSONResponse(status_code=400, content={"error": repr(e)})
+
+    async def events():
+        with _status_hub.subscribe(order_id) as q:
+            last = -1
+            row = await db.get_order_status(order_id)
+            while True:
+                if row is not None and row["version"] > last:
+                    last = row["version"]
+                    status = _stream_status(order_id, row)
+                    yield _sse(status)
+                    if is_terminal(status):
+                        return
+                try:
+                    row = await asyncio.wait_for(q.get(), STATUS_STREAM_HEARTBEAT_S)
+                except asyncio.TimeoutError:
+                    yield ": keep-alive\n\n"
+                    row = await db.get_order_status(order_id)
+
+    return StreamingResponse(events(), media_type="text/event-stream",
+                             headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"})
+
+@app.get("/orders/{order_id}/status/wait")
+async def status_wait(order_id: str, since_step: str | None = None, timeout: float = STATUS_LONG_POLL_MAX_S):
+    """
+    Long-poll: returns as soon as the order's step differs from since_step (immediately
+    if it already does), or 204 after `timeout` seconds (capped) with no change.
+    """
+    timeout = max(0.0, min(timeout, STATUS_LONG_POLL_MAX_S))
+    try:
+        await _status_hub.start()
+        with _status_hub.subscribe(order_id) as q:
+            row = await db.get_order_status(order_id)
+            if row is None or row["step"] == since_step:
+                row = await _status_hub.next_change(q, since_step, timeout)
+            if row is None:  # one direct read in case a notification was missed
+                row = await db.get_order_status(order_id)
+                if row is not None and row["step"] == since_step:
+                    row = None
+    except Exception as e:
+        return JSONResponse(status_code=400, content={"error": repr(e)})
+    if row is None:
+        return Response(status_code=204)
+    return _stream_status(order_id, row)
 
 @app.post("/demo/run")
 async def run_demo():
@@ -165,8 +554,8 @@ async def run_demo():
             OrderWorkflow.run,
             id=f"order-{order_id}",
             task_queue=TASK_QUEUE_ORDERS,
-            args=[order_id, "pay-demo", {"city": "Amherst"}],
-            run_timeout=timedelta(seconds=15),
+            args=[order_id, "pay-demo", {"city": "Amherst"}, order_options()],
+            run_timeout=ORDER_RUN_TIMEOUT,
             rpc_timeout=timedelta(seconds=30),
         )
         await asyncio.sleep(1.0)
@@ -0,0 +1 @@
+# Benchmarks: run from the trellis-temporal folder, e.g. `python -m bench.batch_start`
@@ -0,0 +1,118 @@
+# bench/_harness.py
+"""
+Shared pieces for benchmarks that run real workflows: an in-process worker
+on private task queues and a driver that starts, approves and measures orders.
+
+Queue names come from TRELLIS_TASK_QUEUE_* (read by config at import), so
+callers that need a different worker configuration per run do it in a child
+process via run_in_subprocess().
+"""
+import asyncio
+import contextlib
+import json
+import os
+import subprocess
+import sys
+import time
+import uuid
+from datetime import timedelta
+from typing import Any, Dict, List
+
+from temporalio.api.enums.v1 import EventType
+from temporalio.client import Client
+
+
+def private_queue_env(tag: str) -> Dict[str, str]:
+    run = uuid.uuid4().hex[:6]
+    # stubs answer at once unless simulator profiles are given (TRELLIS_SIM_PROFILES[_FILE])
+    simulated = bool(os.getenv("TRELLIS_SIM_PROFILES_FILE") or os.getenv("TRELLIS_SIM_PROFILES"))
+    return {
+        "TRELLIS_TASK_QUEUE_ORDERS": f"bench-{tag}-orders-{run}",
+        "TRELLIS_TASK_QUEUE_SHIPPING": f"bench-{tag}-shipping-{run}",
+        "TRELLIS_DEMO_OK": "0" if simulated else "1",
+        "TRELLIS_WORKER_METRICS_PORT": "0",
+        "TRELLIS_DISPATCH_WORKFLOW_PREFIX": f"bench-{tag}-dispatch-{run}",
+    }
+
+
+def run_in_subprocess(module: str, env: Dict[str, str], args: List[str]) -> Dict[str, Any]:
+    """Run `python -m module --child ...` with extra env and parse its JSON stdout."""
+    out = subprocess.run(
+        [sys.executable, "-m", module, "--child", *args],
+        env={**os.environ, **env}, capture_output=True, text=True,
+    )
+    if out.returncode != 0:
+        raise RuntimeError(f"{module} child failed:\n{out.stderr}")
+    return json.loads(out.stdout)
+
+
+@contextlib.asynccontextmanager
+async def in_process_workers(client: Client):
+    import worker as worker_mod
+
+    async with contextlib.AsyncExitStack() as stack:
+        for q in worker_mod.QUEUES:
+            await stack.enter_async_context(worker_mod.build_worker(client, q))
+        yield
+
+
+async def history_stats(client: Client, workflow_id: str) -> Dict[str, int]:
+    """Event count and serialized bytes for a workflow plus the children it started."""
+    events = bytes_ = 0
+    pending = [(workflow_id, None)]
+    while pending:
+        wf_id, run_id = pending.pop()
+        hist = await client.get_workflow_handle(wf_id, run_id=run_id).fetch_history()
+        for e in hist.events:
+            events += 1
+            bytes_ += e.ByteSize()
+            if e.event_type == EventType.EVENT_TYPE_CHILD_WORKFLOW_EXECUTION_STARTED:
+                ex = e.child_workflow_execution_started_event_attributes.workflow_execution
+                pending.append((ex.workflow_id, ex.run_id))
+    return {"events": events, "bytes": bytes_}
+
+
+async def drive_orders(client: Client, n: int, concurrency: int = 10,
+                       order_args=lambda order_id: [order_id, f"pay-{order_id}", {"city": "Amherst"}],
+                       run_timeout: float = 60.0) -> Dict[str, Any]:
+    """Start n orders, approve each immediately (signal is buffered until review), await results."""
+    from config import TASK_QUEUE_ORDERS
+    from workflows import OrderWorkflow, order_options
+
+    sem = asyncio.Semaphore(concurrency)
+    latencies: List[float] = []
+    stats: List[Dict[str, int]] = []
+    failures = 0
+
+    async def one() -> None:
+        nonlocal failures
+        order_id = f"bench-{uuid.uuid4().hex[:10]}"
+        async with sem:
+            t0 = time.perf_counter()
+            h = await client.start_workflow(
+                OrderWorkflow.run, id=f"order-{order_id}", task_queue=TASK_QUEUE_ORDERS,
+                args=[*order_args(order_id), order_options()], run_timeout=timedelta(seconds=run_timeout),
+            )
+            await h.signal("approve")
+            try:
+                await h.result()
+            except Exception:
+                failures += 1
+                return
+            latencies.append((time.perf_counter() - t0) * 1000)
+            stats.append(await history_stats(client, h.id))
+
+    t0 = time.perf_counter()
+    await asyncio.gather(*(one() for _ in range(n)))
+    elapsed = time.perf_counter() - t0
+    latencies.sort()
+    pick = lambda q: round(latencies[min(len(latencies) - 1, int(q * len(latencies)))], 1) if latencies else None
+    return {
+        "orders": n,
+        "failures": failures,
+        "completions_per_s": round(len(latencies) / elapsed, 2),
+        "e2e_p50_ms": pick(0.5),
+        "e2e_p95_ms": pick(0.95),
+        "history_events_per_order": round(sum(s["events"] for s in stats) / max(1, len(stats)), 1),
+        "history_bytes_per_order": round(sum(s["bytes"] for s in stats) / max(1, len(stats)), 1),
+    }
@@ -0,0 +1,79 @@
+# bench/batch_start.py
+"""
+Order intake throughput: N single POST /orders/{id}/start calls vs the same
+N orders sent through POST /orders/batch/start in chunks.
+
+Needs the API, worker and infra running (see README). Example:
+    python -m bench.batch_start --orders 2000 --chunk 500 --http-concurrency 64
+"""
+import argparse
+import asyncio
+import json
+import os
+import time
+import uuid
+
+import httpx
+
+BASE = os.getenv("API_BASE", "http://127.0.0.1:8000")
+
+
+def _orders(n: int, tag: str) -> list:
+    run = uuid.uuid4().hex[:6]
+    return [
+        {"order_id": f"bench-{tag}-{run}-{i}", "payment_id": f"pay-{tag}-{run}-{i}",
+         "address": {"city": "Amherst"}}
+        for i in range(n)
+    ]
+
+
+async def bench_single(orders: list, concurrency: int) -> dict:
+    sem = asyncio.Semaphore(concurrency)
+    ok = 0
+    async with httpx.AsyncClient(base_url=BASE, timeout=60.0) as http:
+        async def one(o: dict) -> None:
+            nonlocal ok
+            async with sem:
+                r = await http.post(f"/orders/{o['order_id']}/start",
+                                    json={"payment_id": o["payment_id"], "address": o["address"]})
+                ok += r.status_code == 200
+
+        t0 = time.perf_counter()
+        await asyncio.gather(*(one(o) for o in orders))
+        elapsed = time.perf_counter() - t0
+    return {"path": "single", "orders": len(orders), "started": ok,
+            "http_requests": len(orders), "seconds": round(elapsed, 3),
+            "orders_per_s": round(len(orders) / elapsed, 1)}
+
+
+async def bench_batch(orders: list, chunk: int) -> dict:
+    started = 0
+    requests = 0
+    async with httpx.AsyncClient(base_url=BASE, timeout=300.0) as http:
+        t0 = time.perf_counter()
+        for i in range(0, len(orders), chunk):
+            r = await http.post("/orders/batch/start", json={"orders": orders[i:i + chunk]})
+            r.raise_for_status()
+            requests += 1
+            started += r.json()["counts"].get("started", 0)
+        elapsed = time.perf_counter() - t0
+    return {"path": "batch", "orders": len(orders), "started": started,
+            "http_requests": requests, "seconds": round(elapsed, 3),
+            "orders_per_s": round(len(orders) / elapsed, 1)}
+
+
+async def main() -> None:
+    ap = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    ap.add_argument("--orders", type=int, default=500)
+    ap.add_argument("--chunk", type=int, default=500, help="orders per batch request")
+    ap.add_argument("--http-concurrency", type=int, default=32, help="parallel single-start requests")
+    args = ap.parse_args()
+
+    single = await bench_single(_orders(args.orders, "s"), args.http_concurrency)
+    batch = await bench_batch(_orders(args.orders, "b"), args.chunk)
+    print(json.dumps({"single": single, "batch": batch,
+                      "speedup": round(batch["orders_per_s"] / single["orders_per_s"], 2)}, indent=2))
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,75 @@
+# bench/codec.py
+"""
+Payload compression (codec.CompressionCodec) at several cart sizes: bytes per
+order payload with and without compression, encode/decode CPU per payload,
+and the estimated history bytes per order. The order dict is serialized once
+each for validate, charge, the ShippingWorkflow start, prepare and dispatch.
+
+Offline: no Temporal server needed. Example:
+    python -m bench.codec --items 1,10,100,1000 --levels 1,6,9
+"""
+import argparse
+import asyncio
+import json
+import random
+import time
+
+import temporalio.converter
+
+from codec import CompressionCodec
+
+ORDER_PAYLOADS_PER_ORDER = 5  # validate, charge, child start, prepare, dispatch
+
+
+def make_order(items: int, rng: random.Random) -> dict:
+    return {
+        "order_id": f"o-{rng.randrange(10 ** 8)}",
+        "items": [{"sku": f"SKU-{rng.randrange(10 ** 5):05d}", "qty": rng.randint(1, 5),
+                   "name": rng.choice(["widget", "gadget", "sprocket", "flange"]),
+                   "price_cents": rng.randrange(100, 50000)} for _ in range(items)],
+        "address": {"street": "123 Main St", "city": "Amherst", "region": "MA", "zip": "01002"},
+    }
+
+
+async def measure(codec: CompressionCodec, payload, repeat: int) -> dict:
+    [enc] = await codec.encode([payload])
+    c0 = time.process_time()
+    for _ in range(repeat):
+        await codec.encode([payload])
+    enc_us = (time.process_time() - c0) * 1e6 / repeat
+    c0 = time.process_time()
+    for _ in range(repeat):
+        await codec.decode([enc])
+    dec_us = (time.process_time() - c0) * 1e6 / repeat
+    return {
+        "payload_bytes": enc.ByteSize(),
+        "history_bytes_per_order_est": enc.ByteSize() * ORDER_PAYLOADS_PER_ORDER,
+        "encode_cpu_us": round(enc_us, 1),
+        "decode_cpu_us": round(dec_us, 1),
+    }
+
+
+async def main() -> None:
+    ap = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    ap.add_argument("--items", default="1,10,100,1000")
+    ap.add_argument("--levels", default="1,6,9")
+    ap.add_argument("--threshold", type=int, default=1024)
+    ap.add_argument("--repeat", type=int, default=200)
+    args = ap.parse_args()
+
+    rng = random.Random(7)
+    converter = temporalio.converter.default().payload_converter
+    report = {}
+    for items in (int(x) for x in args.items.split(",")):
+        [payload] = converter.to_payloads([make_order(items, rng)])
+        row = {"none": await measure(CompressionCodec(None), payload, args.repeat)}
+        for level in (int(x) for x in args.levels.split(",")):
+            row[f"zlib-{level}"] = await measure(
+                CompressionCodec("zlib", args.threshold, level), payload, args.repeat)
+            row[f"zlib-{level}"]["ratio"] = round(row["none"]["payload_bytes"] / row[f"zlib-{level}"]["payload_bytes"], 2)
+        report[f"{items}_items"] = row
+    print(json.dumps(report, indent=2))
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
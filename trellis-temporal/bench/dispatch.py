@@ -0,0 +1,76 @@
+# bench/dispatch.py
+"""
+Carrier calls and end-to-end latency with one dispatch call per order
+(TRELLIS_DISPATCH_MODE=direct) vs consolidated per-region batches through
+DispatchWorkflow (TRELLIS_DISPATCH_MODE=batched).
+
+Each mode runs in its own process with an in-process worker on private task
+queues and a private dispatcher id prefix. Orders are spread over --regions
+cities so batches fill the way they would with real traffic.
+Needs Temporal and Postgres.
+    python -m bench.dispatch --orders 200 --concurrency 50 --regions 4
+"""
+import argparse
+import asyncio
+import json
+import os
+
+from bench._harness import drive_orders, in_process_workers, private_queue_env, run_in_subprocess
+
+MODES = ("direct", "batched")
+
+
+async def child(args) -> None:
+    from temporalio.client import Client
+    import codec
+    import activities
+    import db
+
+    cities = [f"city-{i}" for i in range(args.regions)]
+    order_args = lambda order_id: [order_id, f"pay-{order_id}", {"city": cities[hash(order_id) % len(cities)]}]
+
+    client = await Client.connect(os.getenv("TEMPORAL_ADDRESS", "localhost:7233"),
+                                   data_converter=codec.data_converter())
+    try:
+        async with in_process_workers(client):
+            result = await drive_orders(client, args.orders, args.concurrency, order_args=order_args)
+    finally:
+        await db.close_pool()
+    mode = os.environ["TRELLIS_DISPATCH_MODE"]
+    calls = activities.CARRIER_CALLS.value(mode=mode)
+    result["carrier_calls"] = calls
+    result["carrier_calls_per_order"] = round(calls / max(1, args.orders - result["failures"]), 3)
+    print(json.dumps(result))
+
+
+def main() -> None:
+    ap = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    ap.add_argument("--orders", type=int, default=100)
+    ap.add_argument("--concurrency", type=int, default=25)
+    ap.add_argument("--regions", type=int, default=4)
+    ap.add_argument("--batch-size", type=int, default=25)
+    ap.add_argument("--batch-window", type=float, default=1.0)
+    ap.add_argument("--child", action="store_true", help=argparse.SUPPRESS)
+    args = ap.parse_args()
+    if args.child:
+        asyncio.run(child(args))
+        return
+
+    report = {}
+    for mode in MODES:
+        env = {
+            **private_queue_env(f"dispatch-{mode}"),
+            "TRELLIS_DISPATCH_MODE": mode,
+            "TRELLIS_DISPATCH_BATCH_SIZE": str(args.batch_size),
+            "TRELLIS_DISPATCH_BATCH_WINDOW_S": str(args.batch_window),
+        }
+        report[mode] = run_in_subprocess(
+            "bench.dispatch", env,
+            ["--orders", str(args.orders), "--concurrency", str(args.concurrency),
+             "--regions", str(args.regions)],
+        )
+    print(json.dumps(report, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,118 @@
+# bench/export.py
+"""
+Memory profile of the bulk export path (db.stream_export -> export.*_chunks,
+exactly what GET /export/{table} streams) against local Postgres.
+
+Seeds --rows events under a private event_type, exports them all while
+sampling this process's RSS, then (for contrast) loads --naive-rows of them
+with a plain fetch() the way a row-at-a-time helper would. Streaming RSS
+should stay flat from the first sample to the last; the naive load grows
+with the row count. Seeded rows are deleted afterwards unless --keep.
+
+Example (10M rows takes a few minutes to seed):
+    python -m bench.export --rows 10000000 --format ndjson
+"""
+import argparse
+import asyncio
+import json
+import resource
+import time
+import uuid
+from datetime import datetime, timedelta
+
+import db
+import export
+
+SEED_CHUNK = 1_000_000
+
+
+def rss_mb() -> float:
+    try:
+        with open("/proc/self/status") as f:
+            for line in f:
+                if line.startswith("VmRSS:"):
+                    return int(line.split()[1]) / 1024
+    except OSError:
+        pass
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024  # peak, not current
+
+
+async def seed(event_type: str, rows: int, start: datetime) -> None:
+    async with db.acquire("bench_export_seed") as conn:
+        for lo in range(0, rows, SEED_CHUNK):
+            hi = min(rows, lo + SEED_CHUNK)
+            await conn.execute(
+                "INSERT INTO events (order_id, event_type, payload, created_at) "
+                "SELECT 'bench-' || g, $1, jsonb_build_object('i', g, 'city', 'Amherst'), "
+                "       $2::timestamp + g * INTERVAL '1 millisecond' "
+                "FROM generate_series($3::bigint, $4::bigint - 1) g",
+                event_type, start, lo, hi,
+            )
+            print(f"[bench] seeded {hi}/{rows}", flush=True)
+
+
+async def stream(event_type: str, start: datetime, end: datetime, fmt: str, samples: int, rows: int) -> dict:
+    records = db.stream_export("events", start, end, event_type, as_json=fmt == "ndjson")
+    body = (export.ndjson_chunks(records) if fmt == "ndjson"
+            else export.csv_chunks(records, db.EXPORT_COLUMNS["events"]))
+    every = max(1, rows // samples)
+    n_bytes = n_lines = 0
+    next_sample = every
+    curve = [round(rss_mb(), 1)]
+    t0 = time.perf_counter()
+    async for chunk in body:
+        n_bytes += len(chunk)
+        n_lines += chunk.count(b"\n")
+        if n_lines >= next_sample:
+            curve.append(round(rss_mb(), 1))
+            next_sample += every
+    elapsed = time.perf_counter() - t0
+    return {
+        "rows": n_lines - (1 if fmt == "csv" else 0),
+        "mb_out": round(n_bytes / 2 ** 20, 1),
+        "rows_per_s": round(n_lines / elapsed),
+        "rss_mb_curve": curve,
+        "rss_growth_mb": round(max(curve) - curve[0], 1),
+    }
+
+
+async def naive(event_type: str, start: datetime, end: datetime, rows: int) -> dict:
+    before = rss_mb()
+    async with db.acquire("bench_export_naive") as conn:
+        recs = await conn.fetch(
+            "SELECT id, order_id, event_type, payload, created_at FROM events "
+            "WHERE created_at >= $1 AND created_at < $2 AND event_type = $3 LIMIT $4",
+            start, end, event_type, rows,
+        )
+        lines = [json.dumps({**dict(r), "created_at": r["created_at"].isoformat()}) for r in recs]
+    after = rss_mb()
+    return {"rows": len(lines), "rss_growth_mb": round(after - before, 1)}
+
+
+async def main() -> None:
+    ap = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    ap.add_argument("--rows", type=int, default=10_000_000)
+    ap.add_argument("--format", choices=sorted(export.MEDIA_TYPES), default="ndjson")
+    ap.add_argument("--samples", type=int, default=10, help="RSS samples over the export")
+    ap.add_argument("--naive-rows", type=int, default=1_000_000, help="0 to skip the fetch() contrast")
+    ap.add_argument("--keep", action="store_true", help="leave the seeded rows in place")
+    args = ap.parse_args()
+
+    event_type = f"bench_export_{uuid.uuid4().hex[:6]}"
+    start = datetime.utcnow() - timedelta(milliseconds=args.rows + 1000)
+    end = datetime.utcnow() + timedelta(seconds=1)
+    try:
+        await seed(event_type, args.rows, start)
+        report = {"streaming": await stream(event_type, start, end, args.format, args.samples, args.rows)}
+        if args.naive_rows:
+            report["naive_fetch"] = await naive(event_type, start, end, args.naive_rows)
+        print(json.dumps(report, indent=2))
+    finally:
+        if not args.keep:
+            async with db.acquire("bench_export_cleanup") as conn:
+                await conn.execute("DELETE FROM events WHERE event_type = $1", event_type)
+        await db.close_pool()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
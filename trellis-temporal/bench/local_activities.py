@@ -0,0 +1,57 @@
+# bench/local_activities.py
+"""
+History size and end-to-end latency of OrderWorkflow with receive/validate
+as regular activities vs local activities (TRELLIS_LOCAL_ACTIVITY_STEPS).
+
+Each mode runs in its own process with an in-process worker on private task
+queues, so it does not interfere with a worker you already have running.
+Needs Temporal and Postgres (charge / status projection write to the DB).
+    python -m bench.local_activities --orders 200 --concurrency 20
+"""
+import argparse
+import asyncio
+import json
+import os
+
+from bench._harness import drive_orders, in_process_workers, private_queue_env, run_in_subprocess
+
+MODES = {"regular": "", "local": "receive,validate"}
+
+
+async def child(args) -> None:
+    from temporalio.client import Client
+    import codec
+    import db
+
+    client = await Client.connect(os.getenv("TEMPORAL_ADDRESS", "localhost:7233"),
+                                   data_converter=codec.data_converter())
+    try:
+        async with in_process_workers(client):
+            result = await drive_orders(client, args.orders, args.concurrency)
+    finally:
+        await db.close_pool()
+    print(json.dumps(result))
+
+
+def main() -> None:
+    ap = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    ap.add_argument("--orders", type=int, default=100)
+    ap.add_argument("--concurrency", type=int, default=10)
+    ap.add_argument("--child", action="store_true", help=argparse.SUPPRESS)
+    args = ap.parse_args()
+    if args.child:
+        asyncio.run(child(args))
+        return
+
+    report = {}
+    for mode, steps in MODES.items():
+        env = {**private_queue_env(mode), "TRELLIS_LOCAL_ACTIVITY_STEPS": steps}
+        report[mode] = run_in_subprocess(
+            "bench.local_activities", env,
+            ["--orders", str(args.orders), "--concurrency", str(args.concurrency)],
+        )
+    print(json.dumps(report, indent=2))
+
+
+if __name__ == "__main__":
+    main()
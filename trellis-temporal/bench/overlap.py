@@ -0,0 +1,126 @@
+# bench/overlap.py
+"""
+End-to-end order latency with the package prepared after the charge (sequential)
+vs while the charge runs (TRELLIS_OVERLAP_PREPARE_CHARGE).
+
+Runs on the SDK's time-skipping test server with the replay suite's in-memory
+stand-in activities, each delayed to roughly what the real providers take
+(--delays overrides them, e.g. charge_payment_act=0.8). Orders are approved at
+start, so the review wait does not count. Also reports history size per order,
+since the overlap costs a few signals. No Postgres or Temporal server needed.
+    python -m bench.overlap --orders 100 --concurrency 20
+"""
+import argparse
+import asyncio
+import json
+import os
+import sys
+import time
+import uuid
+from typing import Any, Dict, List
+
+from bench._harness import private_queue_env
+
+MODES = {"sequential": False, "overlap": True}
+# seconds per activity; the charge and prepare are the calls the overlap hides behind each other
+DELAYS = {
+    "receive_order_act": 0.02,
+    "validate_order_act": 0.02,
+    "charge_payment_act": 0.4,
+    "prepare_package_act": 0.5,
+    "dispatch_carrier_act": 0.3,
+}
+
+
+async def drive(client, orders: int, concurrency: int) -> Dict[str, Any]:
+    import config
+    from bench.replay import _pick, collect_histories, size_stats
+    from workflows import OrderWorkflow, order_options
+
+    sem = asyncio.Semaphore(max(1, concurrency))
+    latencies: List[float] = []
+    histories: list = []
+    failures = 0
+    tag = uuid.uuid4().hex[:6]
+
+    async def one(i: int) -> None:
+        nonlocal failures
+        order_id = f"overlap-{tag}-{i}"
+        async with sem:
+            t0 = time.perf_counter()
+            h = await client.start_workflow(
+                OrderWorkflow.run, args=[order_id, f"pay-{order_id}", {"city": "Amherst"}, order_options()],
+                id=f"order-{order_id}", task_queue=config.TASK_QUEUE_ORDERS,
+            )
+            await h.signal("approve")
+            try:
+                await h.result()
+            except Exception:
+                failures += 1
+                return
+            latencies.append((time.perf_counter() - t0) * 1000)
+            histories.extend(await collect_histories(client, h.id, h.result_run_id))
+
+    await asyncio.gather(*(one(i) for i in range(orders)))
+    sizes = size_stats(histories)
+    return {
+        "orders": orders,
+        "failures": failures,
+        "e2e_p50_ms": round(_pick(latencies, 0.5), 1),
+        "e2e_p95_ms": round(_pick(latencies, 0.95), 1),
+        "history_events_per_order": sizes["history_events_per_order"],
+    }
+
+
+async def amain(args) -> int:
+    from temporalio.testing import WorkflowEnvironment
+    from temporalio.worker import Worker
+    import codec
+    import config
+    from bench.replay import StandIns
+    from worker import WORKFLOW_RUNNER
+    from workflows import OrderWorkflow, ShippingWorkflow
+
+    delays = dict(DELAYS)
+    for item in args.delays:
+        name, _, seconds = item.partition("=")
+        delays[name] = float(seconds)
+    try:
+        env = await WorkflowEnvironment.start_time_skipping(data_converter=codec.data_converter())
+    except Exception as e:
+        print(json.dumps({"skipped": f"time-skipping test server unavailable: {e!r}"}))
+        return 0
+    report: Dict[str, Any] = {"delays_s": delays}
+    try:
+        stand_ins = StandIns(delays=delays)
+        orders_w = Worker(env.client, task_queue=config.TASK_QUEUE_ORDERS, workflows=[OrderWorkflow],
+                          activities=stand_ins.orders_activities(), workflow_runner=WORKFLOW_RUNNER)
+        shipping_w = Worker(env.client, task_queue=config.TASK_QUEUE_SHIPPING, workflows=[ShippingWorkflow],
+                            activities=stand_ins.shipping_activities(), workflow_runner=WORKFLOW_RUNNER)
+        async with orders_w, shipping_w:
+            for mode, overlap in MODES.items():
+                # recorded on each order as it starts (order_options)
+                config.OVERLAP_PREPARE_CHARGE = overlap
+                report[mode] = await drive(env.client, args.orders, args.concurrency)
+    finally:
+        await env.shutdown()
+    seq, ovl = report["sequential"], report["overlap"]
+    if seq["e2e_p50_ms"] and ovl["e2e_p50_ms"]:
+        report["p50_saved_ms"] = round(seq["e2e_p50_ms"] - ovl["e2e_p50_ms"], 1)
+    print(json.dumps(report, indent=2))
+    return 1 if seq["failures"] or ovl["failures"] else 0
+
+
+def main() -> None:
+    ap = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    ap.add_argument("--orders", type=int, default=50, help="orders per mode")
+    ap.add_argument("--concurrency", type=int, default=10)
+    ap.add_argument("--delays", nargs="*", default=[], metavar="ACTIVITY=SECONDS")
+    args = ap.parse_args()
+    os.environ.update(private_queue_env("overlap"))
+    os.environ["TRELLIS_ORDER_SEARCH_ATTRIBUTES"] = "0"
+    os.environ["TRELLIS_DISPATCH_MODE"] = "direct"
+    sys.exit(asyncio.run(amain(args)))
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,82 @@
+# bench/payments.py
+"""
+Idempotent charge bookkeeping against local Postgres, old vs fused path:
+  old   : try_create_payment -> mark_payment -> append_event (3 pool round trips,
+          4 on the duplicate path via get_payment)
+  fused : claim_payment -> complete_payment (2 round trips, 1 on duplicates)
+The fake charge itself is left out so only the DB cost is measured.
+
+Example:
+    python -m bench.payments --charges 5000 --concurrency 16 --duplicates 0.2
+"""
+import argparse
+import asyncio
+import json
+import random
+import time
+import uuid
+
+import db
+
+
+async def old_path(payment_id: str, order_id: str) -> None:
+    if not await db.try_create_payment(payment_id, order_id):
+        await db.get_payment(payment_id)
+        return
+    await db.mark_payment(payment_id, "charged", 1)
+    await db.append_event(order_id, "payment_charged", {"amount": 1}, sync=True)
+
+
+async def fused_path(payment_id: str, order_id: str) -> None:
+    rec = await db.claim_payment(payment_id, order_id)
+    if not rec["created"]:
+        return
+    await db.complete_payment(payment_id, order_id, "charged", 1)
+
+
+async def run(path, charges: int, concurrency: int, duplicates: float) -> dict:
+    tag = uuid.uuid4().hex[:6]
+    ids = [f"bench-{tag}-{i}" for i in range(charges)]
+    # replay a share of ids to exercise the already-charged branch
+    ids += random.sample(ids, int(charges * duplicates))
+    sem = asyncio.Semaphore(concurrency)
+    lat = []
+
+    async def one(pid: str) -> None:
+        async with sem:
+            t0 = time.perf_counter()
+            await path(pid, f"o-{pid}")
+            lat.append((time.perf_counter() - t0) * 1000)
+
+    # duplicates must run after their first charge
+    t0 = time.perf_counter()
+    await asyncio.gather(*(one(pid) for pid in ids[:charges]))
+    await asyncio.gather(*(one(pid) for pid in ids[charges:]))
+    elapsed = time.perf_counter() - t0
+    lat.sort()
+    return {
+        "calls": len(ids),
+        "charges_per_s": round(len(ids) / elapsed, 1),
+        "p50_ms": round(lat[len(lat) // 2], 3),
+        "p99_ms": round(lat[int(0.99 * (len(lat) - 1))], 3),
+    }
+
+
+async def main() -> None:
+    ap = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    ap.add_argument("--charges", type=int, default=2000)
+    ap.add_argument("--concurrency", type=int, default=8)
+    ap.add_argument("--duplicates", type=float, default=0.2, help="share of replayed payment_ids")
+    args = ap.parse_args()
+
+    report = {}
+    try:
+        for name, path in (("old", old_path), ("fused", fused_path)):
+            report[name] = await run(path, args.charges, args.concurrency, args.duplicates)
+    finally:
+        await db.close_pool()
+    print(json.dumps(report, indent=2))
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,409 @@
+# bench/replay.py
+"""
+Regression suite for the workflow code itself (OrderWorkflow, ShippingWorkflow).
+
+Runs generated orders through the SDK's time-skipping test server with
+in-process stand-in activities (no Postgres, no Temporal server), then replays
+every history with Replayer. Scenarios: happy path, cancel in review, dispatch
+retry (carrier fails until the child is retried), address-update storms and a
+declined charge (the package prepared alongside it is released).
+
+Per scenario it reports history size, replay time per history and workflow-task
+CPU (process CPU spent replaying a history / workflow tasks in it), compares
+them with bench/replay_baseline.json and exits 1 on nondeterminism or a
+regression. The first run (or --update-baseline) records the baseline; record it
+on the machine that runs the comparison, the timings are machine-specific.
+    python -m bench.replay --orders 250                  # 1000+ histories
+    python -m bench.replay --record histories/           # also save them as JSON
+    python -m bench.replay --histories histories/        # replay saved histories only
+The test server binary is downloaded on first use; without it (offline, not
+cached) generation is skipped and --histories still works.
+"""
+import argparse
+import asyncio
+import collections
+import json
+import os
+import sys
+import time
+import uuid
+from pathlib import Path
+from typing import Any, Awaitable, Callable, Dict, List, Optional
+
+from temporalio import activity
+from temporalio.api.enums.v1 import EventType
+from temporalio.client import Client, WorkflowFailureError, WorkflowHandle, WorkflowHistory
+from temporalio.exceptions import ApplicationError
+
+from bench._harness import private_queue_env
+
+BASELINE = Path(__file__).with_name("replay_baseline.json")
+STORM_SIGNALS = 300
+STORM_BURST = 50
+
+# metric -> which tolerance applies; all of them are lower-is-better
+CHECKED = {
+    "history_events_per_order": "size",
+    "history_bytes_per_order": "size",
+    "max_run_events": "size",
+    "replay_ms_p95": "time",
+    "wft_cpu_us_p50": "time",
+    "wft_cpu_us_p95": "time",
+}
+
+
+class StandIns:
+    """
+    In-memory activities. Dispatch fails the first `dispatch_failures` calls for dispatch_retry
+    orders; the default is every attempt the carrier profile allows, so the first shipping child
+    fails and the retry path runs. The charge is declined for charge_declined orders. `delays`
+    (activity name -> seconds) makes activities take real time, for latency benchmarks.
+    """
+
+    def __init__(self, dispatch_failures: Optional[int] = None, delays: Optional[Dict[str, float]] = None) -> None:
+        if dispatch_failures is None:
+            import activity_profiles
+            import contracts
+            dispatch_failures = activity_profiles.profile(contracts.DISPATCH_CARRIER).max_attempts
+        self.dispatch_failures = dispatch_failures
+        self.delays = delays or {}
+        self.dispatch_calls: collections.Counter = collections.Counter()
+        self.released: collections.Counter = collections.Counter()
+
+    async def _delay(self) -> None:
+        seconds = self.delays.get(activity.info().activity_type)
+        if seconds:
+            await asyncio.sleep(seconds)
+
+    def orders_activities(self) -> list:
+        import contracts
+
+        @activity.defn(name=contracts.RECEIVE_ORDER)
+        async def receive(order_id: str, claim_check: Optional[dict] = None) -> dict:
+            await self._delay()
+            order = {"order_id": order_id, "items": [{"sku": "ABC", "qty": 1}]}
+            if claim_check is None:
+                return order
+            return {"order_id": order_id, "snapshot_version": claim_check["version"],
+                    "address": claim_check["address"]}
+
+        @activity.defn(name=contracts.VALIDATE_ORDER)
+        async def validate(order: dict) -> dict:
+            await self._delay()
+            return {"order_id": order.get("order_id"), "valid": True}
+
+        @activity.defn(name=contracts.CHARGE_PAYMENT)
+        async def charge(order: dict, payment_id: str) -> dict:
+            await self._delay()
+            if order.get("order_id", "").startswith("charge_declined"):
+                raise ApplicationError("card declined", non_retryable=True)
+            return {"status": "charged", "amount": 1}
+
+        @activity.defn(name=contracts.PROJECT_STATUS)
+        async def project(order_id: str, status: dict, version: int) -> bool:
+            return True
+
+        @activity.defn(name=contracts.SET_ORDER_ADDRESS)
+        async def set_address(order_id: str, address: dict, version: int) -> None:
+            return None
+
+        return [receive, validate, charge, project, set_address]
+
+    def shipping_activities(self) -> list:
+        import contracts
+
+        @activity.defn(name=contracts.PREPARE_PACKAGE)
+        async def prepare(order: dict) -> str:
+            await self._delay()
+            return "Package ready"
+
+        @activity.defn(name=contracts.RELEASE_PACKAGE)
+        async def release(order: dict) -> str:
+            self.released[order.get("order_id", "")] += 1
+            return "Package released"
+
+        @activity.defn(name=contracts.DISPATCH_CARRIER)
+        async def dispatch(order: dict) -> str:
+            await self._delay()
+            order_id = order.get("order_id", "")
+            self.dispatch_calls[order_id] += 1
+            if order_id.startswith("dispatch_retry") and self.dispatch_calls[order_id] <= self.dispatch_failures:
+                raise RuntimeError("carrier unavailable")
+            return "Dispatched"
+
+        return [prepare, release, dispatch]
+
+
+# --- scenarios: drive one started order, return its outcome ---------------------------------
+
+async def _happy(h: WorkflowHandle) -> str:
+    await h.signal("approve")
+    return await h.result()
+
+async def _cancel(h: WorkflowHandle) -> str:
+    await h.signal("cancel")
+    try:
+        await h.result()
+    except WorkflowFailureError:
+        return "canceled"
+    return "not canceled"
+
+async def _charge_declined(h: WorkflowHandle) -> str:
+    await h.signal("approve")
+    try:
+        await h.result()
+    except WorkflowFailureError:
+        return "charge failed"
+    return "not failed"
+
+async def _address_storm(h: WorkflowHandle) -> str:
+    # concurrent bursts, so signals also land while a task (or continue-as-new) is in flight
+    for base in range(0, STORM_SIGNALS, STORM_BURST):
+        await asyncio.gather(*(h.signal("update_address", {f"line{i}": str(i)})
+                               for i in range(base, base + STORM_BURST)))
+    return await _happy(h)
+
+SCENARIOS: Dict[str, Callable[[WorkflowHandle], Awaitable[str]]] = {
+    "happy": _happy,
+    "cancel": _cancel,
+    "dispatch_retry": _happy,  # the stand-in carrier does the failing
+    "address_storm": _address_storm,
+    "charge_declined": _charge_declined,  # the stand-in payment declines; the package is rolled back
+}
+EXPECTED = {"happy": "done", "cancel": "canceled", "dispatch_retry": "done", "address_storm": "done",
+            "charge_declined": "charge failed"}
+
+
+async def collect_histories(client: Client, workflow_id: str, run_id: str) -> List[WorkflowHistory]:
+    """Every run of an order: its continue-as-new chain, the children it started and their retries."""
+    out: List[WorkflowHistory] = []
+    pending = [(workflow_id, run_id)]
+    while pending:
+        wf_id, rid = pending.pop()
+        hist = await client.get_workflow_handle(wf_id, run_id=rid).fetch_history()
+        out.append(hist)
+        for e in hist.events:
+            if e.event_type == EventType.EVENT_TYPE_CHILD_WORKFLOW_EXECUTION_STARTED:
+                ex = e.child_workflow_execution_started_event_attributes.workflow_execution
+                pending.append((ex.workflow_id, ex.run_id))
+            elif e.event_type == EventType.EVENT_TYPE_WORKFLOW_EXECUTION_CONTINUED_AS_NEW:
+                pending.append((wf_id, e.workflow_execution_continued_as_new_event_attributes.new_execution_run_id))
+            elif (e.event_type == EventType.EVENT_TYPE_WORKFLOW_EXECUTION_FAILED
+                  and e.workflow_execution_failed_event_attributes.new_execution_run_id):
+                # failed child retried by the server under the same id
+                pending.append((wf_id, e.workflow_execution_failed_event_attributes.new_execution_run_id))
+    return out
+
+
+async def run_scenario(client: Client, name: str, orders: int, concurrency: int = 20) -> Dict[str, Any]:
+    """Start `orders` orders, drive each through scenario `name`; returns outcomes + histories."""
+    import config
+    from workflows import OrderWorkflow, order_options
+
+    sem = asyncio.Semaphore(max(1, concurrency))
+    outcomes: collections.Counter = collections.Counter()
+    histories: List[WorkflowHistory] = []
+    tag = uuid.uuid4().hex[:6]
+
+    async def one(i: int) -> None:
+        order_id = f"{name}-{tag}-{i}"
+        async with sem:
+            h = await client.start_workflow(
+                OrderWorkflow.run, args=[order_id, f"pay-{order_id}", {"city": "Amherst"}, order_options()],
+                id=f"order-{order_id}", task_queue=config.TASK_QUEUE_ORDERS,
+            )
+            try:
+                outcomes[await SCENARIOS[name](h)] += 1
+            except Exception as e:
+                outcomes[f"error: {type(e).__name__}"] += 1
+            histories.extend(await collect_histories(client, h.id, h.result_run_id))
+
+    await asyncio.gather(*(one(i) for i in range(orders)))
+    return {"outcomes": dict(outcomes), "histories": histories}
+
+
+def _workflow_tasks(hist: WorkflowHistory) -> int:
+    return sum(1 for e in hist.events if e.event_type == EventType.EVENT_TYPE_WORKFLOW_TASK_COMPLETED)
+
+
+def _pick(values: List[float], q: float) -> float:
+    values = sorted(values)
+    return values[min(len(values) - 1, int(q * len(values)))] if values else 0.0
+
+
+async def replay(histories: List[WorkflowHistory]) -> Dict[str, Any]:
+    """Replay every history once; wall and process-CPU time per history, nondeterminism failures."""
+    from temporalio.worker import Replayer
+    import codec
+    from worker import WORKFLOW_RUNNER
+    from workflows import DispatchWorkflow, OrderWorkflow, ShippingWorkflow
+
+    replayer = Replayer(workflows=[OrderWorkflow, ShippingWorkflow, DispatchWorkflow],
+                        workflow_runner=WORKFLOW_RUNNER, data_converter=codec.data_converter())
+
+    async def feed():
+        for h in histories:
+            yield h
+
+    ms: List[float] = []
+    cpu_per_task_us: List[float] = []
+    failures: List[Dict[str, str]] = []
+    async with replayer.workflow_replay_iterator(feed()) as results:
+        t, c = time.perf_counter(), time.process_time()
+        async for r in results:
+            now, cpu = time.perf_counter(), time.process_time()
+            ms.append((now - t) * 1000)
+            cpu_per_task_us.append((cpu - c) * 1e6 / max(1, _workflow_tasks(r.history)))
+            if r.replay_failure is not None:
+                failures.append({"workflow_id": r.history.workflow_id, "error": repr(r.replay_failure)})
+            t, c = now, cpu
+    return {
+        "replay_ms_total": round(sum(ms), 1),
+        "replay_ms_p50": round(_pick(ms, 0.5), 3),
+        "replay_ms_p95": round(_pick(ms, 0.95), 3),
+        "wft_cpu_us_p50": round(_pick(cpu_per_task_us, 0.5), 1),
+        "wft_cpu_us_p95": round(_pick(cpu_per_task_us, 0.95), 1),
+        "failures": failures,
+    }
+
+
+def size_stats(histories: List[WorkflowHistory]) -> Dict[str, Any]:
+    # order workflows are "order-<id>"; their children and later runs count toward the same order
+    orders = max(1, len({h.workflow_id for h in histories if h.workflow_id.startswith("order-")}))
+    events = [len(h.events) for h in histories]
+    return {
+        "orders": orders,
+        "histories": len(histories),
+        "history_events_per_order": round(sum(events) / orders, 1),
+        "history_bytes_per_order": round(sum(e.ByteSize() for h in histories for e in h.events) / orders, 1),
+        "max_run_events": max(events, default=0),
+    }
+
+
+def regressions(baseline: Dict[str, Dict[str, float]], current: Dict[str, Dict[str, Any]],
+                time_tolerance: float, size_tolerance: float) -> List[str]:
+    """Metrics in `current` that grew past baseline * (1 + tolerance), as readable lines."""
+    out = []
+    for scenario, metrics in current.items():
+        base = baseline.get(scenario, {})
+        for key, kind in CHECKED.items():
+            if key not in base or key not in metrics or base[key] <= 0:
+                continue
+            tol = time_tolerance if kind == "time" else size_tolerance
+            if metrics[key] > base[key] * (1 + tol):
+                out.append(f"{scenario}.{key}: {base[key]} -> {metrics[key]} "
+                           f"(+{(metrics[key] / base[key] - 1) * 100:.0f}%, allowed {tol * 100:.0f}%)")
+    return out
+
+
+def save_histories(root: Path, scenario: str, histories: List[WorkflowHistory]) -> None:
+    d = root / scenario
+    d.mkdir(parents=True, exist_ok=True)
+    for i, h in enumerate(histories):
+        (d / f"{h.workflow_id}__{i}.json").write_text(h.to_json())
+
+
+def load_histories(root: Path) -> Dict[str, List[WorkflowHistory]]:
+    """<root>/<scenario>/<workflow_id>__<n>.json, as written by --record (or `temporal workflow show -o json`)."""
+    out: Dict[str, List[WorkflowHistory]] = {}
+    for d in sorted(p for p in root.iterdir() if p.is_dir()):
+        out[d.name] = [WorkflowHistory.from_json(f.name.split("__")[0], f.read_text())
+                       for f in sorted(d.glob("*.json"))]
+    return out
+
+
+async def generate(orders: int, concurrency: int) -> Optional[Dict[str, Any]]:
+    """Run every scenario on the time-skipping server; None if the server is unavailable."""
+    from temporalio.testing import WorkflowEnvironment
+    from temporalio.worker import Worker
+    import codec
+    import config
+    from worker import WORKFLOW_RUNNER
+    from workflows import OrderWorkflow, ShippingWorkflow
+
+    try:
+        env = await WorkflowEnvironment.start_time_skipping(data_converter=codec.data_converter())
+    except Exception as e:
+        print(f"[replay] time-skipping test server unavailable, skipping generation: {e!r}", file=sys.stderr)
+        return None
+    stand_ins = StandIns()
+    results = {}
+    try:
+        orders_w = Worker(env.client, task_queue=config.TASK_QUEUE_ORDERS, workflows=[OrderWorkflow],
+                          activities=stand_ins.orders_activities(), workflow_runner=WORKFLOW_RUNNER)
+        shipping_w = Worker(env.client, task_queue=config.TASK_QUEUE_SHIPPING, workflows=[ShippingWorkflow],
+                            activities=stand_ins.shipping_activities(), workflow_runner=WORKFLOW_RUNNER)
+        async with orders_w, shipping_w:
+            for name in SCENARIOS:
+                t0 = time.perf_counter()
+                results[name] = await run_scenario(env.client, name, orders, concurrency)
+                print(f"[replay] {name}: {orders} orders in {time.perf_counter() - t0:.1f}s "
+                      f"{results[name]['outcomes']}", file=sys.stderr)
+    finally:
+        await env.shutdown()
+    return results
+
+
+async def amain(args) -> int:
+    if args.histories:
+        generated = {name: {"histories": hs, "outcomes": {}}
+                     for name, hs in load_histories(Path(args.histories)).items()}
+        params: Dict[str, Any] = {"histories": str(Path(args.histories).resolve())}
+    else:
+        generated = await generate(args.orders, args.concurrency)
+        if generated is None:
+            print(json.dumps({"skipped": "time-skipping test server unavailable"}))
+            return 0
+        params = {"orders": args.orders, "storm_signals": STORM_SIGNALS}
+        if args.record:
+            for name, g in generated.items():
+                save_histories(Path(args.record), name, g["histories"])
+
+    report: Dict[str, Dict[str, Any]] = {}
+    problems: List[str] = []
+    for name, g in generated.items():
+        report[name] = {**size_stats(g["histories"]), **await replay(g["histories"])}
+        if g["outcomes"]:
+            report[name]["outcomes"] = g["outcomes"]
+            wrong = {k: v for k, v in g["outcomes"].items() if k != EXPECTED[name]}
+            if wrong:
+                problems.append(f"{name}: unexpected outcomes {wrong}")
+        for f in report[name]["failures"]:
+            problems.append(f"{name}: nondeterminism replaying {f['workflow_id']}: {f['error']}")
+
+    baseline_path = Path(args.baseline)
+    baseline = json.loads(baseline_path.read_text()) if baseline_path.exists() else None
+    if baseline is None or args.update_baseline:
+        keep = {name: {k: m[k] for k in CHECKED} for name, m in report.items()}
+        baseline_path.write_text(json.dumps({"params": params, "scenarios": keep}, indent=2) + "\n")
+        print(f"[replay] baseline written to {baseline_path}", file=sys.stderr)
+    elif baseline.get("params") != params:
+        print(f"[replay] baseline was recorded with {baseline.get('params')}, not {params}; "
+              f"not comparing (rerun with the same options or --update-baseline)", file=sys.stderr)
+    else:
+        problems += regressions(baseline["scenarios"], report, args.time_tolerance, args.size_tolerance)
+
+    print(json.dumps({"params": params, "scenarios": report, "problems": problems}, indent=2))
+    return 1 if problems else 0
+
+
+def main() -> None:
+    ap = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    ap.add_argument("--orders", type=int, default=250, help="orders per scenario")
+    ap.add_argument("--concurrency", type=int, default=20)
+    ap.add_argument("--baseline", default=str(BASELINE))
+    ap.add_argument("--update-baseline", action="store_true")
+    ap.add_argument("--time-tolerance", type=float, default=0.5, help="allowed growth of replay/CPU times")
+    ap.add_argument("--size-tolerance", type=float, default=0.05, help="allowed growth of history size")
+    ap.add_argument("--record", help="also write the generated histories under this directory")
+    ap.add_argument("--histories", help="replay histories from this directory instead of generating")
+    args = ap.parse_args()
+    # private queues, and the default code paths whatever the shell has exported;
+    # search attributes are off because the test server has none registered
+    os.environ.update(private_queue_env("replay"))
+    os.environ["TRELLIS_ORDER_SEARCH_ATTRIBUTES"] = "0"
+    os.environ["TRELLIS_DISPATCH_MODE"] = "direct"
+    sys.exit(asyncio.run(amain(args)))
+
+if __name__ == "__main__":
+    main()
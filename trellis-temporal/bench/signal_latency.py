@@ -0,0 +1,104 @@
+# bench/signal_latency.py
+"""
+Signal delivery latency: legacy signal -> start -> poll loop vs the single
+signal-with-start RPC used by api.dispatch_signal, for workflows that are
+already running ("existing") and ids that have no workflow yet ("missing").
+
+Talks to Temporal directly; needs the worker and infra running. Example:
+    python -m bench.signal_latency --samples 50
+"""
+import argparse
+import asyncio
+import json
+import statistics
+import time
+import uuid
+from datetime import timedelta
+
+from temporalio import service as temporal_service
+from temporalio.client import Client
+
+import codec
+from api import dispatch_signal, _start_order
+from config import TASK_QUEUE_ORDERS
+from workflows import OrderWorkflow, order_options
+
+
+async def legacy_signal(client: Client, order_id: str, signal: str) -> int:
+    """The pre-dispatcher approve path; returns the number of RPCs it issued."""
+    wf_id = f"order-{order_id}"
+    h = client.get_workflow_handle(wf_id)
+    rpcs = 1
+    try:
+        await h.signal(signal)
+        return rpcs
+    except temporal_service.RPCError as e:
+        if e.status != temporal_service.RPCStatusCode.NOT_FOUND:
+            raise
+    rpcs += 1
+    try:
+        await client.start_workflow(
+            OrderWorkflow.run, id=wf_id, task_queue=TASK_QUEUE_ORDERS,
+            args=[order_id, "__approve_only__", {}, order_options()],
+            run_timeout=timedelta(seconds=15), rpc_timeout=timedelta(seconds=30),
+        )
+    except temporal_service.RPCError as se:
+        if se.status != temporal_service.RPCStatusCode.ALREADY_EXISTS:
+            raise
+    for _ in range(18):
+        rpcs += 1
+        try:
+            await h.signal(signal)
+            return rpcs
+        except temporal_service.RPCError as e2:
+            if e2.status == temporal_service.RPCStatusCode.NOT_FOUND:
+                await asyncio.sleep(0.2)
+                continue
+            raise
+    raise RuntimeError("workflow not found after retries")
+
+
+def _summary(samples_ms: list, rpcs: list) -> dict:
+    samples_ms = sorted(samples_ms)
+    return {
+        "n": len(samples_ms),
+        "p50_ms": round(statistics.median(samples_ms), 2),
+        "p95_ms": round(samples_ms[int(0.95 * (len(samples_ms) - 1))], 2),
+        "max_ms": round(samples_ms[-1], 2),
+        "rpcs_avg": round(sum(rpcs) / len(rpcs), 2),
+    }
+
+
+async def run_case(client: Client, path: str, existing: bool, samples: int) -> dict:
+    lat, rpcs = [], []
+    for _ in range(samples):
+        order_id = f"bench-sig-{uuid.uuid4().hex[:10]}"
+        if existing:
+            await _start_order(client, order_id, f"pay-{order_id}", {"city": "Amherst"})
+        t0 = time.perf_counter()
+        if path == "legacy":
+            rpcs.append(await legacy_signal(client, order_id, "approve"))
+        else:
+            await dispatch_signal(client, order_id, "approve")
+            rpcs.append(1)
+        lat.append((time.perf_counter() - t0) * 1000)
+    return _summary(lat, rpcs)
+
+
+async def main() -> None:
+    ap = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    ap.add_argument("--samples", type=int, default=30)
+    ap.add_argument("--address", default="localhost:7233")
+    args = ap.parse_args()
+
+    client = await Client.connect(args.address, data_converter=codec.data_converter())
+    report = {}
+    for existing in (True, False):
+        case = "existing" if existing else "missing"
+        for path in ("legacy", "signal_with_start"):
+            report[f"{case}/{path}"] = await run_case(client, path, existing, args.samples)
+    print(json.dumps(report, indent=2))
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
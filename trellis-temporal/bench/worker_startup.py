@@ -0,0 +1,134 @@
+# bench/worker_startup.py
+"""
+Worker cold start and per-workflow sandbox cost.
+
+1. Import cost, measured in fresh interpreters: what a sandboxed workflow
+   used to drag in through `activities` (db, asyncpg, stubs) vs what it loads
+   now (`contracts` + `config`).
+2. Sandbox instance creation, which happens for every workflow run that
+   is not cached on the worker: it re-imports the workflow module inside a
+   fresh sandbox. Measured as CPU per instance for a stand-in module with
+   the old imports vs OrderWorkflow, under the SDK's default restrictions
+   and under worker.WORKFLOW_RUNNER (passthrough for config/contracts).
+3. Worker cold start: importing worker.py and validating both workflow
+   classes in the sandbox, which is what Worker() does before polling.
+
+Offline: no Temporal server or Postgres needed. Example:
+    python -m bench.worker_startup --instances 200
+"""
+import argparse
+import asyncio
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import time
+
+from temporalio import workflow
+from temporalio.worker.workflow_sandbox import SandboxedWorkflowRunner
+
+
+def import_cost(module: str, repeat: int) -> dict:
+    code = (
+        "import time, sys; t=time.perf_counter(); c=time.process_time(); "
+        f"import {module}; "
+        "print((time.perf_counter()-t)*1000, (time.process_time()-c)*1000, len(sys.modules))"
+    )
+    wall, cpu, mods = [], [], 0
+    for _ in range(repeat):
+        out = subprocess.run([sys.executable, "-c", code], capture_output=True, text=True, check=True)
+        w, c, m = out.stdout.split()
+        wall.append(float(w)); cpu.append(float(c)); mods = int(m)
+    return {"wall_ms": round(min(wall), 2), "cpu_ms": round(min(cpu), 2), "modules_loaded": mods}
+
+
+def sandbox_instances(runner: SandboxedWorkflowRunner, cls, n: int) -> dict:
+    defn = workflow._Definition.from_class(cls)
+    runner.prepare_workflow(defn)  # warm-up, mirrors worker start-up validation
+    c0, t0 = time.process_time(), time.perf_counter()
+    for _ in range(n):
+        runner.prepare_workflow(defn)
+    return {
+        "instances": n,
+        "cpu_ms_per_instance": round((time.process_time() - c0) * 1000 / n, 3),
+        "wall_ms_per_instance": round((time.perf_counter() - t0) * 1000 / n, 3),
+    }
+
+
+# Stand-in for the pre-change workflows.py: same sandbox-visible imports, trivial body
+LEGACY_WORKFLOWS = """
+from temporalio import workflow
+from config import TASK_QUEUE_ORDERS, TASK_QUEUE_SHIPPING
+from activities import receive_order_act, charge_payment_act
+
+@workflow.defn
+class LegacyImportWorkflow:
+    @workflow.run
+    async def run(self) -> None:
+        return None
+"""
+
+
+def legacy_workflow_class():
+    d = tempfile.mkdtemp(prefix="trellis-bench-")
+    with open(os.path.join(d, "legacy_workflows.py"), "w") as f:
+        f.write(LEGACY_WORKFLOWS)
+    sys.path.insert(0, d)
+    import legacy_workflows
+    return legacy_workflows.LegacyImportWorkflow
+
+
+COLD_START = """
+import asyncio, time
+c0, t0 = time.process_time(), time.perf_counter()
+import worker
+from temporalio import workflow
+async def validate():
+    # what Worker() does per registered workflow class before polling
+    for cls in (worker.OrderWorkflow, worker.ShippingWorkflow):
+        worker.WORKFLOW_RUNNER.prepare_workflow(workflow._Definition.from_class(cls))
+asyncio.run(validate())
+print((time.process_time() - c0) * 1000, (time.perf_counter() - t0) * 1000)
+"""
+
+
+def worker_cold_start(repeat: int) -> dict:
+    cpu, wall = [], []
+    for _ in range(repeat):
+        out = subprocess.run([sys.executable, "-c", COLD_START], capture_output=True, text=True, check=True)
+        c, w = out.stdout.split()
+        cpu.append(float(c)); wall.append(float(w))
+    return {"cpu_ms": round(min(cpu), 2), "wall_ms": round(min(wall), 2)}
+
+
+async def main() -> None:
+    ap = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    ap.add_argument("--instances", type=int, default=100)
+    ap.add_argument("--import-repeat", type=int, default=3)
+    args = ap.parse_args()
+
+    import worker as worker_mod
+    from workflows import OrderWorkflow
+
+    report = {
+        "imports": {
+            "before (activities)": import_cost("activities", args.import_repeat),
+            "after (contracts, config)": import_cost("contracts, config", args.import_repeat),
+            "workflows module": import_cost("workflows", args.import_repeat),
+        },
+        "sandbox_per_workflow_run": {
+            "before (imports activities), default runner":
+                sandbox_instances(SandboxedWorkflowRunner(), legacy_workflow_class(), args.instances),
+            "after (OrderWorkflow), default runner":
+                sandbox_instances(SandboxedWorkflowRunner(), OrderWorkflow, args.instances),
+            "after (OrderWorkflow), worker.WORKFLOW_RUNNER":
+                sandbox_instances(worker_mod.WORKFLOW_RUNNER, OrderWorkflow, args.instances),
+        },
+        "worker_cold_start": worker_cold_start(args.import_repeat),
+    }
+    print(json.dumps(report, indent=2))
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,122 @@
+# client_pool.py
+"""
+Temporal clients for the API process: a small pool of independently
+connected clients (one gRPC channel each) handed out round-robin, plus a
+client interceptor that records per-RPC latency in metrics.
+"""
+from __future__ import annotations
+import asyncio
+import itertools
+import time
+from datetime import timedelta
+from typing import Any, List, Optional
+
+from temporalio.client import (
+    Client,
+    FetchWorkflowHistoryEventsInput,
+    Interceptor,
+    OutboundInterceptor,
+    QueryWorkflowInput,
+    SignalWorkflowInput,
+    StartWorkflowInput,
+    WorkflowHandle,
+    WorkflowHistoryEventAsyncIterator,
+)
+
+import codec
+import metrics
+import tracing
+
+RPC_SECONDS = metrics.Histogram(
+    "trellis_temporal_rpc_seconds", "Temporal client RPC latency", ("rpc",))
+RPC_ERRORS = metrics.Counter(
+    "trellis_temporal_rpc_errors_total", "Temporal client RPCs that raised", ("rpc", "error"))
+
+class _Timer:
+    def __init__(self, rpc: str) -> None:
+        self.rpc = rpc
+
+    def __enter__(self) -> None:
+        self.t0 = time.perf_counter()
+
+    def __exit__(self, exc_type, exc, tb) -> None:
+        RPC_SECONDS.observe(time.perf_counter() - self.t0, rpc=self.rpc)
+        if exc_type is not None:
+            RPC_ERRORS.inc(rpc=self.rpc, error=exc_type.__name__)
+
+class _RpcMetricsOutbound(OutboundInterceptor):
+    async def start_workflow(self, input: StartWorkflowInput) -> WorkflowHandle[Any, Any]:
+        # signal-with-start is one RPC; label it separately, its latency profile differs
+        with _Timer("signal_with_start" if input.start_signal else "start"):
+            return await super().start_workflow(input)
+
+    async def signal_workflow(self, input: SignalWorkflowInput) -> None:
+        with _Timer("signal"):
+            return await super().signal_workflow(input)
+
+    async def query_workflow(self, input: QueryWorkflowInput) -> Any:
+        with _Timer("query"):
+            return await super().query_workflow(input)
+
+    def fetch_workflow_history_events(self, input: FetchWorkflowHistoryEventsInput) -> WorkflowHistoryEventAsyncIterator:
+        # the RPCs happen page by page while the caller iterates; WorkflowHandle.result()
+        # long-polls here for the close event (wait_new_event)
+        it = super().fetch_workflow_history_events(input)
+        fetch_page = it.fetch_next_page
+        rpc = "result" if input.wait_new_event else "history"
+
+        async def timed_fetch(*, page_size: Optional[int] = None) -> None:
+            with _Timer(rpc):
+                await fetch_page(page_size=page_size)
+
+        it.fetch_next_page = timed_fetch  # type: ignore[method-assign]
+        return it
+
+class RpcMetricsInterceptor(Interceptor):
+    """Client interceptor recording trellis_temporal_rpc_seconds{rpc=start|signal|query|result|...}."""
+
+    def intercept_client(self, next: OutboundInterceptor) -> OutboundInterceptor:
+        return _RpcMetricsOutbound(next)
+
+class ClientPool:
+    """
+    `size` clients, each with its own connection, used round-robin.
+    connect() is single-flight: concurrent first callers share one attempt.
+    """
+
+    def __init__(self, address: str, size: int = 2) -> None:
+        self.address = address
+        self.size = max(1, size)
+        self._clients: List[Client] = []
+        self._rr = itertools.count()
+        self._lock: Optional[asyncio.Lock] = None
+
+    @property
+    def connected(self) -> bool:
+        return bool(self._clients)
+
+    async def connect(self) -> None:
+        if self._clients:
+            return
+        if self._lock is None:
+            self._lock = asyncio.Lock()
+        async with self._lock:
+            if self._clients:
+                return
+            self._clients = list(await asyncio.gather(*(
+                Client.connect(self.address, data_converter=codec.data_converter(),
+                               interceptors=[RpcMetricsInterceptor(), *tracing.client_interceptors()])
+                for _ in range(self.size)
+            )))
+
+    async def get(self) -> Client:
+        await self.connect()
+        return self._clients[next(self._rr) % len(self._clients)]
+
+    async def check_health(self, timeout: float = 2.0) -> bool:
+        """One gRPC health-check round trip per channel."""
+        await self.connect()
+        results = await asyncio.gather(*(
+            c.service_client.check_health(timeout=timedelta(seconds=timeout)) for c in self._clients
+        ))
+        return all(results)
@@ -0,0 +1,79 @@
+from __future__ import annotations
+import dataclasses
+import zlib
+from typing import Callable, Dict, List, Sequence, Tuple
+
+import temporalio.converter
+from temporalio.api.common.v1 import Payload
+from temporalio.converter import DataConverter, PayloadCodec
+
+from config import PAYLOAD_COMPRESSION, PAYLOAD_COMPRESSION_THRESHOLD, PAYLOAD_COMPRESSION_LEVEL
+
+# Compressed payloads carry the whole original Payload (metadata + data), compressed,
+# under this encoding; the algorithm name travels in metadata so decoders can pick it.
+ENCODING = b"binary/trellis-compressed"
+
+Compressor = Callable[[bytes, int], bytes]
+Decompressor = Callable[[bytes], bytes]
+
+# name -> (compress(data, level), decompress(data)); register_algorithm() adds more
+ALGORITHMS: Dict[str, Tuple[Compressor, Decompressor]] = {
+    "zlib": (lambda data, level: zlib.compress(data, level), zlib.decompress),
+}
+
+def register_algorithm(name: str, compress: Compressor, decompress: Decompressor) -> None:
+    ALGORITHMS[name] = (compress, decompress)
+
+class CompressionCodec(PayloadCodec):
+    """
+    Compresses payloads whose serialized size is at least `threshold` bytes.
+    Small payloads, and payloads that would not shrink, pass through untouched.
+    algorithm=None never compresses but still decodes, so it is safe to turn
+    compression off while compressed payloads remain in history.
+    """
+
+    def __init__(self, algorithm: str | None = "zlib", threshold: int = 1024, level: int = 6) -> None:
+        if algorithm is not None and algorithm not in ALGORITHMS:
+            raise ValueError(f"unknown compression algorithm {algorithm!r}; known: {sorted(ALGORITHMS)}")
+        self.algorithm = algorithm
+        self.threshold = threshold
+        self.level = level
+
+    def _encode_one(self, p: Payload) -> Payload:
+        if self.algorithm is None:
+            return p
+        raw = p.SerializeToString()
+        if len(raw) < self.threshold:
+            return p
+        compress, _ = ALGORITHMS[self.algorithm]
+        data = compress(raw, self.level)
+        if len(data) >= len(raw):
+            return p
+        return Payload(
+            metadata={"encoding": ENCODING, "compression": self.algorithm.encode()},
+            data=data,
+        )
+
+    async def encode(self, payloads: Sequence[Payload]) -> List[Payload]:
+        return [self._encode_one(p) for p in payloads]
+
+    async def decode(self, payloads: Sequence[Payload]) -> List[Payload]:
+        out = []
+        for p in payloads:
+            if p.metadata.get("encoding") != ENCODING:
+                out.append(p)
+                continue
+            name = p.metadata.get("compression", b"").decode()
+            if name not in ALGORITHMS:
+                raise ValueError(f"payload compressed with unknown algorithm {name!r}")
+            _, decompress = ALGORITHMS[name]
+            out.append(Payload.FromString(decompress(p.data)))
+        return out
+
+def data_converter() -> DataConverter:
+    """Default converter plus the configured compression codec; pass to every Client.connect."""
+    algorithm = None if PAYLOAD_COMPRESSION in ("", "none") else PAYLOAD_COMPRESSION
+    return dataclasses.replace(
+        temporalio.converter.default(),
+        payload_codec=CompressionCodec(algorithm, PAYLOAD_COMPRESSION_THRESHOLD, PAYLOAD_COMPRESSION_LEVEL),
+    )
@@ -0,0 +1,45 @@
+# contracts.py
+"""
+Names shared by workflows.py and activities.py.
+
+Workflows schedule activities by these names instead of importing
+activities.py, so the workflow sandbox never loads db / asyncpg / stubs.
+Keep this module dependency-free: it is passed through the sandbox
+(see worker.WORKFLOW_RUNNER) and imported once per process.
+"""
+
+RECEIVE_ORDER = "receive_order_act"
+VALIDATE_ORDER = "validate_order_act"
+CHARGE_PAYMENT = "charge_payment_act"
+PREPARE_PACKAGE = "prepare_package_act"
+DISPATCH_CARRIER = "dispatch_carrier_act"
+PROJECT_STATUS = "project_status_act"
+ENQUEUE_DISPATCH = "enqueue_dispatch_act"
+DISPATCH_BATCH = "dispatch_batch_act"
+SET_ORDER_ADDRESS = "set_order_address_act"
+RELEASE_PACKAGE = "release_package_act"
+
+# Custom search attributes upserted by OrderWorkflow (registered by search_attributes.ensure_registered)
+SA_ORDER_STEP = "OrderStep"          # Keyword
+SA_ORDER_CITY = "OrderCity"          # Keyword
+SA_ORDER_APPROVED = "OrderApproved"  # Bool
+
+# DispatchWorkflow <-> ShippingWorkflow signals
+DISPATCH_WORKFLOW = "DispatchWorkflow"
+DISPATCH_ENQUEUE_SIGNAL = "enqueue"
+DISPATCH_RESULT_SIGNAL = "dispatch_result"
+
+# OrderWorkflow <-> gated ShippingWorkflow (package prepared while the charge runs)
+SHIPPING_RELEASE_SIGNAL = "release"
+SHIPPING_ABORT_SIGNAL = "abort"
+PACKAGE_PREPARED_SIGNAL = "package_prepared"
+
+def is_order_ref(order: dict) -> bool:
+    """True for a claim-check reference (order_id, snapshot_version, address) instead of a full order."""
+    return "snapshot_version" in order
+
+def dispatch_region(order: dict) -> str:
+    """Dispatcher partition for an order: explicit address.region, else the city."""
+    address = order.get("address") or {}
+    region = address.get("region") or address.get("city") or "default"
+    return "".join(c if c.isalnum() else "-" for c in str(region).lower())
@@ -1,22 +1,84 @@
 from __future__ import annotations
+import asyncio
 import asyncpg
+import base64
 import json
-from typing import Any, Dict, Optional
+import logging
+import re
+import time
+from contextlib import asynccontextmanager
+from datetime import datetime, timezone
+from typing import Any, AsyncIterator, Dict, List, Optional, Tuple
 from decimal import Decimal  # <-- added
-from config import DATABASE_URL
+from config import (
+    DATABASE_URL,
+    DB_POOL_MIN_SIZE,
+    DB_POOL_MAX_SIZE,
+    DB_STATEMENT_CACHE_SIZE,
+    DB_MAX_QUERIES,
+    DB_MAX_INACTIVE_CONN_LIFETIME_S,
+    EVENT_SYNC_TYPES,
+    EVENT_BUFFER_MAX_BATCH,
+    EVENT_BUFFER_FLUSH_INTERVAL_S,
+    EVENT_BUFFER_MAX_ROWS,
+    EXPORT_FETCH_SIZE,
+    STATUS_NOTIFY_CHANNEL,
+)
+import metrics
+
+log = logging.getLogger(__name__)
 
 _pool: Optional[asyncpg.Pool] = None
 
 async def get_pool() -> asyncpg.Pool:
     global _pool
     if _pool is None:
-        _pool = await asyncpg.create_pool(DATABASE_URL, min_size=1, max_size=4)
+        _pool = await asyncpg.create_pool(
+            DATABASE_URL,
+            min_size=DB_POOL_MIN_SIZE,
+            max_size=DB_POOL_MAX_SIZE,
+            statement_cache_size=DB_STATEMENT_CACHE_SIZE,
+            max_queries=DB_MAX_QUERIES,
+            max_inactive_connection_lifetime=DB_MAX_INACTIVE_CONN_LIFETIME_S,
+        )
     return _pool
 
-# ----- payments (idempotency by payment_id) -----
-async def try_create_payment(payment_id: str, order_id: str) -> bool:
+# ----- pool instrumentation -----
+POOL_ACQUIRE_WAIT = metrics.Histogram(
+    "trellis_db_pool_acquire_wait_seconds", "Time spent waiting for a pool connection", ("fn",))
+POOL_IN_USE = metrics.Gauge(
+    "trellis_db_pool_connections_in_use", "Connections currently checked out of the pool")
+POOL_SIZE = metrics.Gauge(
+    "trellis_db_pool_size", "Open connections in the pool",
+    fn=lambda: _pool.get_size() if _pool is not None else 0)
+POOL_MAX_SIZE = metrics.Gauge(
+    "trellis_db_pool_max_size", "Configured pool max_size", fn=lambda: DB_POOL_MAX_SIZE)
+QUERY_SECONDS = metrics.Histogram(
+    "trellis_db_query_seconds", "Time a db helper holds its connection", ("fn",))
+QUERY_ERRORS = metrics.Counter(
+    "trellis_db_query_errors_total", "db helper calls that raised", ("fn",))
+
+@asynccontextmanager
+async def acquire(fn: str) -> AsyncIterator[asyncpg.Connection]:
+    """pool.acquire() that records wait time, in-use count and hold time under label `fn`."""
     pool = await get_pool()
+    t0 = time.perf_counter()
     async with pool.acquire() as conn:
+        t1 = time.perf_counter()
+        POOL_ACQUIRE_WAIT.observe(t1 - t0, fn=fn)
+        POOL_IN_USE.inc()
+        try:
+            yield conn
+        except BaseException:
+            QUERY_ERRORS.inc(fn=fn)
+            raise
+        finally:
+            POOL_IN_USE.dec()
+            QUERY_SECONDS.observe(time.perf_counter() - t1, fn=fn)
+
+# ----- payments (idempotency by payment_id) -----
+async def try_create_payment(payment_id: str, order_id: str) -> bool:
+    async with acquire("try_create_payment") as conn:
         row = await conn.fetchrow(
             """
             INSERT INTO payments (payment_id, order_id, status)
@@ -29,8 +91,7 @@ async def try_create_payment(payment_id: str, order_id: str) -> bool:
         return bool(row)
 
 async def get_payment(payment_id: str) -> Dict[str, Any]:
-    pool = await get_pool()
-    async with pool.acquire() as conn:
+    async with acquire("get_payment") as conn:
         row = await conn.fetchrow(
             "SELECT payment_id, order_id, status, amount FROM payments WHERE payment_id=$1",
             payment_id,
@@ -44,28 +105,423 @@ async def get_payment(payment_id: str) -> Dict[str, Any]:
         return result
 
 async def mark_payment(payment_id: str, status: str, amount: int | None) -> None:
-    pool = await get_pool()
-    async with pool.acquire() as conn:
+    async with acquire("mark_payment") as conn:
         await conn.execute(
-            "UPDATE payments SET status=$2, amount=$3 WHERE payment_id=$1",
+            _MARK_PAYMENT_SQL,
             payment_id, status, amount,
         )
 
-# ----- events (optional audit) -----
-async def append_event(order_id: str, event_type: str, payload: Dict[str, Any]) -> None:
-    pool = await get_pool()
-    async with pool.acquire() as conn:
-        # Wrap in a transaction so the protocol state is clean on release
+# ----- fused charge path (used by activities.charge_payment_act) -----
+# Statements are module constants on purpose: asyncpg keeps a per-connection
+# cache of named prepared statements keyed by SQL text, so every call after the
+# first on a connection skips the parse/plan round trip.
+_CLAIM_PAYMENT_SQL = """
+WITH ins AS (
+    INSERT INTO payments (payment_id, order_id, status)
+    VALUES ($1, $2, 'created')
+    ON CONFLICT (payment_id) DO NOTHING
+    RETURNING payment_id, order_id, status, amount
+)
+SELECT payment_id, order_id, status, amount, TRUE AS created FROM ins
+UNION ALL
+SELECT payment_id, order_id, status, amount, FALSE AS created
+FROM payments
+WHERE payment_id = $1 AND NOT EXISTS (SELECT 1 FROM ins)
+"""
+_MARK_PAYMENT_SQL = "UPDATE payments SET status=$2, amount=$3 WHERE payment_id=$1"
+
+async def claim_payment(payment_id: str, order_id: str) -> Dict[str, Any]:
+    """
+    Create-or-fetch in one statement. Returns the payment row plus
+    `created`: True if this call inserted it (caller owns the charge).
+    """
+    async with acquire("claim_payment") as conn:
+        row = await conn.fetchrow(_CLAIM_PAYMENT_SQL, payment_id, order_id)
+    if row is None:
+        # Lost a race with a concurrent insert committed after our snapshot
+        return {**await get_payment(payment_id), "created": False}
+    result = dict(row)
+    if isinstance(result.get("amount"), Decimal):
+        result["amount"] = int(result["amount"])
+    return result
+
+async def complete_payment(payment_id: str, order_id: str, status: str, amount: int | None,
+                           event_type: str = "payment_charged") -> None:
+    """Status update + audit event, committed together on one connection."""
+    async with acquire("complete_payment") as conn:
         async with conn.transaction():
-            await conn.execute(
-                "INSERT INTO events (order_id, type, payload_json) VALUES ($1, $2, $3::jsonb)",
-                order_id, event_type, json.dumps(payload or {}),
+            await conn.execute(_MARK_PAYMENT_SQL, payment_id, status, amount)
+            await conn.execute(_INSERT_EVENT_SQL, *_event_row(order_id, event_type, {"amount": amount}))
+
+# ----- orders status read model -----
+# Applied projections are announced on STATUS_NOTIFY_CHANNEL (delivered on commit);
+# stale ones update nothing and notify nobody. Address is left out to keep payloads small.
+_UPSERT_ORDER_STATUS_SQL = """
+WITH up AS (
+  INSERT INTO orders (order_id, step, approved, canceled, address, version, active, updated_at)
+  VALUES ($1, $2, $3, $4, $5::jsonb, $6, $8, NOW())
+  ON CONFLICT (order_id) DO UPDATE
+  SET step = EXCLUDED.step, approved = EXCLUDED.approved, canceled = EXCLUDED.canceled,
+      address = EXCLUDED.address, version = EXCLUDED.version, active = EXCLUDED.active,
+      updated_at = EXCLUDED.updated_at
+  WHERE orders.version < EXCLUDED.version
+  RETURNING order_id, step, approved, canceled, version, active
+)
+SELECT pg_notify($7, json_build_object(
+         'order_id', order_id, 'step', step, 'approved', approved,
+         'canceled', canceled, 'version', version, 'active', active)::text)
+FROM up
+"""
+
+async def upsert_order_status(order_id: str, status: Dict[str, Any], version: int) -> bool:
+    """
+    Project a workflow status snapshot; returns False if a newer version is already stored.
+    Each applied change is also appended to the order's events as "status_changed"
+    (write-behind unless that type is in EVENT_SYNC_TYPES).
+    """
+    active = list(status.get("active") or [status.get("step")])
+    async with acquire("upsert_order_status") as conn:
+        res = await conn.execute(
+            _UPSERT_ORDER_STATUS_SQL,
+            order_id, status.get("step"), bool(status.get("approved")), bool(status.get("canceled")),
+            json.dumps(status.get("address") or {}), version, STATUS_NOTIFY_CHANNEL, active,
+        )
+    applied = res.endswith(" 1")  # "SELECT 1" when applied (and notified), "SELECT 0" when stale
+    if applied:
+        await append_event(order_id, "status_changed", {
+            "step": status.get("step"), "active": active, "approved": bool(status.get("approved")),
+            "canceled": bool(status.get("canceled")), "version": version,
+        })
+    return applied
+
+async def get_order_status(order_id: str) -> Optional[Dict[str, Any]]:
+    async with acquire("get_order_status") as conn:
+        row = await conn.fetchrow(
+            "SELECT approved, canceled, step, COALESCE(active, ARRAY[step]) AS active, address, version "
+            "FROM orders "
+            "WHERE order_id=$1 AND step IS NOT NULL",
+            order_id,
+        )
+    if not row:
+        return None
+    result = dict(row)
+    result["address"] = json.loads(result["address"]) if result["address"] else {}
+    result["active"] = list(result["active"])
+    return result
+
+# ----- claim-check order snapshots -----
+_STORE_ORDER_SNAPSHOT_SQL = """
+INSERT INTO orders (order_id, snapshot, snapshot_version)
+VALUES ($1, $2::jsonb, $3)
+ON CONFLICT (order_id) DO UPDATE
+SET snapshot = EXCLUDED.snapshot, snapshot_version = EXCLUDED.snapshot_version
+WHERE orders.snapshot_version < EXCLUDED.snapshot_version
+"""
+
+_SET_SNAPSHOT_ADDRESS_SQL = """
+UPDATE orders SET snapshot = jsonb_set(snapshot, '{address}', $2::jsonb), snapshot_version = $3
+WHERE order_id = $1 AND snapshot IS NOT NULL AND snapshot_version < $3
+"""
+
+async def store_order_snapshot(order_id: str, snapshot: Dict[str, Any], version: int) -> bool:
+    """Write the full order once; returns False if a newer snapshot is already stored."""
+    async with acquire("store_order_snapshot") as conn:
+        res = await conn.execute(_STORE_ORDER_SNAPSHOT_SQL, order_id, json.dumps(snapshot), version)
+    return res.endswith(" 1")
+
+async def set_snapshot_address(order_id: str, address: Dict[str, Any], version: int) -> bool:
+    """Patch only the address of a stored snapshot (items are not re-sent)."""
+    async with acquire("set_snapshot_address") as conn:
+        res = await conn.execute(_SET_SNAPSHOT_ADDRESS_SQL, order_id, json.dumps(address), version)
+    return res.endswith(" 1")
+
+async def get_order_snapshot(order_id: str) -> Optional[Tuple[int, Dict[str, Any]]]:
+    """(snapshot_version, snapshot) or None if the order has no snapshot."""
+    async with acquire("get_order_snapshot") as conn:
+        row = await conn.fetchrow(
+            "SELECT snapshot_version, snapshot FROM orders WHERE order_id=$1 AND snapshot IS NOT NULL",
+            order_id,
+        )
+    if not row:
+        return None
+    return row["snapshot_version"], json.loads(row["snapshot"])
+
+# ----- events (optional audit) -----
+EVENT_COLUMNS = ("order_id", "event_type", "payload", "created_at")
+_INSERT_EVENT_SQL = (
+    "INSERT INTO events (order_id, event_type, payload, created_at) VALUES ($1, $2, $3::jsonb, $4)"
+)
+EventRow = Tuple[str, str, str, datetime]
+
+def _event_row(order_id: str, event_type: str, payload: Dict[str, Any]) -> EventRow:
+    # created_at is taken at append time so buffered rows keep their real order/time
+    now = datetime.now(timezone.utc).replace(tzinfo=None)
+    return (order_id, event_type, json.dumps(payload or {}), now)
+
+def is_sync_event(event_type: str) -> bool:
+    return "*" in EVENT_SYNC_TYPES or event_type in EVENT_SYNC_TYPES
+
+EVENTS_DROPPED = metrics.Counter(
+    "trellis_event_buffer_dropped_total", "Buffered events dropped because the buffer was full")
+
+class EventBuffer:
+    """
+    Write-behind buffer for the events table.
+      - rows are flushed with one COPY by a background task, every flush_interval
+        seconds or as soon as max_batch rows are waiting; add() never waits on
+        or fails with a flush, so a DB error never fails the caller's activity,
+      - flush() / close() drain it; close_pool() calls close() so a graceful
+        shutdown loses nothing,
+      - a failed flush keeps its rows for the next attempt, up to max_rows;
+        past that the oldest rows are dropped (logged, trellis_event_buffer_dropped_total).
+    Buffered events are lost only if the process dies without shutting down
+    or the DB stays down long enough to overflow the buffer.
+    """
+
+    def __init__(self, max_batch: int, flush_interval: float, max_rows: int = EVENT_BUFFER_MAX_ROWS) -> None:
+        self.max_batch = max(1, max_batch)
+        self.flush_interval = flush_interval
+        self.max_rows = max(self.max_batch, max_rows)
+        self._rows: List[EventRow] = []
+        self._lock: Optional[asyncio.Lock] = None
+        self._wake: Optional[asyncio.Event] = None
+        self._task: Optional[asyncio.Task] = None
+
+    def __len__(self) -> int:
+        return len(self._rows)
+
+    def _trim(self) -> None:
+        excess = len(self._rows) - self.max_rows
+        if excess > 0:
+            del self._rows[:excess]
+            EVENTS_DROPPED.inc(excess)
+            log.warning("event buffer full (%d rows); dropped the %d oldest", self.max_rows, excess)
+
+    async def add(self, row: EventRow) -> None:
+        self._rows.append(row)
+        self._trim()
+        if self._task is None or self._task.done():
+            self._wake = asyncio.Event()
+            self._task = asyncio.create_task(self._run())
+        if len(self._rows) >= self.max_batch and self._wake is not None:
+            self._wake.set()
+
+    async def flush(self) -> int:
+        if self._lock is None:
+            self._lock = asyncio.Lock()
+        async with self._lock:
+            rows, self._rows = self._rows, []
+            if not rows:
+                return 0
+            try:
+                async with acquire("flush_events") as conn:
+                    await conn.copy_records_to_table("events", records=rows, columns=EVENT_COLUMNS)
+            except BaseException:
+                self._rows[:0] = rows
+                self._trim()
+                raise
+            return len(rows)
+
+    async def _run(self) -> None:
+        wake = self._wake
+        while True:
+            try:
+                await asyncio.wait_for(wake.wait(), self.flush_interval)
+            except asyncio.TimeoutError:
+                pass
+            wake.clear()
+            try:
+                await self.flush()
+            except Exception:
+                log.exception("event buffer flush failed; %d rows kept for retry", len(self._rows))
+                await asyncio.sleep(self.flush_interval)  # a full buffer must not spin on a dead DB
+
+    async def close(self) -> None:
+        task, self._task = self._task, None
+        if task is not None:
+            task.cancel()
+            try:
+                await task
+            except asyncio.CancelledError:
+                pass
+        try:
+            await self.flush()
+        except Exception:
+            log.exception("event buffer: dropping %d unflushed rows on close", len(self._rows))
+            self._rows = []
+        self._lock = self._wake = None  # bound to the closing loop
+
+_event_buffer = EventBuffer(EVENT_BUFFER_MAX_BATCH, EVENT_BUFFER_FLUSH_INTERVAL_S)
+
+async def append_event(order_id: str, event_type: str, payload: Dict[str, Any],
+                       sync: Optional[bool] = None) -> None:
+    """
+    Record an audit event. `sync` overrides the per-type default from
+    config.EVENT_SYNC_TYPES (True = committed before return, False = buffered).
+    """
+    row = _event_row(order_id, event_type, payload)
+    if sync is None:
+        sync = is_sync_event(event_type)
+    if not sync:
+        await _event_buffer.add(row)
+        return
+    async with acquire("append_event") as conn:
+        await conn.execute(_INSERT_EVENT_SQL, *row)
+
+async def flush_events() -> int:
+    """Write out everything buffered so far; returns the number of rows flushed."""
+    return await _event_buffer.flush()
+
+# ----- order timeline (keyset pagination over events_order_created_idx) -----
+EventCursor = Tuple[datetime, int]
+
+def encode_event_cursor(created_at: datetime, event_id: int) -> str:
+    raw = f"{created_at.isoformat()}|{event_id}".encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip("=")
+
+def decode_event_cursor(token: str) -> EventCursor:
+    """Inverse of encode_event_cursor; ValueError on anything malformed."""
+    try:
+        raw = base64.urlsafe_b64decode(token + "=" * (-len(token) % 4)).decode()
+        at, _, event_id = raw.partition("|")
+        return datetime.fromisoformat(at), int(event_id)
+    except Exception as e:
+        raise ValueError(f"invalid cursor {token!r}") from e
+
+async def list_order_events(order_id: str, limit: int,
+                            after: Optional[EventCursor] = None) -> List[Dict[str, Any]]:
+    """Events for one order in (created_at, id) order, strictly after `after` when given."""
+    async with acquire("list_order_events") as conn:
+        if after is None:
+            rows = await conn.fetch(
+                "SELECT id, event_type, payload, created_at FROM events "
+                "WHERE order_id=$1 ORDER BY created_at, id LIMIT $2",
+                order_id, limit,
+            )
+        else:
+            rows = await conn.fetch(
+                "SELECT id, event_type, payload, created_at FROM events "
+                "WHERE order_id=$1 AND (created_at, id) > ($2, $3) ORDER BY created_at, id LIMIT $4",
+                order_id, after[0], after[1], limit,
             )
+    return [{**dict(r), "payload": json.loads(r["payload"]) if r["payload"] else {}} for r in rows]
+
+# ----- bulk export (server-side cursors) -----
+EXPORTS_OPEN = metrics.Gauge("trellis_db_exports_open", "Exports streaming over their own connection")
+
+def exports_open() -> int:
+    return int(EXPORTS_OPEN.value())
+
+class ExportSlot:
+    """One running export, counted in EXPORTS_OPEN until release() (idempotent)."""
+
+    def __init__(self) -> None:
+        self._held = True
+        EXPORTS_OPEN.inc()
+
+    def release(self) -> None:
+        if self._held:
+            self._held = False
+            EXPORTS_OPEN.dec()
+
+def reserve_export(limit: int) -> Optional[ExportSlot]:
+    """
+    A slot for one export, or None when `limit` are already running. No await between
+    the check and the claim, so concurrent requests cannot all pass it; hand the slot
+    to stream_export, which releases it when the stream ends.
+    """
+    if exports_open() >= limit:
+        return None
+    return ExportSlot()
+
+EXPORT_COLUMNS = {
+    "events": ("id", "order_id", "event_type", "payload", "created_at"),
+    "payments": ("payment_id", "order_id", "status", "amount", "created_at"),
+}
+
+async def stream_export(table: str, start: datetime, end: datetime, event_type: Optional[str] = None,
+                        as_json: bool = False, prefetch: int = EXPORT_FETCH_SIZE,
+                        slot: Optional[ExportSlot] = None) -> AsyncIterator[Any]:
+    """
+    Rows of `table` with start <= created_at < end (unordered), read through a server-side
+    cursor `prefetch` rows at a time, so memory stays flat however many rows match.
+    as_json=True yields each row as a JSON text line built by Postgres (row_to_json),
+    otherwise asyncpg Records with EXPORT_COLUMNS[table]. Uses a dedicated connection,
+    not a pooled one, held until the iterator is exhausted or closed: a client-paced
+    download must not take a connection from the activities and API reads.
+    `slot` (reserve_export) is released when the iterator ends; without one it takes its own.
+    """
+    cols = EXPORT_COLUMNS[table]
+    where, args = "created_at >= $1 AND created_at < $2", [start, end]
+    if event_type is not None:
+        where += " AND event_type = $3"
+        args.append(event_type)
+    sql = f"SELECT {', '.join(cols)} FROM {table} WHERE {where}"
+    if as_json:
+        sql = f"SELECT row_to_json(t)::text AS line FROM ({sql}) t"
+    slot = slot or ExportSlot()
+    try:
+        conn = await asyncpg.connect(DATABASE_URL)
+        t0 = time.perf_counter()
+        try:
+            async with conn.transaction(readonly=True):  # cursors only live inside a transaction
+                async for rec in conn.cursor(sql, *args, prefetch=prefetch):
+                    yield rec["line"] if as_json else rec
+        finally:
+            QUERY_SECONDS.observe(time.perf_counter() - t0, fn=f"export_{table}")
+            await conn.close()
+    finally:
+        slot.release()
+
+# ----- events partition maintenance (retention.py) -----
+EVENT_PARTITION_RE = re.compile(r"^events_p(\d{4})_(\d{2})$")  # monthly; events_default is never matched
+async def ensure_event_partitions(months_ahead: int) -> List[str]:
+    """Create monthly partitions up to months_ahead past the current month; returns new names."""
+    async with acquire("ensure_event_partitions") as conn:
+        rows = await conn.fetch("SELECT events_ensure_partitions(CURRENT_DATE, $1) AS name", months_ahead)
+    return [r["name"] for r in rows]
+
+async def list_event_partitions() -> List[str]:
+    async with acquire("list_event_partitions") as conn:
+        rows = await conn.fetch(
+            "SELECT c.relname FROM pg_inherits i "
+            "JOIN pg_class c ON c.oid = i.inhrelid JOIN pg_class p ON p.oid = i.inhparent "
+            "WHERE p.relname = 'events' ORDER BY c.relname"
+        )
+    return [r["relname"] for r in rows]
+
+async def count_default_events() -> int:
+    """Rows in events_default, i.e. outside every monthly partition; 0 when it does not exist."""
+    async with acquire("count_default_events") as conn:
+        if await conn.fetchval("SELECT to_regclass('events_default')") is None:
+            return 0
+        return await conn.fetchval("SELECT count(*) FROM events_default")
+
+async def sweep_default_events(before: datetime, batch: int = 10000) -> int:
+    """Delete events_default rows created before `before`, `batch` rows per statement; returns the count."""
+    total = 0
+    while True:
+        async with acquire("sweep_default_events") as conn:
+            if await conn.fetchval("SELECT to_regclass('events_default')") is None:
+                return total
+            n = int((await conn.execute(
+                "DELETE FROM events_default WHERE ctid IN "
+                "(SELECT ctid FROM events_default WHERE created_at < $1 LIMIT $2)", before, batch)).split()[-1])
+        total += n
+        if n < batch:
+            return total
+
+async def drop_event_partition(name: str) -> None:
+    if not EVENT_PARTITION_RE.match(name):
+        raise ValueError(f"not a monthly events partition: {name!r}")
+    async with acquire("drop_event_partition") as conn:
+        await conn.execute(f'DROP TABLE IF EXISTS "{name}"')
 
 
 # --- test/teardown helper ---
 async def close_pool() -> None:
     global _pool
+    await _event_buffer.close()  # flush-on-shutdown, needs the pool still open
     pool, _pool = _pool, None
     if pool is not None:
         await pool.close()
@@ -1,53 +1,181 @@
 # drive.py
+"""
+Load driver for OrderWorkflow.
+
+Starts orders against Temporal (closed loop with --concurrency, or open loop
+with --rate arrivals/s), sends each one an approve / cancel / update_address
+action drawn from --mix, waits for the result, then reads the workflow's
+step timeline. Prints one JSON report with p50/p95/p99 per step
+(receive, validate, manual_review, charge, ship), end-to-end latency and
+completions per second, so runs can be diffed between releases.
+
+    python drive.py                                   # one order, approve (old behaviour)
+    python drive.py --orders 500 --concurrency 50 --mix approve=0.8,cancel=0.1,update_address=0.1
+    python drive.py --orders 1000 --rate 40 --out run.json
+"""
+import argparse
 import asyncio
+import json
 import os
 import random
-import string
+import sys
+import time
 from datetime import timedelta
+from typing import Any, Dict, List, Optional
 
-from temporalio.client import Client
-from workflows import OrderWorkflow
-from config import TASK_QUEUE_ORDERS  # must match your worker's orders queue
+from temporalio.client import Client, WorkflowFailureError
+import codec
+from workflows import OrderWorkflow, order_options
+from config import TASK_QUEUE_ORDERS, ORDER_RUN_TIMEOUT_S  # queue must match your worker's
+
+STEPS = ("receive", "validate", "manual_review", "charge", "ship")
+ACTIONS = ("approve", "cancel", "update_address")
 
 
 def _rid(n: int = 6) -> str:
-    """Random short id."""
+    """Random short id (deliberately not from the seeded rng: ids must differ between runs)."""
     alphabet = "abcdefghijklmnopqrstuvwxyz0123456789"
     return "".join(random.choices(alphabet, k=n))
 
 
-async def main() -> None:
-    # This only affects the *current* process. Ensure you also export this
-    # in the worker terminal so the activities/stubs use demo mode too.
-    os.environ.setdefault("TRELLIS_DEMO_OK", "1")
+def parse_mix(spec: str) -> Dict[str, float]:
+    mix = {}
+    for part in spec.split(","):
+        name, _, weight = part.partition("=")
+        name = name.strip()
+        if name not in ACTIONS:
+            raise SystemExit(f"unknown action in --mix: {name!r} (expected one of {ACTIONS})")
+        mix[name] = float(weight or 1)
+    return mix
+
 
-    client = await Client.connect("localhost:7233")
+def percentiles(samples: List[float]) -> Dict[str, Any]:
+    if not samples:
+        return {"n": 0}
+    s = sorted(samples)
+    pick = lambda q: s[min(len(s) - 1, int(q * len(s)))]
+    return {"n": len(s), "p50_ms": round(pick(0.50), 1), "p95_ms": round(pick(0.95), 1),
+            "p99_ms": round(pick(0.99), 1), "max_ms": round(s[-1], 1)}
 
+
+def step_durations(timeline: List[Dict[str, Any]]) -> Dict[str, float]:
+    """ms spent in each step = time until the next step was entered."""
+    out = {}
+    for cur, nxt in zip(timeline, timeline[1:]):
+        out[cur["step"]] = (nxt["at"] - cur["at"]) * 1000
+    return out
+
+
+async def run_order(client: Client, action: str, args) -> Dict[str, Any]:
     order_key = f"o-{_rid()}"
     payment_id = f"p-{_rid()}"
-    workflow_id = f"order-{order_key}"
-    print("Starting:", workflow_id, payment_id)
-
+    t0 = time.perf_counter()
     # Start the workflow on the same task queue your worker polls.
     h = await client.start_workflow(
-        OrderWorkflow.run,                     # entrypoint
-        id=workflow_id,                        # e.g. order-o-abc123
-        task_queue=TASK_QUEUE_ORDERS,          # from config.py
-        args=[order_key, payment_id, {"city": "Amherst"}],
-        run_timeout=timedelta(seconds=15),
+        OrderWorkflow.run,
+        id=f"order-{order_key}",
+        task_queue=TASK_QUEUE_ORDERS,
+        args=[order_key, payment_id, {"city": "Amherst"}, order_options()],
+        run_timeout=timedelta(seconds=args.run_timeout) if args.run_timeout > 0 else None,
         rpc_timeout=timedelta(seconds=30),
     )
-    print("Started", h.id)
 
-    # Give the worker a moment to reach manual_review; then approve.
-    await asyncio.sleep(1.0)
-    await h.signal("approve")                  # signal via handle (SDK-safe)
-    print("Approved")
+    # Give the worker a moment to reach manual_review; then act.
+    await asyncio.sleep(args.review_delay)
+    if action == "update_address":
+        await h.signal("update_address", {"city": "Boston", "street": "456 Elm Ave"})
+        await h.signal("approve")
+    else:
+        await h.signal(action)
+
+    try:
+        await h.result(rpc_timeout=timedelta(seconds=60))
+        outcome = "completed"
+    except WorkflowFailureError as e:
+        outcome = "canceled" if action == "cancel" else type(e.cause).__name__
+    e2e_ms = (time.perf_counter() - t0) * 1000
+
+    try:
+        # latest run: a long review may have continued-as-new since the start
+        latest = client.get_workflow_handle(h.id)
+        timeline = await latest.query(OrderWorkflow.timeline, rpc_timeout=timedelta(seconds=10))
+    except Exception:
+        timeline = []
+    return {"action": action, "outcome": outcome, "e2e_ms": e2e_ms, "steps": step_durations(timeline)}
+
+
+async def main(argv: Optional[List[str]] = None) -> None:
+    ap = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    ap.add_argument("--orders", type=int, default=1)
+    ap.add_argument("--concurrency", type=int, default=1, help="orders in flight (closed loop)")
+    ap.add_argument("--rate", type=float, default=0.0,
+                    help="Poisson arrivals per second (open loop); overrides --concurrency")
+    ap.add_argument("--mix", default="approve=1", help="e.g. approve=0.8,cancel=0.1,update_address=0.1")
+    ap.add_argument("--review-delay", type=float, default=1.0, help="seconds before the review action")
+    ap.add_argument("--run-timeout", type=float, default=ORDER_RUN_TIMEOUT_S, help="seconds, 0 = no cap")
+    ap.add_argument("--seed", type=int, default=None)
+    ap.add_argument("--address", default=os.getenv("TEMPORAL_ADDRESS", "localhost:7233"))
+    ap.add_argument("--out", help="also write the JSON report to this file")
+    args = ap.parse_args(argv)
+
+    # This only affects the *current* process. Ensure you also export this
+    # in the worker terminal so the activities/stubs use demo mode too.
+    os.environ.setdefault("TRELLIS_DEMO_OK", "1")
+
+    rng = random.Random(args.seed)
+    mix = parse_mix(args.mix)
+    actions = rng.choices(list(mix), weights=list(mix.values()), k=args.orders)
+
+    client = await Client.connect(args.address, data_converter=codec.data_converter())
+    results: List[Dict[str, Any]] = []
+    errors: Dict[str, int] = {}
+
+    async def one(action: str) -> None:
+        try:
+            results.append(await run_order(client, action, args))
+        except Exception as e:  # RPC-level failure: count it, keep driving
+            errors[type(e).__name__] = errors.get(type(e).__name__, 0) + 1
+        done = len(results) + sum(errors.values())
+        print(f"\r[drive] {done}/{args.orders}", end="", file=sys.stderr, flush=True)
+
+    t0 = time.perf_counter()
+    if args.rate > 0:
+        tasks = []
+        for action in actions:
+            tasks.append(asyncio.create_task(one(action)))
+            await asyncio.sleep(rng.expovariate(args.rate))
+        await asyncio.gather(*tasks)
+    else:
+        sem = asyncio.Semaphore(max(1, args.concurrency))
+
+        async def bounded(action: str) -> None:
+            async with sem:
+                await one(action)
+
+        await asyncio.gather(*(bounded(a) for a in actions))
+    elapsed = time.perf_counter() - t0
+    print(file=sys.stderr)
 
-    # Don’t use queries (they can RPC-timeout if no poller). Just wait
-    # for the workflow result with a generous client RPC timeout.
-    result = await h.result(rpc_timeout=timedelta(seconds=60))
-    print("✅ Completed with result:", result)
+    outcomes: Dict[str, int] = {}
+    for r in results:
+        outcomes[r["outcome"]] = outcomes.get(r["outcome"], 0) + 1
+    completed = outcomes.get("completed", 0)
+    report = {
+        "config": {"orders": args.orders, "concurrency": None if args.rate else args.concurrency,
+                   "rate": args.rate or None, "mix": mix, "review_delay_s": args.review_delay,
+                   "seed": args.seed},
+        "elapsed_s": round(elapsed, 3),
+        "completions_per_s": round(completed / elapsed, 2) if elapsed else 0.0,
+        "outcomes": outcomes,
+        "rpc_errors": errors,
+        "end_to_end": percentiles([r["e2e_ms"] for r in results if r["outcome"] == "completed"]),
+        "steps": {s: percentiles([r["steps"][s] for r in results if s in r["steps"]]) for s in STEPS},
+    }
+    text = json.dumps(report, indent=2, sort_keys=True)
+    print(text)
+    if args.out:
+        with open(args.out, "w") as f:
+            f.write(text + "\n")
 
 
 if __name__ == "__main__":
@@ -0,0 +1,48 @@
+# export.py
+"""
+Response body encoders for bulk exports: turn a row stream from
+db.stream_export into bytes chunks for a StreamingResponse. Rows are
+grouped `chunk_rows` at a time so each network write carries a useful
+amount of data; nothing is kept beyond the chunk being built.
+"""
+from __future__ import annotations
+import csv
+import io
+from datetime import datetime
+from typing import Any, AsyncIterator, Sequence
+
+from config import EXPORT_CHUNK_ROWS
+
+MEDIA_TYPES = {"ndjson": "application/x-ndjson", "csv": "text/csv"}
+
+async def ndjson_chunks(lines: AsyncIterator[str], chunk_rows: int = EXPORT_CHUNK_ROWS) -> AsyncIterator[bytes]:
+    """`lines` are already-serialized JSON objects, one per row."""
+    buf = []
+    async for line in lines:
+        buf.append(line)
+        if len(buf) >= chunk_rows:
+            yield ("\n".join(buf) + "\n").encode()
+            buf.clear()
+    if buf:
+        yield ("\n".join(buf) + "\n").encode()
+
+def _csv_value(v: Any) -> Any:
+    return v.isoformat() if isinstance(v, datetime) else v
+
+async def csv_chunks(records: AsyncIterator[Any], columns: Sequence[str],
+                     chunk_rows: int = EXPORT_CHUNK_ROWS) -> AsyncIterator[bytes]:
+    """Header row first, then one CSV row per record (values in `columns` order)."""
+    out = io.StringIO()
+    writer = csv.writer(out)
+    writer.writerow(columns)
+    n = 0
+    async for rec in records:
+        writer.writerow([_csv_value(rec[c]) for c in columns])
+        n += 1
+        if n >= chunk_rows:
+            yield out.getvalue().encode()
+            out.seek(0)
+            out.truncate()
+            n = 0
+    if out.tell():
+        yield out.getvalue().encode()
@@ -1,3 +1,54 @@
-ALTER TABLE events ADD COLUMN IF NOT EXISTS type TEXT;
-ALTER TABLE events ADD COLUMN IF NOT EXISTS payload_json JSONB;
-ALTER TABLE events DROP COLUMN IF EXISTS event_type;
+-- Migration for databases created with an older events layout:
+--   1. old column names (type / payload_json) -> event_type / payload
+--   2. unpartitioned events table -> monthly range partitions on created_at
+-- The canonical layout is ../schema.sql, which must run first (it defines
+-- events_ensure_partitions). Safe to re-run: each step only fires when needed.
+DO $$
+BEGIN
+  IF EXISTS (SELECT 1 FROM information_schema.columns
+             WHERE table_name = 'events' AND column_name = 'type') THEN
+    IF EXISTS (SELECT 1 FROM information_schema.columns
+               WHERE table_name = 'events' AND column_name = 'event_type') THEN
+      UPDATE events SET event_type = COALESCE(event_type, type);
+      ALTER TABLE events DROP COLUMN type;
+    ELSE
+      ALTER TABLE events RENAME COLUMN type TO event_type;
+    END IF;
+  END IF;
+
+  IF EXISTS (SELECT 1 FROM information_schema.columns
+             WHERE table_name = 'events' AND column_name = 'payload_json') THEN
+    IF EXISTS (SELECT 1 FROM information_schema.columns
+               WHERE table_name = 'events' AND column_name = 'payload') THEN
+      UPDATE events SET payload = COALESCE(payload, payload_json);
+      ALTER TABLE events DROP COLUMN payload_json;
+    ELSE
+      ALTER TABLE events RENAME COLUMN payload_json TO payload;
+    END IF;
+  END IF;
+END $$;
+
+UPDATE events SET event_type = 'unknown' WHERE event_type IS NULL;
+ALTER TABLE events ALTER COLUMN event_type SET NOT NULL;
+
+-- Step 2: copy an unpartitioned events table into the partitioned layout. Ids keep
+-- coming from the same sequence. Runs in one transaction; writers block until it commits.
+DO $$
+DECLARE
+  first_month DATE;
+BEGIN
+  IF EXISTS (SELECT 1 FROM pg_class WHERE relname = 'events' AND relkind = 'r') THEN
+    ALTER TABLE events RENAME TO events_unpartitioned;
+    UPDATE events_unpartitioned SET created_at = NOW() WHERE created_at IS NULL;
+    CREATE TABLE events (LIKE events_unpartitioned INCLUDING DEFAULTS)
+      PARTITION BY RANGE (created_at);
+    ALTER TABLE events ADD PRIMARY KEY (id, created_at);
+    SELECT date_trunc('month', MIN(created_at))::date INTO first_month FROM events_unpartitioned;
+    PERFORM events_ensure_partitions(COALESCE(first_month, CURRENT_DATE), 3);
+    INSERT INTO events SELECT * FROM events_unpartitioned;
+    ALTER SEQUENCE events_id_seq OWNED BY events.id;
+    DROP TABLE events_unpartitioned;
+  END IF;
+END $$;
+
+CREATE INDEX IF NOT EXISTS events_order_created_idx ON events (order_id, created_at, id);
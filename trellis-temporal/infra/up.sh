@@ -13,6 +13,9 @@ done
 echo "✅ Postgres ready, applying schema..."
 docker cp ../schema.sql temporal-postgresql:/tmp/schema.sql
 docker exec temporal-postgresql psql -U temporal -d temporal -f /tmp/schema.sql -v ON_ERROR_STOP=1
+# bring databases created with an older events layout (columns, partitioning) in line with schema.sql
+docker cp schema.sql temporal-postgresql:/tmp/migrate.sql
+docker exec temporal-postgresql psql -U temporal -d temporal -f /tmp/migrate.sql -v ON_ERROR_STOP=1
 
 echo "🚀 Infra ready:"
 echo "- Temporal gRPC: 127.0.0.1:7233"
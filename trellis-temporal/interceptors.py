@@ -0,0 +1,168 @@
+# interceptors.py
+"""
+Worker interceptors feeding metrics.py:
+  - activities: schedule-to-start latency, duration by outcome, retries
+    (per activity type and task queue);
+  - workflows: workflow time spent in each order step, manual_review included,
+    read from the workflow's `timeline` query, plus how runs end.
+Workflow-side observations are skipped while replaying, so a history replayed
+after a cache eviction is not counted twice.
+"""
+from __future__ import annotations
+import asyncio
+import time
+from typing import Any, Callable, List, Optional, Type
+
+from temporalio import activity, workflow
+from temporalio.worker import (
+    ActivityInboundInterceptor,
+    ContinueAsNewInput,
+    ExecuteActivityInput,
+    ExecuteWorkflowInput,
+    Interceptor,
+    StartActivityInput,
+    StartChildWorkflowInput,
+    StartLocalActivityInput,
+    WorkflowInboundInterceptor,
+    WorkflowInterceptorClassInput,
+    WorkflowOutboundInterceptor,
+)
+
+import metrics
+
+# seconds up to a day: manual_review waits for a person
+STEP_BUCKETS = (0.01, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 300, 900, 3600, 4 * 3600, 86400)
+
+ACTIVITY_SCHEDULE_TO_START = metrics.Histogram(
+    "trellis_activity_schedule_to_start_seconds",
+    "Time an activity attempt waited in its task queue", ("activity", "task_queue"))
+ACTIVITY_SECONDS = metrics.Histogram(
+    "trellis_activity_seconds", "Activity attempt duration", ("activity", "task_queue", "outcome"))
+ACTIVITY_RETRIES = metrics.Counter(
+    "trellis_activity_retries_total", "Activity attempts after the first", ("activity", "task_queue"))
+WORKFLOW_STEP_SECONDS = metrics.Histogram(
+    "trellis_workflow_step_seconds", "Workflow time spent in each step",
+    ("workflow", "step", "task_queue"), buckets=STEP_BUCKETS)
+WORKFLOW_RUNS = metrics.Counter(
+    "trellis_workflow_runs_total", "Workflow runs by how they ended", ("workflow", "task_queue", "outcome"))
+
+class _ActivityMetricsInbound(ActivityInboundInterceptor):
+    async def execute_activity(self, input: ExecuteActivityInput) -> Any:
+        info = activity.info()
+        labels = {"activity": info.activity_type, "task_queue": info.task_queue}
+        if not info.is_local:  # local activities never wait in a queue
+            waited = (info.started_time - info.current_attempt_scheduled_time).total_seconds()
+            ACTIVITY_SCHEDULE_TO_START.observe(max(0.0, waited), **labels)
+        if info.attempt > 1:
+            ACTIVITY_RETRIES.inc(**labels)
+        outcome = "failed"
+        t0 = time.perf_counter()
+        try:
+            result = await super().execute_activity(input)
+            outcome = "ok"
+            return result
+        except asyncio.CancelledError:
+            outcome = "canceled"
+            raise
+        finally:
+            ACTIVITY_SECONDS.observe(time.perf_counter() - t0, outcome=outcome, **labels)
+
+class _StepTracker:
+    """
+    Turns a workflow's timeline ([{"step", "at"}, ...], carried across continue-as-new)
+    into step durations. A step is observed by the run in which the next step was
+    entered, so a review that spans several runs is still one observation.
+    """
+
+    def __init__(self, timeline: Callable[[], List[dict]]) -> None:
+        self._timeline = timeline
+        self._next = 0
+
+    def observe(self, closing: bool = False) -> None:
+        timeline = self._timeline()
+        info = workflow.info()
+        run_start = info.start_time.timestamp()
+        replaying = workflow.unsafe.is_replaying()
+        for i in range(self._next, len(timeline) - 1):
+            ended = timeline[i + 1]["at"]
+            if ended >= run_start and not replaying:
+                WORKFLOW_STEP_SECONDS.observe(ended - timeline[i]["at"], workflow=info.workflow_type,
+                                              step=timeline[i]["step"], task_queue=info.task_queue)
+        self._next = max(self._next, len(timeline) - 1)
+        if closing and timeline and not replaying:
+            # the run ended inside its last step (e.g. canceled in manual_review)
+            last = timeline[-1]
+            if last["step"] != "done":
+                WORKFLOW_STEP_SECONDS.observe(workflow.now().timestamp() - last["at"], workflow=info.workflow_type,
+                                              step=last["step"], task_queue=info.task_queue)
+
+class _WorkflowMetricsOutbound(WorkflowOutboundInterceptor):
+    # every step change is followed by a command (status projection, activity or child
+    # start), so checking the timeline here sees each transition in the task it happened
+    def __init__(self, next: WorkflowOutboundInterceptor, inbound: "_WorkflowMetricsInbound") -> None:
+        super().__init__(next)
+        self._inbound = inbound
+
+    def start_activity(self, input: StartActivityInput) -> workflow.ActivityHandle:
+        self._inbound.observe_steps()
+        return super().start_activity(input)
+
+    def start_local_activity(self, input: StartLocalActivityInput) -> workflow.ActivityHandle:
+        self._inbound.observe_steps()
+        return super().start_local_activity(input)
+
+    async def start_child_workflow(self, input: StartChildWorkflowInput) -> workflow.ChildWorkflowHandle:
+        self._inbound.observe_steps()
+        return await super().start_child_workflow(input)
+
+    def continue_as_new(self, input: ContinueAsNewInput) -> Any:
+        self._inbound.observe_steps()
+        return super().continue_as_new(input)
+
+class _WorkflowMetricsInbound(WorkflowInboundInterceptor):
+    _steps: Optional[_StepTracker] = None
+
+    def init(self, outbound: WorkflowOutboundInterceptor) -> None:
+        super().init(_WorkflowMetricsOutbound(outbound, self))
+
+    def observe_steps(self, closing: bool = False) -> None:
+        if self._steps is not None:
+            self._steps.observe(closing)
+
+    def _count_run(self, outcome: str) -> None:
+        if not workflow.unsafe.is_replaying():
+            info = workflow.info()
+            WORKFLOW_RUNS.inc(workflow=info.workflow_type, task_queue=info.task_queue, outcome=outcome)
+
+    async def execute_workflow(self, input: ExecuteWorkflowInput) -> Any:
+        timeline = getattr(getattr(input.run_fn, "__self__", None), "timeline", None)
+        if callable(timeline):
+            self._steps = _StepTracker(timeline)
+        try:
+            result = await super().execute_workflow(input)
+        except workflow.ContinueAsNewError:
+            self._count_run("continued_as_new")
+            raise
+        except asyncio.CancelledError:
+            self.observe_steps(closing=True)
+            self._count_run("canceled")
+            raise
+        except Exception:
+            # BaseExceptions other than cancellation are the SDK tearing the run down (eviction)
+            self.observe_steps(closing=True)
+            self._count_run("failed")
+            raise
+        self.observe_steps(closing=True)
+        self._count_run("completed")
+        return result
+
+class WorkerMetricsInterceptor(Interceptor):
+    """Pass in Worker(interceptors=[...]); see the module docstring for the series it records."""
+
+    def intercept_activity(self, next: ActivityInboundInterceptor) -> ActivityInboundInterceptor:
+        return _ActivityMetricsInbound(next)
+
+    def workflow_interceptor_class(
+        self, input: WorkflowInterceptorClassInput
+    ) -> Optional[Type[WorkflowInboundInterceptor]]:
+        return _WorkflowMetricsInbound
@@ -0,0 +1,78 @@
+# retention.py
+"""
+Events partition maintenance; run daily (cron / k8s CronJob):
+creates monthly partitions ahead of time and drops those that ended more than
+TRELLIS_EVENT_RETENTION_MONTHS months before the current month. Rows that landed
+in events_default (no monthly partition covered them) are deleted on the same
+cutoff; if any remain, it logs a warning and exits 1 so the job alerts: they
+are outside retention until someone looks, and they stop the partition for
+their month from being created.
+
+    python retention.py                     # apply
+    python retention.py --dry-run           # only print what would be dropped
+    python retention.py --keep-months 3 --ahead 2
+"""
+import argparse
+import asyncio
+import json
+import logging
+import sys
+from datetime import date, datetime
+from typing import List, Optional
+
+import db
+from config import EVENT_RETENTION_MONTHS, EVENT_PARTITIONS_AHEAD
+
+log = logging.getLogger("retention")
+
+
+def _month_index(d: date) -> int:
+    return d.year * 12 + d.month - 1
+
+
+def expired_partitions(names: List[str], today: date, keep_months: int) -> List[str]:
+    """Monthly partitions entirely older than the `keep_months` months before today's month."""
+    cutoff = _month_index(today) - keep_months
+    out = []
+    for name in names:
+        m = db.EVENT_PARTITION_RE.match(name)
+        if m and int(m.group(1)) * 12 + int(m.group(2)) - 1 < cutoff:
+            out.append(name)
+    return sorted(out)
+
+
+def retention_cutoff(today: date, keep_months: int) -> datetime:
+    """Start of the oldest kept month; events_default rows created before it are swept."""
+    m = _month_index(today) - keep_months
+    return datetime(m // 12, m % 12 + 1, 1)
+
+
+async def main(argv: Optional[List[str]] = None) -> int:
+    ap = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    ap.add_argument("--keep-months", type=int, default=EVENT_RETENTION_MONTHS)
+    ap.add_argument("--ahead", type=int, default=EVENT_PARTITIONS_AHEAD)
+    ap.add_argument("--dry-run", action="store_true")
+    args = ap.parse_args(argv)
+
+    try:
+        created = [] if args.dry_run else await db.ensure_event_partitions(args.ahead)
+        expired = expired_partitions(await db.list_event_partitions(), date.today(), args.keep_months)
+        swept = 0
+        if not args.dry_run:
+            for name in expired:
+                await db.drop_event_partition(name)
+            swept = await db.sweep_default_events(retention_cutoff(date.today(), args.keep_months))
+        default_rows = await db.count_default_events()
+    finally:
+        await db.close_pool()
+    print(json.dumps({"created": created, "dropped" if not args.dry_run else "would_drop": expired,
+                      "default_swept": swept, "default_rows": default_rows}))
+    if default_rows:
+        log.warning("events_default holds %d rows outside the monthly partitions", default_rows)
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO)
+    sys.exit(asyncio.run(main()))
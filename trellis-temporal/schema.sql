@@ -4,6 +4,22 @@ CREATE TABLE IF NOT EXISTS orders (
   created_at TIMESTAMP DEFAULT NOW()
 );
 
+-- Status read model, projected by OrderWorkflow (project_status_act) and served by GET /status.
+-- version only moves forward, so late or retried projections never overwrite newer state.
+ALTER TABLE orders ADD COLUMN IF NOT EXISTS step       TEXT;
+ALTER TABLE orders ADD COLUMN IF NOT EXISTS approved   BOOLEAN NOT NULL DEFAULT FALSE;
+ALTER TABLE orders ADD COLUMN IF NOT EXISTS canceled   BOOLEAN NOT NULL DEFAULT FALSE;
+ALTER TABLE orders ADD COLUMN IF NOT EXISTS address    JSONB;
+ALTER TABLE orders ADD COLUMN IF NOT EXISTS version    BIGINT NOT NULL DEFAULT 0;
+ALTER TABLE orders ADD COLUMN IF NOT EXISTS updated_at TIMESTAMP DEFAULT NOW();
+-- every step in progress, step first (e.g. {charge,prepare} while the package is prepared alongside)
+ALTER TABLE orders ADD COLUMN IF NOT EXISTS active     TEXT[];
+
+-- Claim-check order snapshot (items + address), written once at receive and patched on
+-- address changes; activities load it by (order_id, snapshot_version) through an LRU cache.
+ALTER TABLE orders ADD COLUMN IF NOT EXISTS snapshot         JSONB;
+ALTER TABLE orders ADD COLUMN IF NOT EXISTS snapshot_version BIGINT NOT NULL DEFAULT 0;
+
 -- Idempotent payments (payment_id is the idempotency key)
 CREATE TABLE IF NOT EXISTS payments (
   payment_id  TEXT PRIMARY KEY,
@@ -13,12 +29,46 @@ CREATE TABLE IF NOT EXISTS payments (
   created_at  TIMESTAMP DEFAULT NOW()
 );
 
--- Optional event log for observability
+-- Optional event log for observability (written by db.append_event, buffered or sync per type).
+-- Range-partitioned by month on created_at: partitions are events_pYYYY_MM, created ahead and
+-- dropped after the retention window by retention.py; events_default catches anything else.
+-- Databases with the old unpartitioned table are converted by infra/schema.sql.
 CREATE TABLE IF NOT EXISTS events (
-  id         BIGSERIAL PRIMARY KEY,
+  id         BIGSERIAL,
   order_id   TEXT NOT NULL,
   event_type TEXT NOT NULL,
   payload    JSONB,
-  created_at TIMESTAMP DEFAULT NOW()
-);
+  created_at TIMESTAMP NOT NULL DEFAULT NOW(),
+  PRIMARY KEY (id, created_at)
+) PARTITION BY RANGE (created_at);
+
+-- Creates the default partition and monthly partitions from from_month through
+-- months_ahead months after the current one; returns the names it created.
+-- No-op on an unpartitioned events table.
+CREATE OR REPLACE FUNCTION events_ensure_partitions(from_month DATE, months_ahead INT)
+RETURNS SETOF TEXT LANGUAGE plpgsql AS $$
+DECLARE
+  m        DATE := date_trunc('month', from_month)::date;
+  last     DATE := (date_trunc('month', NOW()) + make_interval(months => months_ahead))::date;
+  part     TEXT;
+BEGIN
+  IF NOT EXISTS (SELECT 1 FROM pg_partitioned_table pt JOIN pg_class c ON c.oid = pt.partrelid
+                 WHERE c.relname = 'events') THEN
+    RETURN;
+  END IF;
+  CREATE TABLE IF NOT EXISTS events_default PARTITION OF events DEFAULT;
+  WHILE m <= last LOOP
+    part := 'events_p' || to_char(m, 'YYYY_MM');
+    IF to_regclass(part) IS NULL THEN
+      EXECUTE format('CREATE TABLE %I PARTITION OF events FOR VALUES FROM (%L) TO (%L)',
+                     part, m, (m + INTERVAL '1 month')::date);
+      RETURN NEXT part;
+    END IF;
+    m := (m + INTERVAL '1 month')::date;
+  END LOOP;
+END $$;
+
+SELECT events_ensure_partitions(CURRENT_DATE, 3);
 
+-- Order timeline lookups / keyset pagination (GET /orders/{order_id}/events)
+CREATE INDEX IF NOT EXISTS events_order_created_idx ON events (order_id, created_at, id);
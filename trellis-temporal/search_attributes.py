@@ -0,0 +1,53 @@
+# search_attributes.py
+"""
+Order search attributes: typed keys, namespace registration and the
+visibility queries the API builds from them.
+"""
+from __future__ import annotations
+from typing import Optional
+
+from temporalio.api.enums.v1 import IndexedValueType
+from temporalio.api.operatorservice.v1 import AddSearchAttributesRequest, ListSearchAttributesRequest
+from temporalio.client import Client
+from temporalio.common import SearchAttributeKey
+from temporalio.service import RPCError, RPCStatusCode
+
+from contracts import SA_ORDER_APPROVED, SA_ORDER_CITY, SA_ORDER_STEP
+
+ORDER_STEP = SearchAttributeKey.for_keyword(SA_ORDER_STEP)
+ORDER_CITY = SearchAttributeKey.for_keyword(SA_ORDER_CITY)
+ORDER_APPROVED = SearchAttributeKey.for_bool(SA_ORDER_APPROVED)
+ALL = (ORDER_STEP, ORDER_CITY, ORDER_APPROVED)
+
+async def ensure_registered(client: Client) -> list:
+    """Add any missing order search attributes to the client's namespace; returns the names added."""
+    existing = await client.operator_service.list_search_attributes(
+        ListSearchAttributesRequest(namespace=client.namespace))
+    missing = {k.name: IndexedValueType.ValueType(k.indexed_value_type.value) for k in ALL
+               if k.name not in existing.custom_attributes}
+    if missing:
+        try:
+            await client.operator_service.add_search_attributes(
+                AddSearchAttributesRequest(namespace=client.namespace, search_attributes=missing))
+        except RPCError as e:
+            # another worker registered them first
+            if e.status != RPCStatusCode.ALREADY_EXISTS:
+                raise
+    return sorted(missing)
+
+def _quote(value: str) -> str:
+    return "'" + value.replace("\\", "\\\\").replace("'", "\\'") + "'"
+
+def order_query(step: Optional[str] = None, city: Optional[str] = None,
+                approved: Optional[bool] = None, running_only: bool = True) -> str:
+    """Visibility query over OrderWorkflow runs filtered by the order search attributes."""
+    parts = ["WorkflowType = 'OrderWorkflow'"]
+    if running_only:
+        parts.append("ExecutionStatus = 'Running'")
+    if step is not None:
+        parts.append(f"{SA_ORDER_STEP} = {_quote(step)}")
+    if city is not None:
+        parts.append(f"{SA_ORDER_CITY} = {_quote(city)}")
+    if approved is not None:
+        parts.append(f"{SA_ORDER_APPROVED} = {'true' if approved else 'false'}")
+    return " AND ".join(parts)
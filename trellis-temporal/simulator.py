@@ -0,0 +1,185 @@
+# simulator.py
+"""
+Seeded latency / failure simulator behind the external-call stubs in stubs.py.
+
+Each stub has a StubProfile: a latency distribution, an error rate, a timeout
+rate (the call hangs for hang_s, so the activity's call guard / timeouts fire)
+and an optional rate limit (token bucket; calls over it fail at once). A
+profile may change over time through phases, each applying its overrides from
+`after_s` seconds after the simulator started:
+    {"*": {"latency_ms": 40, "distribution": "lognormal", "spread": 0.6},
+     "payment_charged": {"latency_ms": 250, "error_rate": 0.02,
+                         "phases": [{"after_s": 60, "error_rate": 0.3}, {"after_s": 120, "error_rate": 0.02}]},
+     "carrier_dispatched": {"rate_limit_per_s": 50, "burst": 10}}
+"*" is the base for every stub. Profiles come from TRELLIS_SIM_PROFILES_FILE and/or
+TRELLIS_SIM_PROFILES (inline wins), like activity_profiles.py.
+
+Every stub draws from its own Random(seed, stub name), three numbers per call
+whatever the outcome, so one seed gives the same sequence per stub regardless of
+how calls to different stubs interleave. Rate limiting and phases follow the
+clock and are reproducible only as far as the call timing is.
+"""
+from __future__ import annotations
+import asyncio
+import dataclasses
+import json
+import math
+import random
+import time
+from dataclasses import dataclass
+from statistics import NormalDist
+from typing import Any, Callable, Dict, Iterable, List, Optional, Tuple
+
+import metrics
+
+DISTRIBUTIONS = ("fixed", "uniform", "exponential", "lognormal")
+_NORMAL = NormalDist()
+
+SIM_CALLS = metrics.Counter(
+    "trellis_sim_calls_total", "Simulated stub calls by outcome", ("stub", "outcome"))
+
+class SimulatedFailure(RuntimeError):
+    pass
+
+class SimulatedRateLimit(SimulatedFailure):
+    pass
+
+@dataclass(frozen=True)
+class StubProfile:
+    # median for lognormal, mean for exponential, centre for uniform
+    latency_ms: float = 0.0
+    distribution: str = "fixed"
+    # uniform: +/- spread * latency_ms; lognormal: sigma
+    spread: float = 0.5
+    max_latency_ms: Optional[float] = None
+    error_rate: float = 0.0
+    timeout_rate: float = 0.0
+    hang_s: float = 300.0
+    rate_limit_per_s: Optional[float] = None
+    burst: int = 1
+
+    def latency_s(self, u: float) -> float:
+        """Latency for the uniform draw u in [0, 1), by inverse CDF."""
+        m = self.latency_ms
+        if self.distribution == "uniform":
+            ms = m + (2 * u - 1) * self.spread * m
+        elif self.distribution == "exponential":
+            ms = -m * math.log(1 - u)
+        elif self.distribution == "lognormal":
+            ms = m * math.exp(self.spread * _NORMAL.inv_cdf(min(max(u, 1e-12), 1 - 1e-12)))
+        else:
+            ms = m
+        if self.max_latency_ms is not None:
+            ms = min(ms, self.max_latency_ms)
+        return max(0.0, ms) / 1000
+
+@dataclass(frozen=True)
+class Outcome:
+    outcome: str  # ok | error | timeout | rate_limited
+    latency_s: float
+
+# the stubs' behaviour before profiles existed: a third of calls fail, a third hang
+LEGACY = {"*": {"error_rate": 0.33, "timeout_rate": 0.34}}
+
+_FIELDS = {f.name for f in dataclasses.fields(StubProfile)}
+
+def _profile(base: StubProfile, where: str, patch: Dict[str, Any]) -> StubProfile:
+    unknown = set(patch) - _FIELDS
+    if unknown:
+        raise ValueError(f"sim profile {where}: unknown fields {sorted(unknown)}")
+    p = dataclasses.replace(base, **patch)
+    if p.distribution not in DISTRIBUTIONS:
+        raise ValueError(f"sim profile {where}: distribution must be one of {DISTRIBUTIONS}")
+    if p.error_rate + p.timeout_rate > 1:
+        raise ValueError(f"sim profile {where}: error_rate + timeout_rate > 1")
+    return p
+
+Schedule = List[Tuple[float, StubProfile]]  # (after_s, profile), ascending
+
+def schedules(spec: Dict[str, Dict[str, Any]], names: Iterable[str]) -> Dict[str, Schedule]:
+    """Resolve a profile spec into a schedule per stub; phases accumulate in after_s order."""
+    names = list(names)
+    unknown = set(spec) - set(names) - {"*"}
+    if unknown:
+        raise ValueError(f"sim profiles for unknown stubs {sorted(unknown)}; known: {names}")
+    out: Dict[str, Schedule] = {}
+    for name in names:
+        entries = [e for e in (spec.get("*"), spec.get(name)) if e]
+        fields = {k: v for e in entries for k, v in e.items() if k != "phases"}
+        current = _profile(StubProfile(), name, fields)
+        schedule = [(0.0, current)]
+        phases = sorted((ph for e in entries for ph in e.get("phases", ())), key=lambda ph: ph["after_s"])
+        for ph in phases:
+            patch = {k: v for k, v in ph.items() if k != "after_s"}
+            current = _profile(current, f"{name} phase after_s={ph['after_s']}", patch)
+            schedule.append((float(ph["after_s"]), current))
+        out[name] = schedule
+    return out
+
+def load_spec(file: str = "", inline: str = "") -> Dict[str, Dict[str, Any]]:
+    """Profile spec from file and/or inline JSON (inline entries replace the file's); LEGACY when neither."""
+    spec: Dict[str, Dict[str, Any]] = {}
+    if file:
+        with open(file) as f:
+            spec.update(json.load(f))
+    if inline:
+        spec.update(json.loads(inline))
+    return spec if (file or inline) else LEGACY
+
+class Simulator:
+    def __init__(self, spec: Dict[str, Dict[str, Any]], names: Iterable[str], seed: int = 0,
+                 enabled: bool = True, clock: Callable[[], float] = time.monotonic) -> None:
+        self.enabled = enabled
+        self.seed = seed
+        self._schedules = schedules(spec, names)
+        self._clock = clock
+        self._started = clock()
+        self._rngs = {n: random.Random(f"{seed}:{n}") for n in self._schedules}
+        self._buckets: Dict[str, Tuple[float, float]] = {}  # stub -> (tokens, last refill)
+
+    def profile(self, name: str) -> StubProfile:
+        """The profile in force for `name` now."""
+        elapsed = self._clock() - self._started
+        current = self._schedules[name][0][1]
+        for after_s, p in self._schedules[name]:
+            if after_s > elapsed:
+                break
+            current = p
+        return current
+
+    def _take_token(self, name: str, p: StubProfile) -> bool:
+        if not p.rate_limit_per_s:
+            return True
+        now = self._clock()
+        tokens, last = self._buckets.get(name, (float(p.burst), now))
+        tokens = min(float(p.burst), tokens + (now - last) * p.rate_limit_per_s)
+        ok = tokens >= 1
+        self._buckets[name] = (tokens - 1 if ok else tokens, now)
+        return ok
+
+    def plan(self, name: str) -> Outcome:
+        """Decide one call without waiting; call() acts on it."""
+        p = self.profile(name)
+        rng = self._rngs[name]
+        u_fail, u_latency, u_hang = rng.random(), rng.random(), rng.random()
+        if not self._take_token(name, p):
+            return Outcome("rate_limited", 0.0)
+        latency = p.latency_s(u_latency)
+        if u_fail < p.error_rate:
+            return Outcome("error", latency)
+        if u_fail < p.error_rate + p.timeout_rate:
+            # hang around hang_s; the spread keeps the hung calls from all timing out together
+            return Outcome("timeout", p.hang_s * (0.9 + 0.2 * u_hang))
+        return Outcome("ok", latency)
+
+    async def call(self, name: str) -> None:
+        if not self.enabled:
+            return
+        o = self.plan(name)
+        SIM_CALLS.inc(stub=name, outcome=o.outcome)
+        if o.latency_s:
+            await asyncio.sleep(o.latency_s)
+        if o.outcome == "rate_limited":
+            raise SimulatedRateLimit(f"{name}: rate limited (simulated)")
+        if o.outcome == "error":
+            raise SimulatedFailure(f"{name}: forced failure (simulated)")
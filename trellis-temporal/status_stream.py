@@ -0,0 +1,124 @@
+# status_stream.py
+"""
+Fan-out of order status changes to SSE / long-poll clients.
+
+db.upsert_order_status NOTIFYs STATUS_NOTIFY_CHANNEL whenever a projection is
+applied. StatusHub holds one dedicated LISTEN connection per API process (not
+a pool connection) and hands each notification to that order's subscribers
+through small per-subscriber queues, so thousands of waiting clients cost one
+Postgres connection and no Temporal queries.
+"""
+from __future__ import annotations
+import asyncio
+import contextlib
+import json
+import logging
+from typing import Any, Dict, Iterator, Optional, Set
+
+import asyncpg
+
+from config import DATABASE_URL, STATUS_NOTIFY_CHANNEL
+
+log = logging.getLogger(__name__)
+
+def is_terminal(status: Dict[str, Any]) -> bool:
+    return status.get("step") == "done" or bool(status.get("canceled"))
+
+class StatusHub:
+    def __init__(self, channel: str = STATUS_NOTIFY_CHANNEL, dsn: str = DATABASE_URL,
+                 queue_size: int = 16) -> None:
+        self.channel = channel
+        self._dsn = dsn
+        self._queue_size = queue_size
+        self._subs: Dict[str, Set[asyncio.Queue]] = {}
+        self._conn: Optional[asyncpg.Connection] = None
+        self._lock: Optional[asyncio.Lock] = None
+        self._closed = False
+
+    @property
+    def listening(self) -> bool:
+        return self._conn is not None and not self._conn.is_closed()
+
+    def subscriber_count(self) -> int:
+        return sum(len(qs) for qs in self._subs.values())
+
+    async def start(self) -> None:
+        """Open the LISTEN connection if it is not open yet (idempotent, safe to call per request)."""
+        if self.listening:
+            return
+        if self._lock is None:
+            self._lock = asyncio.Lock()
+        async with self._lock:
+            if self.listening:
+                return
+            conn = await asyncpg.connect(self._dsn)
+            await conn.add_listener(self.channel, self._on_notify)
+            conn.add_termination_listener(self._on_terminated)
+            self._conn, self._closed = conn, False
+            log.info("listening on %s", self.channel)
+
+    async def close(self) -> None:
+        self._closed = True
+        conn, self._conn = self._conn, None
+        if conn is not None and not conn.is_closed():
+            await conn.close()
+
+    def _on_terminated(self, conn: asyncpg.Connection) -> None:
+        if self._conn is conn:
+            self._conn = None
+        if not self._closed:
+            # streams re-read the read model on their heartbeat, so gaps heal; the next
+            # request reopens the connection
+            log.warning("status LISTEN connection lost; reopening on next request")
+
+    def _on_notify(self, conn: Any, pid: int, channel: str, payload: str) -> None:
+        self.dispatch(payload)
+
+    def dispatch(self, payload: str) -> int:
+        """Deliver one NOTIFY payload to the order's subscribers; returns how many got it."""
+        try:
+            msg = json.loads(payload)
+            queues = self._subs.get(msg["order_id"])
+        except (ValueError, KeyError, TypeError):
+            log.warning("bad status notification: %r", payload)
+            return 0
+        if not queues:
+            return 0
+        for q in queues:
+            if q.full():
+                q.get_nowait()  # slow consumer: drop the oldest, the newest state is what matters
+            q.put_nowait(msg)
+        return len(queues)
+
+    @contextlib.contextmanager
+    def subscribe(self, order_id: str) -> Iterator[asyncio.Queue]:
+        """
+        Queue receiving this order's status notifications while the block runs.
+        Subscribe before reading the current state so no change falls in between.
+        """
+        q: asyncio.Queue = asyncio.Queue(self._queue_size)
+        self._subs.setdefault(order_id, set()).add(q)
+        try:
+            yield q
+        finally:
+            qs = self._subs.get(order_id)
+            if qs is not None:
+                qs.discard(q)
+                if not qs:
+                    del self._subs[order_id]
+
+    @staticmethod
+    async def next_change(q: asyncio.Queue, since_step: Optional[str], timeout: float) -> Optional[Dict[str, Any]]:
+        """First notification whose step differs from since_step, or None after `timeout` seconds."""
+        loop = asyncio.get_running_loop()
+        deadline = loop.time() + timeout
+        while True:
+            remaining = deadline - loop.time()
+            if remaining <= 0:
+                return None
+            try:
+                msg = await asyncio.wait_for(q.get(), remaining)
+            except asyncio.TimeoutError:
+                return None
+            if msg.get("step") != since_step:
+                return msg
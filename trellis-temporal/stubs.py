@@ -1,38 +1,49 @@
 from __future__ import annotations
-import os, asyncio, random
-from typing import Dict, Any
+import os
+from typing import Dict, Any, List
+
+from config import SIM_PROFILES_FILE, SIM_PROFILES_JSON, SIM_SEED
+from simulator import Simulator, load_spec
 
 # Set TRELLIS_DEMO_OK=1 to disable flakiness locally
 DEMO_OK = os.getenv("TRELLIS_DEMO_OK", "0") == "1"
 
-async def flaky_call() -> None:
-    if DEMO_OK:
-        return
-    r = random.random()
-    if r < 0.33:
-        raise RuntimeError("Forced failure for testing")
-    if r < 0.67:
-        await asyncio.sleep(300)  # long sleep to trigger activity timeout
+# one name per stub below; latency / failures come from the simulator profiles
+STUBS = ("order_received", "order_validated", "payment_charged", "package_prepared",
+         "package_released", "carrier_dispatched", "carrier_batch_dispatched")
+SIMULATOR = Simulator(load_spec(SIM_PROFILES_FILE, SIM_PROFILES_JSON), STUBS, seed=SIM_SEED, enabled=not DEMO_OK)
+
+async def flaky_call(stub: str) -> None:
+    await SIMULATOR.call(stub)
 
 async def order_received(order_id: str) -> Dict[str, Any]:
-    await flaky_call()
+    await flaky_call("order_received")
     return {"order_id": order_id, "items": [{"sku": "ABC", "qty": 1}]}
 
 async def order_validated(order: Dict[str, Any]) -> bool:
-    await flaky_call()
+    await flaky_call("order_validated")
     if not order.get("items"):
         raise ValueError("No items to validate")
     return True
 
 async def payment_charged(order: Dict[str, Any], payment_id: str) -> Dict[str, Any]:
-    await flaky_call()
+    await flaky_call("payment_charged")
     amount = sum(i.get("qty", 1) for i in order.get("items", []))
     return {"status": "charged", "amount": amount}
 
 async def package_prepared(order: Dict[str, Any]) -> str:
-    await flaky_call()
+    await flaky_call("package_prepared")
     return "Package ready"
 
+async def package_released(order: Dict[str, Any]) -> str:
+    await flaky_call("package_released")
+    return "Package released"
+
 async def carrier_dispatched(order: Dict[str, Any]) -> str:
-    await flaky_call()
+    await flaky_call("carrier_dispatched")
     return "Dispatched"
+
+async def carrier_batch_dispatched(orders: List[Dict[str, Any]]) -> List[str]:
+    # one carrier API call for the whole batch
+    await flaky_call("carrier_batch_dispatched")
+    return ["Dispatched" for _ in orders]
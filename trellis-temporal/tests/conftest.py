@@ -1,4 +1,5 @@
 import os, sys
+import pytest
 import pytest_asyncio
 
 # Make repo root importable (db.py, activities.py, etc.)
@@ -16,3 +17,14 @@ async def reset_db_pool():
     await db.close_pool()   # ensure no leftover pool from previous test
     yield
     await db.close_pool()   # cleanly close before next test/loop
+
+# Time-skipping Temporal test server; tests that need it skip when it cannot be started
+@pytest_asyncio.fixture
+async def env():
+    from temporalio.testing import WorkflowEnvironment
+    try:
+        e = await WorkflowEnvironment.start_time_skipping()
+    except Exception as ex:  # test server is downloaded on first use
+        pytest.skip(f"Temporal test server unavailable: {ex!r}")
+    yield e
+    await e.shutdown()
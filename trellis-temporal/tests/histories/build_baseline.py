@@ -0,0 +1,170 @@
+# tests/histories/build_baseline.py
+"""
+Writes tests/histories/baseline/: the histories an order recorded under the
+original OrderWorkflow / ShippingWorkflow (before the status read model,
+local-activity steps, batched dispatch, review continue-as-new and claim
+check): receive, validate, manual_review with address updates, approve,
+charge, one ShippingWorkflow (prepare, dispatch). Built event by event so it
+needs no server; test_replay.py replays them against the current code.
+    python tests/histories/build_baseline.py tests/histories/baseline
+"""
+import sys
+from datetime import datetime, timedelta, timezone
+
+from google.protobuf.timestamp_pb2 import Timestamp
+from google.protobuf.duration_pb2 import Duration
+from temporalio.api.common.v1 import ActivityType, Payloads, WorkflowExecution, WorkflowType, RetryPolicy
+from temporalio.api.enums.v1 import EventType
+from temporalio.api.history.v1 import HistoryEvent
+from temporalio.api.history import v1 as h
+from temporalio.api.taskqueue.v1 import TaskQueue
+from temporalio.converter import default
+
+conv = default().payload_converter
+T0 = datetime(2025, 3, 1, 12, 0, 0, tzinfo=timezone.utc)
+
+
+def payloads(*vals):
+    return Payloads(payloads=conv.to_payloads(list(vals)))
+
+
+class B:
+    def __init__(self):
+        self.events = []
+        self.t = T0
+        self.last_wft_completed = 0
+
+    def add(self, etype, field, attrs):
+        self.t += timedelta(milliseconds=20)
+        ts = Timestamp()
+        ts.FromDatetime(self.t)
+        e = HistoryEvent(event_id=len(self.events) + 1, event_time=ts, event_type=etype)
+        getattr(e, field).CopyFrom(attrs)
+        self.events.append(e)
+        return e.event_id
+
+    def wft(self, tq):
+        s = self.add(EventType.EVENT_TYPE_WORKFLOW_TASK_SCHEDULED, "workflow_task_scheduled_event_attributes",
+                     h.WorkflowTaskScheduledEventAttributes(task_queue=TaskQueue(name=tq),
+                                                            start_to_close_timeout=Duration(seconds=10), attempt=1))
+        st = self.add(EventType.EVENT_TYPE_WORKFLOW_TASK_STARTED, "workflow_task_started_event_attributes",
+                      h.WorkflowTaskStartedEventAttributes(scheduled_event_id=s, identity="baseline-worker",
+                                                           request_id=f"req-{s}", history_size_bytes=1000 + 200 * s))
+        c = self.add(EventType.EVENT_TYPE_WORKFLOW_TASK_COMPLETED, "workflow_task_completed_event_attributes",
+                     h.WorkflowTaskCompletedEventAttributes(scheduled_event_id=s, started_event_id=st,
+                                                            identity="baseline-worker"))
+        self.last_wft_completed = c
+        return c
+
+    def activity(self, activity_id, name, tq, args, result):
+        s = self.add(EventType.EVENT_TYPE_ACTIVITY_TASK_SCHEDULED, "activity_task_scheduled_event_attributes",
+                     h.ActivityTaskScheduledEventAttributes(
+                         activity_id=str(activity_id), activity_type=ActivityType(name=name),
+                         task_queue=TaskQueue(name=tq), input=payloads(*args),
+                         schedule_to_close_timeout=Duration(seconds=0), start_to_close_timeout=Duration(seconds=1),
+                         workflow_task_completed_event_id=self.last_wft_completed,
+                         retry_policy=RetryPolicy(initial_interval=Duration(nanos=500_000_000),
+                                                  backoff_coefficient=1.5, maximum_attempts=2,
+                                                  maximum_interval=Duration(seconds=5))))
+        st = self.add(EventType.EVENT_TYPE_ACTIVITY_TASK_STARTED, "activity_task_started_event_attributes",
+                      h.ActivityTaskStartedEventAttributes(scheduled_event_id=s, identity="baseline-worker",
+                                                           request_id=f"act-{s}", attempt=1))
+        self.add(EventType.EVENT_TYPE_ACTIVITY_TASK_COMPLETED, "activity_task_completed_event_attributes",
+                 h.ActivityTaskCompletedEventAttributes(scheduled_event_id=s, started_event_id=st,
+                                                        result=payloads(result), identity="baseline-worker"))
+
+    def signal(self, name, *args):
+        self.add(EventType.EVENT_TYPE_WORKFLOW_EXECUTION_SIGNALED, "workflow_execution_signaled_event_attributes",
+                 h.WorkflowExecutionSignaledEventAttributes(signal_name=name, input=payloads(*args) if args else None,
+                                                            identity="api"))
+
+    def started(self, wf_type, tq, args, run_id, parent=None):
+        attrs = h.WorkflowExecutionStartedEventAttributes(
+            workflow_type=WorkflowType(name=wf_type), task_queue=TaskQueue(name=tq), input=payloads(*args),
+            workflow_run_timeout=Duration(seconds=15), workflow_task_timeout=Duration(seconds=10),
+            original_execution_run_id=run_id, first_execution_run_id=run_id, attempt=1, identity="api")
+        if parent:
+            attrs.parent_workflow_namespace = "default"
+            attrs.parent_workflow_execution.CopyFrom(WorkflowExecution(workflow_id=parent[0], run_id=parent[1]))
+            attrs.parent_initiated_event_id = parent[2]
+            attrs.workflow_run_timeout.CopyFrom(Duration(seconds=0))
+        self.add(EventType.EVENT_TYPE_WORKFLOW_EXECUTION_STARTED, "workflow_execution_started_event_attributes", attrs)
+
+    def completed(self, result):
+        self.add(EventType.EVENT_TYPE_WORKFLOW_EXECUTION_COMPLETED, "workflow_execution_completed_event_attributes",
+                 h.WorkflowExecutionCompletedEventAttributes(result=payloads(result),
+                                                             workflow_task_completed_event_id=self.last_wft_completed))
+
+
+ORDER_TQ, SHIP_TQ = "orders-tq", "shipping-tq"
+ORDER_ID, PAY_ID = "b-1001", "pay-b-1001"
+RUN_ID = "3f6c2a9e-5d1b-4c7e-9a40-1b2c3d4e5f60"
+CHILD_RUN_ID = "7a1b2c3d-4e5f-4a6b-8c7d-9e0f1a2b3c4d"
+WF_ID = f"order-{ORDER_ID}"
+CHILD_ID = f"ship-{ORDER_ID}-{RUN_ID[:6]}"
+
+
+def order_history(review_signals):
+    """Baseline OrderWorkflow: receive, validate, review (address updates, approve), charge, ship."""
+    b = B()
+    address = {"city": "Amherst"}
+    b.started("OrderWorkflow", ORDER_TQ, [ORDER_ID, PAY_ID, address], RUN_ID)
+    b.wft(ORDER_TQ)
+    order = {"order_id": ORDER_ID, "items": [{"sku": "ABC", "qty": 1}]}
+    b.activity(1, "receive_order_act", ORDER_TQ, [ORDER_ID], order)
+    b.wft(ORDER_TQ)
+    order = {**order, "address": address}
+    b.activity(2, "validate_order_act", ORDER_TQ, [order], True)
+    b.wft(ORDER_TQ)  # now waiting in manual_review, no commands
+    for i in range(review_signals):
+        b.signal("update_address", {"line1": f"{i} Main St"})
+        address = {**address, "line1": f"{i} Main St"}
+        b.wft(ORDER_TQ)
+    b.signal("approve")
+    b.wft(ORDER_TQ)
+    order = {**order, "address": address}
+    b.activity(3, "charge_payment_act", ORDER_TQ, [order, PAY_ID], {"status": "charged", "amount": 1})
+    b.wft(ORDER_TQ)
+    init = b.add(EventType.EVENT_TYPE_START_CHILD_WORKFLOW_EXECUTION_INITIATED,
+                 "start_child_workflow_execution_initiated_event_attributes",
+                 h.StartChildWorkflowExecutionInitiatedEventAttributes(
+                     namespace="default", workflow_id=CHILD_ID, workflow_type=WorkflowType(name="ShippingWorkflow"),
+                     task_queue=TaskQueue(name=SHIP_TQ), input=payloads(order),
+                     workflow_task_completed_event_id=b.last_wft_completed))
+    child = WorkflowExecution(workflow_id=CHILD_ID, run_id=CHILD_RUN_ID)
+    st = b.add(EventType.EVENT_TYPE_CHILD_WORKFLOW_EXECUTION_STARTED,
+               "child_workflow_execution_started_event_attributes",
+               h.ChildWorkflowExecutionStartedEventAttributes(
+                   namespace="default", initiated_event_id=init, workflow_execution=child,
+                   workflow_type=WorkflowType(name="ShippingWorkflow")))
+    b.wft(ORDER_TQ)
+    b.add(EventType.EVENT_TYPE_CHILD_WORKFLOW_EXECUTION_COMPLETED,
+          "child_workflow_execution_completed_event_attributes",
+          h.ChildWorkflowExecutionCompletedEventAttributes(
+              namespace="default", initiated_event_id=init, started_event_id=st, workflow_execution=child,
+              workflow_type=WorkflowType(name="ShippingWorkflow"), result=payloads("ok")))
+    b.wft(ORDER_TQ)
+    b.completed("done")
+    return b.events, order
+
+
+def shipping_history(order):
+    b = B()
+    b.started("ShippingWorkflow", SHIP_TQ, [order], CHILD_RUN_ID, parent=(WF_ID, RUN_ID, 0))
+    b.wft(SHIP_TQ)
+    b.activity(1, "prepare_package_act", SHIP_TQ, [order], {"status": "Package ready"})
+    b.wft(SHIP_TQ)
+    b.activity(2, "dispatch_carrier_act", SHIP_TQ, [order], {"status": "Dispatched"})
+    b.wft(SHIP_TQ)
+    b.completed("ok")
+    return b.events
+
+
+if __name__ == "__main__":
+    from pathlib import Path
+    from temporalio.client import WorkflowHistory
+    out = Path(sys.argv[1])
+    out.mkdir(parents=True, exist_ok=True)
+    events, order = order_history(review_signals=3)
+    (out / f"{WF_ID}__0.json").write_text(WorkflowHistory(WF_ID, events).to_json() + "\n")
+    (out / f"{CHILD_ID}__1.json").write_text(WorkflowHistory(CHILD_ID, shipping_history(order)).to_json() + "\n")
@@ -2,6 +2,7 @@ import uuid, os, importlib, pytest
 os.environ["TRELLIS_DEMO_OK"] = "1"
 import stubs; importlib.reload(stubs)
 import activities
+import db
 
 @pytest.mark.asyncio
 async def test_charge_payment_act_is_idempotent_and_json_safe():
@@ -13,3 +14,24 @@ async def test_charge_payment_act_is_idempotent_and_json_safe():
     out2 = await activities.charge_payment_act(order, pid)
     assert out2["status"] == "charged"
     assert int(out2["amount"]) == 2
+
+@pytest.mark.asyncio
+async def test_claim_check_reference_resolves_after_address_change():
+    oid = f"o-{uuid.uuid4().hex[:8]}"
+    ref = await activities.receive_order_act(oid, {"address": {"city": "Amherst"}, "version": 1})
+    assert "items" not in ref and ref["snapshot_version"] == 1
+    assert (await activities.resolve_order(ref))["items"]
+    await activities.set_order_address_act(oid, {"city": "Boston"}, 2)
+    activities._order_snapshots.invalidate(oid)  # force the Postgres path
+    order = await activities.resolve_order({**ref, "snapshot_version": 2})
+    assert order["address"] == {"city": "Boston"} and order["items"]
+
+@pytest.mark.asyncio
+async def test_charge_left_at_created_is_charged_on_retry():
+    # an earlier attempt claimed the row, then was abandoned before charging
+    pid = f"pay-{uuid.uuid4().hex[:8]}"
+    order = {"order_id": f"o-{uuid.uuid4().hex[:8]}", "items": [{"sku": "A", "qty": 3}]}
+    assert (await db.claim_payment(pid, order["order_id"]))["created"]
+    out = await activities.charge_payment_act(order, pid)
+    assert out == {"status": "charged", "amount": 3}
+    assert (await db.get_payment(pid))["status"] == "charged"
@@ -0,0 +1,68 @@
+import asyncio, dataclasses, json
+from datetime import timedelta
+
+import pytest
+from temporalio.exceptions import ApplicationError
+from temporalio.testing import ActivityEnvironment
+
+import activity_profiles
+import contracts
+from activities import guarded_call, heartbeating
+from activity_profiles import ActivityProfile
+
+def test_overrides_patch_single_fields(tmp_path):
+    f = tmp_path / "profiles.json"
+    f.write_text(json.dumps({contracts.DISPATCH_CARRIER: {"max_attempts": 7}}))
+    profiles = activity_profiles.load(str(f), json.dumps({contracts.DISPATCH_CARRIER: {"call_timeout_s": 9},
+                                                          "new_act": {"start_to_close_s": 4}}))
+    carrier = profiles[contracts.DISPATCH_CARRIER]
+    assert (carrier.max_attempts, carrier.call_timeout_s) == (7, 9)
+    assert carrier.heartbeat_s == activity_profiles.DEFAULT_PROFILES[contracts.DISPATCH_CARRIER].heartbeat_s
+    assert profiles["new_act"] == dataclasses.replace(activity_profiles.FALLBACK, start_to_close_s=4)
+
+def test_unknown_field_is_rejected():
+    with pytest.raises(ValueError, match="timeout_s"):
+        activity_profiles.merge({}, {contracts.CHARGE_PAYMENT: {"timeout_s": 3}})
+
+def test_local_activities_get_no_heartbeat_timeout():
+    assert "heartbeat_timeout" in activity_profiles.activity_options(contracts.DISPATCH_CARRIER)
+    assert "heartbeat_timeout" not in activity_profiles.activity_options(contracts.DISPATCH_CARRIER, local=True)
+    opts = activity_profiles.activity_options(contracts.VALIDATE_ORDER)
+    assert opts["retry_policy"].non_retryable_error_types == ["ValueError"]
+
+def _env(heartbeat_s):
+    env = ActivityEnvironment()
+    env.info = dataclasses.replace(env.info, activity_type="slow_act",
+                                   heartbeat_timeout=timedelta(seconds=heartbeat_s))
+    beats = []
+    env.on_heartbeat = lambda *details: beats.append(details)
+    return env, beats
+
+@heartbeating
+async def _slow_act(before_s, call):
+    await asyncio.sleep(before_s)  # e.g. a DB pool wait before the external call
+    return await guarded_call(call)
+
+async def test_hung_call_fails_the_attempt_after_call_timeout(monkeypatch):
+    monkeypatch.setitem(activity_profiles.PROFILES, "slow_act", ActivityProfile(10.0, call_timeout_s=0.2))
+    env, beats = _env(heartbeat_s=0.15)
+    with pytest.raises(ApplicationError) as e:
+        await env.run(_slow_act, 0, asyncio.sleep(300))
+    assert e.value.type == "ActivityCallStalled"
+    assert beats  # the worker kept proving it is alive while the call hung
+
+async def test_heartbeats_cover_work_outside_the_call(monkeypatch):
+    monkeypatch.setitem(activity_profiles.PROFILES, "slow_act", ActivityProfile(10.0, call_timeout_s=1.0))
+    env, beats = _env(heartbeat_s=0.15)
+    assert await env.run(_slow_act, 0.3, asyncio.sleep(0, "ok")) == "ok"
+    assert len(beats) >= 4  # one at start, then every 50 ms of the 300 ms wait
+
+async def test_call_finishing_in_time_returns_its_result(monkeypatch):
+    monkeypatch.setitem(activity_profiles.PROFILES, "slow_act", ActivityProfile(10.0, call_timeout_s=1.0))
+    env, _ = _env(heartbeat_s=0.1)
+
+    async def call():
+        await asyncio.sleep(0.1)
+        return "Dispatched"
+
+    assert await env.run(guarded_call, call()) == "Dispatched"
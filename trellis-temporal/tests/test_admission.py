@@ -0,0 +1,38 @@
+import asyncio
+from admission import AdmissionController, QueueSample, evaluate
+
+def _s(backlog=0, age=0.0, pollers=2, rate=0.0, queue="orders-tq", kind="workflow"):
+    return QueueSample(queue, kind, backlog, age, pollers, rate)
+
+class FakeClock:
+    def __init__(self): self.t = 0.0
+    def __call__(self): return self.t
+
+def test_evaluate_limits_and_retry_after():
+    assert evaluate([_s(10), _s(5, kind="activity")], max_backlog=100).admit
+    d = evaluate([_s(600, rate=50.0)], max_backlog=100, max_age_s=60)
+    assert not d.admit and "backlog 600" in d.reason
+    assert d.retry_after_s == 10                       # 500 excess tasks at 50/s
+    d = evaluate([_s(pollers=0, kind="activity")], min_pollers=1, interval_s=2)
+    assert not d.admit and "0 pollers" in d.reason and d.retry_after_s == 4
+    assert evaluate([_s(10 ** 9, rate=1.0)], max_backlog=1).retry_after_s == 60  # capped
+
+async def test_controller_fails_open_when_stale_and_delay_mode_waits_for_recovery():
+    clock = FakeClock()
+    ctl = AdmissionController(get_client=None, queues=["orders-tq"], interval_s=0.01, clock=clock)
+    assert ctl.decision().admit                        # nothing sampled yet
+    ctl.record([_s(10 ** 6)])
+    assert not ctl.decision().admit
+    assert ctl.state()["queues"][0]["backlog"] == 10 ** 6
+    clock.t = 1.0                                      # > 3 intervals without a sample
+    assert ctl.decision().admit and ctl.state()["stale"]
+
+    clock.t = 2.0
+    ctl.record([_s(10 ** 6)])
+    async def drain():
+        await asyncio.sleep(0.02)
+        ctl.record([_s(0)])
+    asyncio.get_running_loop().create_task(drain())
+    assert (await ctl.admit(max_delay_s=1.0)).admit
+    ctl.record([_s(10 ** 6)])
+    assert not (await ctl.admit(max_delay_s=0.0)).admit
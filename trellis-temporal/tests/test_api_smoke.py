@@ -26,3 +26,74 @@ def test_happy_path_flow():
             return
         time.sleep(0.5)
     pytest.fail("workflow did not reach done")
+
+def test_batch_start_reports_per_item_status():
+    base_id = str(int(time.time() * 1000))
+    orders = [{"order_id": f"{base_id}-{i}", "payment_id": f"pay-{base_id}-{i}",
+               "address": {"city": "Amherst"}} for i in range(3)]
+    r = httpx.post(f"{BASE}/orders/batch/start", json={"orders": orders}, timeout=30.0)
+    assert r.status_code == 200
+    assert [x["status"] for x in r.json()["results"]] == ["started"] * 3
+    # resubmitting the same ids is reported per item, not as a request failure
+    r = httpx.post(f"{BASE}/orders/batch/start", json={"orders": orders[:1]}, timeout=30.0)
+    assert r.json()["results"][0]["status"] == "already_exists"
+
+def test_signal_before_start_is_delivered_in_one_call():
+    order_id = f"{int(time.time() * 1000)}-early"
+    r = httpx.post(f"{BASE}/orders/{order_id}/signals/update_address",
+                   json={"address": {"city": "Salem"}}, timeout=5.0)
+    assert r.status_code == 200
+    assert r.json()["path"] == "signal_with_start"
+
+def test_thousands_of_long_polls_wake_on_one_step_change():
+    import asyncio
+    order_id = f"{int(time.time() * 1000)}-poll"
+    r = httpx.post(f"{BASE}/orders/{order_id}/start",
+                   json={"payment_id": f"pay-{order_id}", "address": {"city": "Amherst"}}, timeout=5.0)
+    assert r.status_code == 200
+    for _ in range(20):  # until the order parks in manual_review
+        s = httpx.get(f"{BASE}/orders/{order_id}/status/wait", params={"timeout": 1}, timeout=5.0)
+        if s.status_code == 200 and s.json()["step"] == "manual_review":
+            break
+
+    async def run(n=2000):
+        limits = httpx.Limits(max_connections=n)
+        async with httpx.AsyncClient(base_url=BASE, limits=limits, timeout=30.0) as http:
+            polls = [asyncio.create_task(http.get(f"/orders/{order_id}/status/wait",
+                                                  params={"since_step": "manual_review", "timeout": 20}))
+                     for _ in range(n)]
+            await asyncio.sleep(2.0)  # let them all park on the server
+            await http.post(f"/orders/{order_id}/signals/approve")
+            return await asyncio.gather(*polls)
+
+    results = asyncio.run(run())
+    assert all(r.status_code == 200 and r.json()["step"] != "manual_review" for r in results)
+
+def test_bulk_approve_by_step_and_city():
+    base_id = str(int(time.time() * 1000))
+    city = f"Bulkville-{base_id}"  # unique, so only this test's orders match
+    orders = [{"order_id": f"{base_id}-b{i}", "payment_id": f"pay-{base_id}-b{i}",
+               "address": {"city": city}} for i in range(3)]
+    assert httpx.post(f"{BASE}/orders/batch/start", json={"orders": orders}, timeout=30.0).status_code == 200
+    # visibility is eventually consistent: wait until all three are listed in manual_review
+    for _ in range(40):
+        r = httpx.get(f"{BASE}/orders", params={"step": "manual_review", "city": city}, timeout=5.0)
+        if r.status_code == 200 and len(r.json()["orders"]) == 3:
+            break
+        time.sleep(0.5)
+    else:
+        pytest.fail("orders never showed up in visibility")
+    r = httpx.post(f"{BASE}/orders/bulk/approve", json={"city": city}, timeout=30.0)
+    assert r.status_code == 200
+    assert r.json()["counts"] == {"signaled": 3}
+
+def test_batch_start_refuses_oversized_batches():
+    from config import BATCH_START_MAX_ORDERS
+    orders = [{"order_id": f"too-many-{i}", "payment_id": f"pay-{i}", "address": {}}
+              for i in range(BATCH_START_MAX_ORDERS + 1)]
+    r = httpx.post(f"{BASE}/orders/batch/start", json={"orders": orders}, timeout=30.0)
+    assert r.status_code == 413
+
+def test_bulk_batch_mode_refuses_a_limit():
+    r = httpx.post(f"{BASE}/orders/bulk/approve", json={"mode": "batch", "limit": 10}, timeout=5.0)
+    assert r.status_code == 400
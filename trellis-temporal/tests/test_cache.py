@@ -0,0 +1,47 @@
+import asyncio, pytest
+from cache import TTLCache, VersionedLRUCache
+
+class FakeClock:
+    def __init__(self): self.t = 0.0
+    def __call__(self): return self.t
+
+def test_ttl_expiry_and_bound():
+    clock = FakeClock()
+    c = TTLCache(ttl=1.0, max_entries=2, clock=clock)
+    c.set("a", 1); c.set("b", 2); c.set("c", 3)
+    assert c.get("a") is None          # evicted by the size bound
+    assert c.get("c") == 3
+    clock.t = 1.5
+    assert c.get("c") is None          # expired
+
+async def test_get_or_load_is_single_flight():
+    c = TTLCache(ttl=10.0)
+    calls = 0
+    async def loader():
+        nonlocal calls
+        calls += 1
+        await asyncio.sleep(0.01)
+        return {"step": "done"}
+    results = await asyncio.gather(*(c.get_or_load("o1", loader) for _ in range(50)))
+    assert calls == 1
+    assert all(r == {"step": "done"} for r in results)
+    assert await c.get_or_load("o1", loader) == {"step": "done"} and calls == 1
+
+async def test_none_is_not_cached_and_errors_propagate():
+    c = TTLCache(ttl=10.0)
+    async def missing(): return None
+    assert await c.get_or_load("x", missing) is None
+    assert len(c) == 0
+    async def boom(): raise RuntimeError("db down")
+    with pytest.raises(RuntimeError):
+        await c.get_or_load("x", boom)
+
+def test_versioned_lru_invalidates_by_version_and_evicts_lru():
+    c = VersionedLRUCache(max_entries=2)
+    c.set("a", 1, "a1"); c.set("b", 1, "b1")
+    assert c.get("a", min_version=1) == "a1"    # a is now most recently used
+    assert c.get("a", min_version=2) is None    # reference is newer than the cached copy
+    c.set("a", 0, "a0")
+    assert c.get("a") == "a1"                   # older copy never replaces a newer one
+    c.set("c", 1, "c1")
+    assert c.get("b") is None and c.get("a") == "a1"
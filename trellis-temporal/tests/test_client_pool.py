@@ -0,0 +1,36 @@
+import pytest
+from temporalio.client import FetchWorkflowHistoryEventsInput, SignalWorkflowInput
+import client_pool
+from client_pool import ClientPool, RpcMetricsInterceptor
+
+class FakeHistoryIterator:
+    def __init__(self): self.pages = 0
+    async def fetch_next_page(self, *, page_size=None): self.pages += 1
+
+class FakeNext:
+    """Stands in for the next interceptor in the chain (the SDK's RPC layer)."""
+    async def signal_workflow(self, input):
+        raise RuntimeError("boom")
+    def fetch_workflow_history_events(self, input):
+        return FakeHistoryIterator()
+
+async def test_interceptor_times_rpcs_and_counts_errors():
+    out = RpcMetricsInterceptor().intercept_client(FakeNext())
+    before = client_pool.RPC_SECONDS.count(rpc="signal")
+    with pytest.raises(RuntimeError):
+        # input fields are not read by the metrics interceptor
+        await out.signal_workflow(SignalWorkflowInput.__new__(SignalWorkflowInput))
+    assert client_pool.RPC_SECONDS.count(rpc="signal") == before + 1
+    assert client_pool.RPC_ERRORS.value(rpc="signal", error="RuntimeError") >= 1
+
+    fetch = FetchWorkflowHistoryEventsInput.__new__(FetchWorkflowHistoryEventsInput)
+    fetch.wait_new_event = True
+    it = out.fetch_workflow_history_events(fetch)
+    before = client_pool.RPC_SECONDS.count(rpc="result")
+    await it.fetch_next_page()
+    assert it.pages == 1 and client_pool.RPC_SECONDS.count(rpc="result") == before + 1
+
+async def test_pool_hands_out_clients_round_robin():
+    pool = ClientPool("unused:7233", size=3)
+    pool._clients = ["a", "b", "c"]  # already connected
+    assert [await pool.get() for _ in range(6)] == ["a", "b", "c", "a", "b", "c"]
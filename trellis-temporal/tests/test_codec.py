@@ -0,0 +1,44 @@
+import bz2, os, pytest
+import temporalio.converter
+import codec as codec_mod
+from codec import ENCODING, CompressionCodec, data_converter, register_algorithm
+
+def _order(items):
+    return {"order_id": "o1", "items": [{"sku": f"SKU-{i}", "qty": 1} for i in range(items)],
+            "address": {"city": "Amherst"}}
+
+def _payloads(*values):
+    return temporalio.converter.default().payload_converter.to_payloads(list(values))
+
+async def test_large_payload_round_trips_compressed():
+    codec = CompressionCodec("zlib", threshold=256)
+    [p] = _payloads(_order(200))
+    [enc] = await codec.encode([p])
+    assert enc.metadata["encoding"] == ENCODING and enc.metadata["compression"] == b"zlib"
+    assert enc.ByteSize() < p.ByteSize() / 4
+    assert await codec.decode([enc]) == [p]
+
+async def test_small_and_incompressible_payloads_pass_through():
+    codec = CompressionCodec("zlib", threshold=256)
+    small, noise = _payloads(_order(1), os.urandom(4096))
+    assert await codec.encode([small, noise]) == [small, noise]
+
+async def test_disabled_codec_still_decodes():
+    [enc] = await CompressionCodec("zlib", threshold=0).encode(_payloads(_order(50)))
+    off = CompressionCodec(None)
+    assert (await off.encode(_payloads(_order(50))))[0].metadata["encoding"] != ENCODING
+    assert (await off.decode([enc])) == _payloads(_order(50))
+
+async def test_registered_algorithm_is_used_and_unknown_rejected(monkeypatch):
+    monkeypatch.setattr(codec_mod, "ALGORITHMS", dict(codec_mod.ALGORITHMS))  # keep the registry clean
+    register_algorithm("bz2", lambda data, level: bz2.compress(data, max(1, level)), bz2.decompress)
+    [enc] = await CompressionCodec("bz2", threshold=0).encode(_payloads(_order(100)))
+    assert enc.metadata["compression"] == b"bz2"
+    assert await CompressionCodec("zlib").decode([enc]) == _payloads(_order(100))
+    with pytest.raises(ValueError):
+        CompressionCodec("lz-nope")
+
+async def test_data_converter_round_trips_values():
+    conv = data_converter()
+    order = _order(300)
+    assert await conv.decode(await conv.encode([order]), [dict]) == [order]
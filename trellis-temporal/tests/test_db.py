@@ -1,4 +1,5 @@
-import uuid, pytest, db
+import asyncio, json, uuid, pytest, db
+from datetime import datetime
 @pytest.mark.asyncio
 async def test_payment_idempotency_roundtrip():
     pid = f"test-{uuid.uuid4().hex[:8]}"
@@ -15,3 +16,168 @@ async def test_payment_idempotency_roundtrip():
 async def test_append_event_inserts():
     oid = f"o-{uuid.uuid4().hex[:8]}"
     await db.append_event(oid, "unit_test_event", {"k":"v"})
+
+async def _event_count(oid: str) -> int:
+    pool = await db.get_pool()
+    async with pool.acquire() as conn:
+        return await conn.fetchval("SELECT count(*) FROM events WHERE order_id=$1", oid)
+
+@pytest.mark.asyncio
+async def test_buffered_events_land_on_flush():
+    oid = f"o-{uuid.uuid4().hex[:8]}"
+    await db.append_event(oid, "buffered_evt", {"n": 1}, sync=False)
+    await db.append_event(oid, "buffered_evt", {"n": 2}, sync=False)
+    assert await _event_count(oid) == 0
+    assert await db.flush_events() >= 2
+    assert await _event_count(oid) == 2
+
+@pytest.mark.asyncio
+async def test_event_buffer_is_bounded_and_add_never_raises(monkeypatch):
+    def down(fn):
+        raise ConnectionRefusedError("db down")
+    monkeypatch.setattr(db, "acquire", down)
+    buf = db.EventBuffer(max_batch=2, flush_interval=0.01, max_rows=5)
+    dropped = db.EVENTS_DROPPED.value()
+    try:
+        for i in range(8):
+            await buf.add(db._event_row("o-buf", "buffered_evt", {"n": i}))  # a full batch does not raise
+        await asyncio.sleep(0.05)  # background flushes fail and keep the rows
+        assert len(buf) == 5
+        assert db.EVENTS_DROPPED.value() - dropped == 3
+        assert [json.loads(r[2])["n"] for r in buf._rows] == [3, 4, 5, 6, 7]  # oldest dropped
+    finally:
+        buf._rows = []
+        await buf.close()
+
+@pytest.mark.asyncio
+async def test_sync_events_are_visible_immediately():
+    oid = f"o-{uuid.uuid4().hex[:8]}"
+    await db.append_event(oid, "payment_charged", {"amount": 1})
+    assert await _event_count(oid) == 1
+
+@pytest.mark.asyncio
+async def test_claim_and_complete_payment():
+    pid = f"test-{uuid.uuid4().hex[:8]}"
+    oid = f"o-{uuid.uuid4().hex[:8]}"
+    first = await db.claim_payment(pid, oid)
+    assert first["created"] is True and first["status"] == "created"
+    await db.complete_payment(pid, oid, "charged", 3)
+    again = await db.claim_payment(pid, oid)
+    assert again["created"] is False
+    assert again["status"] == "charged" and again["amount"] == 3
+    assert await _event_count(oid) == 1
+
+@pytest.mark.asyncio
+async def test_order_status_projection_only_moves_forward():
+    oid = f"o-{uuid.uuid4().hex[:8]}"
+    assert await db.get_order_status(oid) is None
+    st = {"approved": False, "canceled": False, "step": "manual_review", "address": {"city": "Boston"}}
+    assert await db.upsert_order_status(oid, st, 10) is True
+    assert await db.upsert_order_status(oid, {**st, "step": "receive"}, 5) is False  # stale retry
+    row = await db.get_order_status(oid)
+    assert row["step"] == "manual_review" and row["version"] == 10
+    assert row["address"] == {"city": "Boston"}
+    assert row["active"] == ["manual_review"]  # no explicit list: just the step
+    assert await db.upsert_order_status(oid, {**st, "step": "charge", "active": ["charge", "prepare"]}, 11)
+    assert (await db.get_order_status(oid))["active"] == ["charge", "prepare"]
+
+async def test_order_snapshot_claim_check_versions():
+    oid = f"o-{uuid.uuid4().hex[:8]}"
+    snap = {"order_id": oid, "items": [{"sku": "A", "qty": 2}], "address": {"city": "Amherst"}}
+    assert await db.store_order_snapshot(oid, snap, 10) is True
+    assert await db.store_order_snapshot(oid, {**snap, "items": []}, 5) is False  # stale retry
+    assert await db.set_snapshot_address(oid, {"city": "Boston"}, 20) is True
+    version, stored = await db.get_order_snapshot(oid)
+    assert version == 20 and stored["items"] == snap["items"] and stored["address"] == {"city": "Boston"}
+    # the status projection shares the row without touching the snapshot
+    st = {"approved": True, "canceled": False, "step": "charge", "address": {"city": "Boston"}}
+    assert await db.upsert_order_status(oid, st, 30) is True
+    assert (await db.get_order_snapshot(oid))[0] == 20
+
+async def test_applied_status_changes_are_buffered_as_events():
+    oid = f"o-{uuid.uuid4().hex[:8]}"
+    st = {"approved": False, "canceled": False, "step": "receive", "address": {}}
+    assert await db.upsert_order_status(oid, st, 1) is True
+    assert await db.upsert_order_status(oid, {**st, "step": "validate"}, 2) is True
+    assert await db.upsert_order_status(oid, st, 1) is False  # stale: not recorded
+    assert await db.list_order_events(oid, 10) == []  # still in the buffer
+    await db.flush_events()
+    events = await db.list_order_events(oid, 10)
+    assert [(e["event_type"], e["payload"]["step"], e["payload"]["version"]) for e in events] == \
+        [("status_changed", "receive", 1), ("status_changed", "validate", 2)]
+
+def test_event_cursor_round_trip_and_rejects_garbage():
+    at = datetime(2026, 10, 18, 12, 30, 5, 123456)
+    assert db.decode_event_cursor(db.encode_event_cursor(at, 42)) == (at, 42)
+    with pytest.raises(ValueError):
+        db.decode_event_cursor("not-a-cursor")
+
+async def test_order_events_keyset_pages():
+    oid = f"o-{uuid.uuid4().hex[:8]}"
+    for i in range(5):
+        await db.append_event(oid, "step", {"i": i}, sync=True)
+    first = await db.list_order_events(oid, 2)
+    after = (first[-1]["created_at"], first[-1]["id"])
+    rest = await db.list_order_events(oid, 10, after)
+    assert [e["payload"]["i"] for e in first + rest] == [0, 1, 2, 3, 4]
+
+async def test_stream_export_filters_by_time_and_type():
+    oid = f"o-{uuid.uuid4().hex[:8]}"
+    start = datetime.utcnow()
+    await db.append_event(oid, "export_probe", {"n": 1}, sync=True)
+    await db.append_event(oid, "other", {"n": 2}, sync=True)
+    end = datetime.utcnow()
+    lines = [l async for l in db.stream_export("events", start, end, "export_probe", as_json=True, prefetch=1)]
+    mine = [json.loads(l) for l in lines if json.loads(l)["order_id"] == oid]
+    assert [e["payload"] for e in mine] == [{"n": 1}]
+
+async def test_open_export_holds_no_pool_connection():
+    await db.append_event(f"o-{uuid.uuid4().hex[:8]}", "export_probe", {}, sync=True)
+    in_use = db.POOL_IN_USE.value()
+    rows = db.stream_export("events", datetime(2000, 1, 1), datetime.utcnow(), "export_probe", prefetch=1)
+    await rows.__anext__()
+    try:
+        assert db.exports_open() == 1
+        assert db.POOL_IN_USE.value() == in_use
+    finally:
+        await rows.aclose()
+    assert db.exports_open() == 0
+
+def test_export_slots_are_claimed_before_the_stream_starts():
+    slots = [db.reserve_export(2), db.reserve_export(2)]
+    assert None not in slots and db.reserve_export(2) is None
+    slots[0].release()
+    slots[0].release()  # idempotent
+    assert db.exports_open() == 1
+    slots[1].release()
+    assert db.exports_open() == 0
+
+async def test_sweep_default_events_deletes_only_old_rows():
+    oid = f"o-{uuid.uuid4().hex[:8]}"
+    async with db.acquire("test") as conn:  # no monthly partition covers these: both land in events_default
+        await conn.executemany(
+            "INSERT INTO events (order_id, event_type, created_at) VALUES ($1, 'probe', $2)",
+            [(oid, datetime(1999, 6, 1)), (oid, datetime(1999, 8, 1))])
+    assert await db.count_default_events() >= 2
+    assert await db.sweep_default_events(datetime(1999, 7, 1), batch=1) >= 1
+    async with db.acquire("test") as conn:
+        left = await conn.fetch("SELECT created_at FROM events_default WHERE order_id = $1", oid)
+        await conn.execute("DELETE FROM events WHERE order_id = $1", oid)
+    assert [r["created_at"] for r in left] == [datetime(1999, 8, 1)]
+
+async def test_status_upsert_notifies_listeners():
+    from status_stream import StatusHub
+    hub = StatusHub()
+    await hub.start()
+    oid = f"o-{uuid.uuid4().hex[:8]}"
+    try:
+        with hub.subscribe(oid) as q:
+            st = {"approved": False, "canceled": False, "step": "receive", "address": {}}
+            assert await db.upsert_order_status(oid, st, 1) is True
+            assert await db.upsert_order_status(oid, st, 1) is False  # stale: no second notification
+            msg = await hub.next_change(q, None, timeout=5)
+            assert msg == {"order_id": oid, "step": "receive", "active": ["receive"],
+                           "approved": False, "canceled": False, "version": 1}
+            assert q.empty()
+    finally:
+        await hub.close()
@@ -0,0 +1,18 @@
+import pytest
+import drive
+
+def test_step_durations_from_timeline():
+    tl = [{"step": "receive", "at": 10.0}, {"step": "validate", "at": 10.05},
+          {"step": "manual_review", "at": 10.1}, {"step": "charge", "at": 11.1},
+          {"step": "ship", "at": 11.2}, {"step": "done", "at": 11.5}]
+    d = drive.step_durations(tl)
+    assert set(d) == {"receive", "validate", "manual_review", "charge", "ship"}
+    assert d["manual_review"] == pytest.approx(1000.0)
+    assert d["ship"] == pytest.approx(300.0)
+
+def test_parse_mix_and_percentiles():
+    assert drive.parse_mix("approve=0.8,cancel=0.2") == {"approve": 0.8, "cancel": 0.2}
+    with pytest.raises(SystemExit):
+        drive.parse_mix("refund=1")
+    p = drive.percentiles([float(i) for i in range(1, 101)])
+    assert p["n"] == 100 and p["p50_ms"] == 51.0 and p["p99_ms"] == 100.0
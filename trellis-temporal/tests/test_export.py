@@ -0,0 +1,29 @@
+import csv, io, json
+from datetime import datetime
+import export
+
+async def _aiter(items):
+    for x in items:
+        yield x
+
+async def _collect(chunks):
+    return [c async for c in chunks]
+
+async def test_ndjson_chunks_group_rows():
+    lines = [json.dumps({"i": i}) for i in range(5)]
+    chunks = await _collect(export.ndjson_chunks(_aiter(lines), chunk_rows=2))
+    assert len(chunks) == 3
+    assert [json.loads(l)["i"] for l in b"".join(chunks).decode().splitlines()] == list(range(5))
+
+async def test_csv_chunks_header_values_and_quoting():
+    at = datetime(2026, 10, 18, 9, 0)
+    rows = [{"id": 1, "payload": '{"a": "x,y"}', "created_at": at}, {"id": 2, "payload": None, "created_at": at}]
+    chunks = await _collect(export.csv_chunks(_aiter(rows), ["id", "payload", "created_at"], chunk_rows=1))
+    parsed = list(csv.reader(io.StringIO(b"".join(chunks).decode())))
+    assert parsed == [["id", "payload", "created_at"],
+                      ["1", '{"a": "x,y"}', "2026-10-18T09:00:00"],
+                      ["2", "", "2026-10-18T09:00:00"]]
+
+async def test_empty_export_is_header_only():
+    assert await _collect(export.ndjson_chunks(_aiter([]))) == []
+    assert await _collect(export.csv_chunks(_aiter([]), ["id"])) == [b"id\r\n"]
@@ -0,0 +1,67 @@
+import dataclasses, uuid
+from datetime import timedelta
+
+import pytest
+from temporalio.testing import ActivityEnvironment
+from temporalio.worker import Worker
+
+import config
+import interceptors
+from bench import replay as suite
+from interceptors import WorkerMetricsInterceptor
+from worker import WORKFLOW_RUNNER
+from workflows import OrderWorkflow, ShippingWorkflow
+
+class FakeNext:
+    """Stands in for the next activity interceptor (the activity function itself)."""
+    def __init__(self, error=None): self.error = error
+    async def execute_activity(self, input):
+        if self.error:
+            raise self.error
+        return "ok"
+
+def _env(attempt=1, activity_type="charge_payment_act"):
+    env = ActivityEnvironment()
+    env.info = dataclasses.replace(
+        env.info, attempt=attempt, activity_type=activity_type, task_queue="t-orders",
+        started_time=env.info.current_attempt_scheduled_time + timedelta(milliseconds=250),
+    )
+    return env
+
+async def test_activity_latency_outcome_and_retries():
+    labels = {"activity": "charge_payment_act", "task_queue": "t-orders"}
+    inbound = WorkerMetricsInterceptor().intercept_activity(FakeNext())
+    waited = interceptors.ACTIVITY_SCHEDULE_TO_START.count(**labels)
+    ok = interceptors.ACTIVITY_SECONDS.count(outcome="ok", **labels)
+    assert await _env().run(inbound.execute_activity, None) == "ok"
+    assert interceptors.ACTIVITY_SCHEDULE_TO_START.count(**labels) == waited + 1
+    assert interceptors.ACTIVITY_SECONDS.count(outcome="ok", **labels) == ok + 1
+
+    failing = WorkerMetricsInterceptor().intercept_activity(FakeNext(RuntimeError("declined")))
+    retries = interceptors.ACTIVITY_RETRIES.value(**labels)
+    with pytest.raises(RuntimeError):
+        await _env(attempt=2).run(failing.execute_activity, None)
+    assert interceptors.ACTIVITY_RETRIES.value(**labels) == retries + 1
+    assert interceptors.ACTIVITY_SECONDS.count(outcome="failed", **labels) >= 1
+
+async def test_each_step_is_observed_once_including_review(env, monkeypatch):
+    run = uuid.uuid4().hex[:6]
+    monkeypatch.setattr(config, "TASK_QUEUE_ORDERS", f"icpt-orders-{run}")
+    monkeypatch.setattr(config, "TASK_QUEUE_SHIPPING", f"icpt-shipping-{run}")
+    monkeypatch.setattr(config, "ORDER_SEARCH_ATTRIBUTES", False)
+    stand_ins = suite.StandIns()
+    step = lambda s: interceptors.WORKFLOW_STEP_SECONDS.count(
+        workflow="OrderWorkflow", step=s, task_queue=config.TASK_QUEUE_ORDERS)
+    orders_w = Worker(env.client, task_queue=config.TASK_QUEUE_ORDERS, workflows=[OrderWorkflow],
+                      activities=stand_ins.orders_activities(), workflow_runner=WORKFLOW_RUNNER,
+                      interceptors=[WorkerMetricsInterceptor()])
+    shipping_w = Worker(env.client, task_queue=config.TASK_QUEUE_SHIPPING, workflows=[ShippingWorkflow],
+                        activities=stand_ins.shipping_activities(), workflow_runner=WORKFLOW_RUNNER,
+                        interceptors=[WorkerMetricsInterceptor()])
+    async with orders_w, shipping_w:
+        await suite.run_scenario(env.client, "happy", 2)
+    for s in ("receive", "validate", "manual_review", "charge", "ship"):
+        assert step(s) == 2, s
+    assert step("done") == 0
+    assert interceptors.WORKFLOW_RUNS.value(workflow="OrderWorkflow", task_queue=config.TASK_QUEUE_ORDERS,
+                                            outcome="completed") == 2
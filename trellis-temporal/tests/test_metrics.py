@@ -0,0 +1,43 @@
+import asyncio, metrics
+
+def test_histogram_renders_cumulative_buckets():
+    h = metrics.Histogram("t_latency_seconds", "test", ("fn",), buckets=(0.1, 1.0))
+    h.observe(0.05, fn="a")
+    h.observe(0.5, fn="a")
+    h.observe(5.0, fn="a")
+    text = metrics.render()
+    assert 't_latency_seconds_bucket{fn="a",le="0.1"} 1' in text
+    assert 't_latency_seconds_bucket{fn="a",le="1"} 2' in text
+    assert 't_latency_seconds_bucket{fn="a",le="+Inf"} 3' in text
+    assert 't_latency_seconds_count{fn="a"} 3' in text
+    assert h.count(fn="a") == 3
+
+def test_gauge_and_counter():
+    g = metrics.Gauge("t_in_use", "test")
+    g.inc(); g.inc(); g.dec()
+    c = metrics.Counter("t_errors_total", "test", ("fn",))
+    c.inc(fn="x")
+    text = metrics.render()
+    assert "t_in_use 1" in text
+    assert 't_errors_total{fn="x"} 1' in text
+
+async def test_serve_exposes_metrics():
+    metrics.Counter("t_served_total", "test").inc()
+    server = await metrics.serve(0, host="127.0.0.1")
+    port = server.sockets[0].getsockname()[1]
+    reader, writer = await asyncio.open_connection("127.0.0.1", port)
+    writer.write(b"GET /metrics HTTP/1.1\r\nHost: x\r\n\r\n")
+    body = (await reader.read()).decode()
+    writer.close()
+    server.close()
+    assert body.startswith("HTTP/1.1 200 OK")
+    assert "t_served_total 1" in body
+
+def test_api_requests_are_timed_per_route_template():
+    from fastapi.testclient import TestClient
+    import api
+    before = api.HTTP_SECONDS.count(method="GET", route="/orders/{order_id}/events", status="400")
+    r = TestClient(api.app).get("/orders/42/events", params={"cursor": "not-a-cursor"})
+    assert r.status_code == 400
+    assert api.HTTP_SECONDS.count(method="GET", route="/orders/{order_id}/events", status="400") == before + 1
+    assert api.HTTP_IN_FLIGHT.value() == 0
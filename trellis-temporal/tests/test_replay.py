@@ -0,0 +1,126 @@
+import asyncio, time, uuid
+from pathlib import Path
+
+import pytest
+from temporalio import activity, workflow
+from temporalio.api.enums.v1 import EventType
+from temporalio.client import Client
+from temporalio.worker import Replayer, Worker
+
+import config
+import contracts
+from bench import replay as suite
+from worker import WORKFLOW_RUNNER
+from workflows import OrderWorkflow, ShippingWorkflow, order_options
+
+SIGNALS = 1000
+
+# Stand-in activities: this test is about workflow history, not Postgres
+@activity.defn(name=contracts.RECEIVE_ORDER)
+async def receive(order_id: str) -> dict:
+    return {"order_id": order_id, "items": [{"sku": "ABC", "qty": 1}]}
+
+@activity.defn(name=contracts.VALIDATE_ORDER)
+async def validate(order: dict) -> bool:
+    return True
+
+@activity.defn(name=contracts.CHARGE_PAYMENT)
+async def charge(order: dict, payment_id: str) -> dict:
+    return {"status": "charged", "amount": 1}
+
+@activity.defn(name=contracts.PROJECT_STATUS)
+async def project(order_id: str, status: dict, version: int) -> bool:
+    return True
+
+@activity.defn(name=contracts.PREPARE_PACKAGE)
+async def prepare(order: dict) -> str:
+    return "Package ready"
+
+@activity.defn(name=contracts.DISPATCH_CARRIER)
+async def dispatch(order: dict) -> str:
+    return "Dispatched"
+
+async def _run_chain(client: Client, monkeypatch, cas_events: int) -> list:
+    """
+    Run one order through SIGNALS address updates; return (history, replay ms) per run.
+    Replay happens here because it must see the same threshold the runs were made with.
+    """
+    run = uuid.uuid4().hex[:6]
+    monkeypatch.setattr(config, "TASK_QUEUE_ORDERS", f"replay-orders-{run}")
+    monkeypatch.setattr(config, "TASK_QUEUE_SHIPPING", f"replay-shipping-{run}")
+    monkeypatch.setattr(config, "REVIEW_CONTINUE_AS_NEW_EVENTS", cas_events)
+    monkeypatch.setattr(config, "ORDER_SEARCH_ATTRIBUTES", False)  # the test server has none registered
+
+    orders = Worker(client, task_queue=config.TASK_QUEUE_ORDERS, workflows=[OrderWorkflow],
+                    activities=[receive, validate, charge, project], workflow_runner=WORKFLOW_RUNNER)
+    shipping = Worker(client, task_queue=config.TASK_QUEUE_SHIPPING, workflows=[ShippingWorkflow],
+                      activities=[prepare, dispatch], workflow_runner=WORKFLOW_RUNNER)
+    async with orders, shipping:
+        h = await client.start_workflow(OrderWorkflow.run,
+                                        args=[run, f"pay-{run}", {"city": "Amherst"}, order_options()],
+                                        id=f"order-replay-{run}", task_queue=config.TASK_QUEUE_ORDERS)
+        # concurrent bursts so some signals land while a continue-as-new is in flight
+        for base in range(0, SIGNALS, 50):
+            await asyncio.gather(*(h.signal("update_address", {f"k{i}": i})
+                                   for i in range(base, base + 50)))
+        await h.signal("approve")
+        assert await h.result() == "done"
+        address = (await client.get_workflow_handle(h.id).query(OrderWorkflow.status))["address"]
+
+    # no signal lost at any handoff
+    assert all(address.get(f"k{i}") == i for i in range(SIGNALS))
+    assert address["city"] == "Amherst"
+
+    histories, run_id = [], h.run_id
+    while run_id:
+        hist = await client.get_workflow_handle(h.id, run_id=run_id).fetch_history()
+        histories.append(hist)
+        last = hist.events[-1]
+        run_id = (last.workflow_execution_continued_as_new_event_attributes.new_execution_run_id
+                  if last.event_type == EventType.EVENT_TYPE_WORKFLOW_EXECUTION_CONTINUED_AS_NEW else None)
+
+    replayer = Replayer(workflows=[OrderWorkflow], workflow_runner=WORKFLOW_RUNNER)
+    runs = []
+    for hist in histories:
+        t0 = time.perf_counter()
+        await replayer.replay_workflow(hist)
+        runs.append((hist, (time.perf_counter() - t0) * 1000))
+    return runs
+
+async def test_review_history_is_bounded_and_replays_fast(env, monkeypatch):
+    unbounded = await _run_chain(env.client, monkeypatch, cas_events=10 ** 9)
+    bounded = await _run_chain(env.client, monkeypatch, cas_events=200)
+
+    assert len(unbounded) == 1 and len(unbounded[0][0].events) > SIGNALS
+    assert len(bounded) > 1
+    # threshold is checked per workflow task; allow one burst of signals past it
+    assert max(len(h.events) for h, _ in bounded) < 200 + 100
+
+    full_ms = unbounded[0][1]
+    worst_run_ms = max(ms for _, ms in bounded)
+    # what a worker replays after a cache eviction is one run, not the whole review
+    assert worst_run_ms < full_ms
+
+# recorded before the backlog's command changes; see histories/build_baseline.py
+BASELINE_HISTORIES = Path(__file__).with_name("histories")
+
+@pytest.mark.parametrize("settings", [
+    {},
+    {"LOCAL_ACTIVITY_STEPS": frozenset({"receive", "validate"})},
+    {"DISPATCH_MODE": "batched"},
+    {"REVIEW_CONTINUE_AS_NEW_EVENTS": 12},  # the recorded review is longer than that
+    {"ORDER_CLAIM_CHECK": True},
+], ids=["defaults", "local-activity-steps", "batched-dispatch", "review-continue-as-new", "claim-check"])
+async def test_histories_from_before_the_changes_still_replay(monkeypatch, settings):
+    for name, value in settings.items():
+        monkeypatch.setattr(config, name, value)
+    histories = suite.load_histories(BASELINE_HISTORIES)["baseline"]
+    assert len(histories) == 2
+    assert (await suite.replay(histories))["failures"] == []
+
+async def test_replay_flags_an_unguarded_command_change(monkeypatch):
+    # as if the commands added since had shipped without their patch markers
+    monkeypatch.setattr(workflow, "patched", lambda patch_id: True)
+    histories = suite.load_histories(BASELINE_HISTORIES)["baseline"]
+    failures = (await suite.replay(histories))["failures"]
+    assert [f["workflow_id"] for f in failures] == ["order-b-1001"]
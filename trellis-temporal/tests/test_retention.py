@@ -0,0 +1,14 @@
+from datetime import date, datetime
+from retention import expired_partitions, retention_cutoff
+
+def test_expired_partitions_keeps_window_and_ignores_other_tables():
+    names = ["events_default", "events_p2025_09", "events_p2025_10", "events_p2025_11",
+             "events_p2026_10", "events_p2026_12", "events_archive"]
+    # keep 12 months before Oct 2026 -> everything before Oct 2025 goes
+    assert expired_partitions(names, date(2026, 10, 18), 12) == ["events_p2025_09"]
+    assert expired_partitions(names, date(2026, 10, 18), 0) == \
+        ["events_p2025_09", "events_p2025_10", "events_p2025_11"]
+
+def test_retention_cutoff_is_the_first_kept_month():
+    assert retention_cutoff(date(2026, 10, 18), 12) == datetime(2025, 10, 1)
+    assert retention_cutoff(date(2026, 1, 31), 1) == datetime(2025, 12, 1)
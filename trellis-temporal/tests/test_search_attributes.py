@@ -0,0 +1,22 @@
+from temporalio.common import SearchAttributeIndexedValueType
+
+import search_attributes as sa
+
+def test_default_query_selects_running_orders():
+    assert sa.order_query() == "WorkflowType = 'OrderWorkflow' AND ExecutionStatus = 'Running'"
+
+def test_filters_are_anded_in_order():
+    q = sa.order_query("manual_review", "Boston", False)
+    assert q.endswith("AND OrderStep = 'manual_review' AND OrderCity = 'Boston' AND OrderApproved = false")
+
+def test_closed_orders_can_be_included():
+    assert "ExecutionStatus" not in sa.order_query("done", running_only=False)
+
+def test_values_are_quoted():
+    q = sa.order_query(city="O'Hare \\ Annex")
+    assert q.endswith("OrderCity = 'O\\'Hare \\\\ Annex'")
+
+def test_key_types():
+    assert sa.ORDER_STEP.indexed_value_type == SearchAttributeIndexedValueType.KEYWORD
+    assert sa.ORDER_CITY.indexed_value_type == SearchAttributeIndexedValueType.KEYWORD
+    assert sa.ORDER_APPROVED.indexed_value_type == SearchAttributeIndexedValueType.BOOL
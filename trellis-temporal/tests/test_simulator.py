@@ -0,0 +1,88 @@
+import json
+from pathlib import Path
+
+import pytest
+
+import simulator
+from simulator import SimulatedFailure, SimulatedRateLimit, Simulator, StubProfile
+
+NAMES = ("a", "b")
+
+class FakeClock:
+    def __init__(self) -> None:
+        self.t = 100.0
+
+    def __call__(self) -> float:
+        return self.t
+
+def _outcomes(sim, name, n=200):
+    return [sim.plan(name) for _ in range(n)]
+
+def test_same_seed_same_sequence_regardless_of_interleaving():
+    spec = {"*": {"latency_ms": 50, "distribution": "lognormal", "error_rate": 0.2, "timeout_rate": 0.1}}
+    alone = _outcomes(Simulator(spec, NAMES, seed=7), "a")
+    mixed = Simulator(spec, NAMES, seed=7)
+    interleaved = []
+    for _ in range(200):
+        mixed.plan("b")
+        interleaved.append(mixed.plan("a"))
+    assert interleaved == alone
+    assert _outcomes(Simulator(spec, NAMES, seed=8), "a") != alone
+
+def test_rates_and_distributions():
+    sim = Simulator({"a": {"latency_ms": 100, "distribution": "exponential", "error_rate": 0.25,
+                           "timeout_rate": 0.25, "hang_s": 10}}, NAMES, seed=1)
+    plans = _outcomes(sim, "a", 4000)
+    share = {o: sum(p.outcome == o for p in plans) / len(plans) for o in ("ok", "error", "timeout")}
+    assert abs(share["error"] - 0.25) < 0.03 and abs(share["timeout"] - 0.25) < 0.03
+    assert all(9 <= p.latency_s <= 11 for p in plans if p.outcome == "timeout")
+    ok = [p.latency_s for p in plans if p.outcome == "ok"]
+    assert 0.09 < sum(ok) / len(ok) < 0.11  # exponential mean
+    assert StubProfile(latency_ms=100, distribution="lognormal").latency_s(0.5) == pytest.approx(0.1)
+    assert StubProfile(latency_ms=100, distribution="uniform", spread=0.5).latency_s(0.0) == pytest.approx(0.05)
+    assert StubProfile(latency_ms=100, distribution="exponential", max_latency_ms=150).latency_s(0.999) == 0.15
+
+def test_phases_change_the_profile_over_time():
+    clock = FakeClock()
+    sim = Simulator({"*": {"error_rate": 0.0},
+                     "a": {"phases": [{"after_s": 60, "error_rate": 1.0}, {"after_s": 120, "latency_ms": 5}]}},
+                    NAMES, clock=clock)
+    assert sim.plan("a").outcome == "ok"
+    clock.t += 61
+    assert sim.plan("a").outcome == "error" and sim.plan("b").outcome == "ok"
+    clock.t += 60
+    assert sim.profile("a") == StubProfile(error_rate=1.0, latency_ms=5)  # phases accumulate
+
+def test_rate_limit_refills_with_time():
+    clock = FakeClock()
+    sim = Simulator({"a": {"rate_limit_per_s": 2, "burst": 2}}, NAMES, clock=clock)
+    assert [sim.plan("a").outcome for _ in range(3)] == ["ok", "ok", "rate_limited"]
+    clock.t += 0.5
+    assert [sim.plan("a").outcome for _ in range(2)] == ["ok", "rate_limited"]
+
+async def test_call_raises_and_disabled_simulator_is_a_no_op():
+    with pytest.raises(SimulatedFailure):
+        await Simulator({"a": {"error_rate": 1.0}}, NAMES).call("a")
+    with pytest.raises(SimulatedRateLimit):
+        sim = Simulator({"a": {"rate_limit_per_s": 1, "burst": 0}}, NAMES)
+        await sim.call("a")
+    await Simulator({"a": {"error_rate": 1.0}}, NAMES, enabled=False).call("a")
+
+def test_spec_loading_and_validation(tmp_path):
+    assert simulator.load_spec() == simulator.LEGACY
+    f = tmp_path / "sim.json"
+    f.write_text(json.dumps({"a": {"latency_ms": 10}, "b": {"error_rate": 0.5}}))
+    spec = simulator.load_spec(str(f), json.dumps({"b": {"latency_ms": 3}}))
+    assert spec == {"a": {"latency_ms": 10}, "b": {"latency_ms": 3}}
+    with pytest.raises(ValueError, match="unknown stubs"):
+        Simulator({"c": {}}, NAMES)
+    with pytest.raises(ValueError, match="latency"):
+        Simulator({"a": {"latency": 10}}, NAMES)
+    with pytest.raises(ValueError, match="distribution"):
+        Simulator({"a": {"distribution": "pareto"}}, NAMES)
+
+def test_shipped_production_profile_loads():
+    import stubs
+    path = Path(__file__).resolve().parents[1] / "bench" / "sim_production.json"
+    sim = Simulator(simulator.load_spec(str(path)), stubs.STUBS)
+    assert sim.profile("payment_charged").latency_ms == 250
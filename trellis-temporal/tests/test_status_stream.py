@@ -0,0 +1,40 @@
+import asyncio, json, time
+from status_stream import StatusHub
+
+def _notify(order_id, step, version, **kw):
+    return json.dumps({"order_id": order_id, "step": step, "approved": False, "canceled": False,
+                       "version": version, **kw})
+
+async def test_fan_out_to_thousands_of_long_polls_in_one_process():
+    hub = StatusHub()  # no LISTEN connection needed: notifications are fed to dispatch()
+    orders = [f"o-{i}" for i in range(50)]
+    n = 5000
+
+    async def waiter(i):
+        with hub.subscribe(orders[i % len(orders)]) as q:
+            return await hub.next_change(q, "manual_review", timeout=10)
+
+    tasks = [asyncio.create_task(waiter(i)) for i in range(n)]
+    await asyncio.sleep(0)  # let every waiter subscribe
+    assert hub.subscriber_count() == n
+
+    t0 = time.perf_counter()
+    for o in orders:
+        hub.dispatch(_notify(o, "manual_review", 1))  # same step: nobody wakes up
+        hub.dispatch(_notify(o, "charge", 2))
+    results = await asyncio.gather(*tasks)
+    elapsed = time.perf_counter() - t0
+
+    assert all(r["step"] == "charge" for r in results)
+    assert hub.subscriber_count() == 0  # every subscription cleaned up
+    assert elapsed < 5  # tens of ms in practice; generous so a loaded CI box does not flake
+
+async def test_slow_subscriber_keeps_newest_and_timeout_returns_none():
+    hub = StatusHub(queue_size=2)
+    with hub.subscribe("o1") as q:
+        for v, step in enumerate(["receive", "validate", "manual_review"]):
+            hub.dispatch(_notify("o1", step, v))
+        assert [q.get_nowait()["step"] for _ in range(q.qsize())] == ["validate", "manual_review"]
+        assert await hub.next_change(q, None, timeout=0.01) is None
+    assert hub.dispatch(_notify("o1", "done", 9)) == 0
+    assert hub.dispatch("not json") == 0
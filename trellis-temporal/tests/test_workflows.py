@@ -0,0 +1,106 @@
+import asyncio
+import uuid
+
+import pytest
+from temporalio import activity
+from temporalio.worker import Worker
+
+import activity_profiles
+import config
+import contracts
+from bench import replay as suite
+from worker import WORKFLOW_RUNNER
+from workflows import DispatchWorkflow, OrderWorkflow, ShippingWorkflow
+
+@pytest.fixture
+def queues(monkeypatch):
+    run = uuid.uuid4().hex[:6]
+    monkeypatch.setattr(config, "TASK_QUEUE_ORDERS", f"wf-orders-{run}")
+    monkeypatch.setattr(config, "TASK_QUEUE_SHIPPING", f"wf-shipping-{run}")
+    monkeypatch.setattr(config, "ORDER_SEARCH_ATTRIBUTES", False)
+    monkeypatch.setattr(config, "DISPATCH_MODE", "direct")
+
+async def _generate(client, scenarios, orders=3, stand_ins=None):
+    stand_ins = stand_ins or suite.StandIns()
+    orders_w = Worker(client, task_queue=config.TASK_QUEUE_ORDERS, workflows=[OrderWorkflow],
+                      activities=stand_ins.orders_activities(), workflow_runner=WORKFLOW_RUNNER)
+    shipping_w = Worker(client, task_queue=config.TASK_QUEUE_SHIPPING, workflows=[ShippingWorkflow],
+                        activities=stand_ins.shipping_activities(), workflow_runner=WORKFLOW_RUNNER)
+    async with orders_w, shipping_w:
+        return {name: await suite.run_scenario(client, name, orders) for name in scenarios}
+
+async def test_scenarios_reach_expected_outcome_and_replay_cleanly(env, queues):
+    results = await _generate(env.client, suite.SCENARIOS)
+    for name, r in results.items():
+        assert r["outcomes"] == {suite.EXPECTED[name]: 3}, name
+        assert (await suite.replay(r["histories"]))["failures"] == [], name
+    # the retried carrier call costs a second ShippingWorkflow run per order
+    assert (suite.size_stats(results["dispatch_retry"]["histories"])["histories"]
+            > suite.size_stats(results["happy"]["histories"])["histories"])
+
+async def test_declined_charge_releases_the_overlapped_package(env, queues, monkeypatch):
+    monkeypatch.setattr(config, "OVERLAP_PREPARE_CHARGE", True)
+    stand_ins = suite.StandIns()
+    results = await _generate(env.client, ["charge_declined"], orders=2, stand_ins=stand_ins)
+    assert results["charge_declined"]["outcomes"] == {"charge failed": 2}
+    assert sorted(stand_ins.released.values()) == [1, 1]
+    assert not stand_ins.dispatch_calls
+
+async def test_gated_child_that_fails_dispatch_is_replaced_by_an_ungated_one(env, queues, monkeypatch):
+    monkeypatch.setattr(config, "OVERLAP_PREPARE_CHARGE", True)
+    # the carrier fails every attempt of the first child run
+    attempts = activity_profiles.profile(contracts.DISPATCH_CARRIER).max_attempts
+    stand_ins = suite.StandIns(dispatch_failures=attempts)
+    results = await _generate(env.client, ["dispatch_retry"], orders=2, stand_ins=stand_ins)
+    assert results["dispatch_retry"]["outcomes"] == {"done": 2}
+    assert sorted(stand_ins.dispatch_calls.values()) == [attempts + 1] * 2
+    assert (await suite.replay(results["dispatch_retry"]["histories"]))["failures"] == []
+
+async def test_overlap_off_prepares_after_the_charge(env, queues, monkeypatch):
+    monkeypatch.setattr(config, "OVERLAP_PREPARE_CHARGE", False)
+    stand_ins = suite.StandIns()
+    results = await _generate(env.client, ["happy", "charge_declined"], orders=1, stand_ins=stand_ins)
+    assert results["happy"]["outcomes"] == {"done": 1}
+    assert results["charge_declined"]["outcomes"] == {"charge failed": 1}
+    assert not stand_ins.released  # nothing was prepared, nothing to roll back
+    assert (await suite.replay(results["happy"]["histories"]))["failures"] == []
+
+async def test_overlap_is_recorded_per_order(env, queues, monkeypatch):
+    monkeypatch.setattr(config, "OVERLAP_PREPARE_CHARGE", True)
+    results = await _generate(env.client, ["happy"], orders=1)
+    # turned off while those orders are in flight: their replay keeps the overlapped flow
+    monkeypatch.setattr(config, "OVERLAP_PREPARE_CHARGE", False)
+    assert (await suite.replay(results["happy"]["histories"]))["failures"] == []
+
+def test_regressions_respect_tolerances():
+    baseline = {"happy": {"history_events_per_order": 100, "replay_ms_p95": 10.0, "wft_cpu_us_p50": 0}}
+    current = {"happy": {"history_events_per_order": 104, "replay_ms_p95": 16.0, "wft_cpu_us_p50": 50}}
+    lines = suite.regressions(baseline, current, time_tolerance=0.5, size_tolerance=0.05)
+    assert len(lines) == 1 and lines[0].startswith("happy.replay_ms_p95: 10.0 -> 16.0")
+    assert suite.regressions(baseline, current, time_tolerance=0.5, size_tolerance=0.01)[0].startswith(
+        "happy.history_events_per_order")
+
+async def test_dispatcher_ignores_an_enqueue_retried_after_its_batch_went_out(env, queues, monkeypatch):
+    monkeypatch.setattr(config, "DISPATCH_BATCH_SIZE", 1)
+    shipped = []
+
+    @activity.defn(name=contracts.DISPATCH_BATCH)
+    async def dispatch_batch(orders: list) -> list:
+        shipped.extend(o["order_id"] for o in orders)
+        return [{"order_id": o["order_id"], "status": "Dispatched"} for o in orders]
+
+    package = {"order_id": "o-1", "reply_to": "ship-o-1-gone", "order": {"order_id": "o-1"}}
+    async with Worker(env.client, task_queue=config.TASK_QUEUE_SHIPPING, workflows=[DispatchWorkflow],
+                      activities=[dispatch_batch], workflow_runner=WORKFLOW_RUNNER):
+        h = await env.client.start_workflow(DispatchWorkflow.run, args=["east", [package]],
+                                            id=f"dispatch-{uuid.uuid4().hex[:6]}",
+                                            task_queue=config.TASK_QUEUE_SHIPPING)
+        for _ in range(100):
+            if shipped:
+                break
+            await asyncio.sleep(0.05)
+        await h.signal(contracts.DISPATCH_ENQUEUE_SIGNAL, package)  # the activity's retry, arriving late
+        await asyncio.sleep(0.5)  # a second batch would go out right away (size 1)
+        assert await h.query(DispatchWorkflow.pending) == 0
+        await h.terminate()
+    assert shipped == ["o-1"]
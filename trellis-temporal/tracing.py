@@ -0,0 +1,61 @@
+# tracing.py
+"""
+Optional OpenTelemetry tracing (TRELLIS_TRACING=1).
+
+The SDK's TracingInterceptor is added to every Temporal client, so workers
+built on that client trace workflows and activities too, and the API's span for
+a request becomes the parent of the workflow start / signal it sends. With
+tracing off nothing here imports opentelemetry.
+"""
+from __future__ import annotations
+import contextlib
+import logging
+from typing import Any, Dict, Iterator, List, Optional
+
+from config import TRACING_ENABLED
+
+log = logging.getLogger(__name__)
+
+# the contrib interceptor reads opentelemetry from inside workflows
+SANDBOX_PASSTHROUGH = ("opentelemetry",) if TRACING_ENABLED else ()
+
+_tracer: Any = None
+
+def setup(service_name: str) -> None:
+    """Install an OTLP exporting tracer provider if the OpenTelemetry SDK is available."""
+    global _tracer
+    if not TRACING_ENABLED or _tracer is not None:
+        return
+    try:
+        from opentelemetry import trace
+    except ImportError as e:
+        raise RuntimeError("TRELLIS_TRACING=1 needs the opentelemetry-api package") from e
+    try:
+        from opentelemetry.exporter.otlp.proto.grpc.trace_exporter import OTLPSpanExporter
+        from opentelemetry.sdk.resources import Resource
+        from opentelemetry.sdk.trace import TracerProvider
+        from opentelemetry.sdk.trace.export import BatchSpanProcessor
+    except ImportError:
+        # API only: spans go to whatever provider the process was given (e.g. opentelemetry-instrument)
+        log.warning("opentelemetry-sdk / otlp exporter not installed; using the global tracer provider")
+    else:
+        provider = TracerProvider(resource=Resource.create({"service.name": service_name}))
+        provider.add_span_processor(BatchSpanProcessor(OTLPSpanExporter()))
+        trace.set_tracer_provider(provider)
+    _tracer = trace.get_tracer("trellis")
+
+def client_interceptors() -> List[Any]:
+    """Interceptors to add to Client.connect (empty with tracing off)."""
+    if not TRACING_ENABLED:
+        return []
+    from temporalio.contrib.opentelemetry import TracingInterceptor
+    return [TracingInterceptor()]
+
+@contextlib.contextmanager
+def span(name: str, attributes: Optional[Dict[str, Any]] = None) -> Iterator[Any]:
+    """Current span for the block; yields None with tracing off."""
+    if _tracer is None:
+        yield None
+        return
+    with _tracer.start_as_current_span(name, attributes=attributes or {}) as s:
+        yield s
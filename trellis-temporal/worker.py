@@ -1,41 +1,198 @@
 from __future__ import annotations
-import asyncio, os
+import argparse
+import asyncio
+import multiprocessing as mp
+import os
+import signal
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import timedelta
+from typing import List, Optional
+
 from temporalio.client import Client
 from temporalio.worker import Worker
+from temporalio.worker.workflow_sandbox import SandboxedWorkflowRunner, SandboxRestrictions
 
-from config import TASK_QUEUE_ORDERS, TASK_QUEUE_SHIPPING, DATABASE_URL
-from workflows import OrderWorkflow, ShippingWorkflow
+import codec
+import db
+import metrics
+import search_attributes
+import tracing
+from interceptors import WorkerMetricsInterceptor
+from config import (
+    TASK_QUEUE_ORDERS,
+    TASK_QUEUE_SHIPPING,
+    DATABASE_URL,
+    TEMPORAL_ADDRESS,
+    WORKER_METRICS_PORT,
+    ORDERS_WORKER_TUNING,
+    SHIPPING_WORKER_TUNING,
+    ORDERS_ACTIVITY_THREADS,
+    SHIPPING_ACTIVITY_THREADS,
+    WORKER_GRACEFUL_SHUTDOWN_S,
+    ORDER_SEARCH_ATTRIBUTES,
+)
+from workflows import OrderWorkflow, ShippingWorkflow, DispatchWorkflow
 from activities import (
     receive_order_act,
     validate_order_act,
     charge_payment_act,
     prepare_package_act,
+    release_package_act,
     dispatch_carrier_act,
+    project_status_act,
+    set_order_address_act,
+    enqueue_dispatch_act,
+    dispatch_batch_act,
 )
 
-async def main():
-    print(f"[worker] DATABASE_URL = {DATABASE_URL}", flush=True)
+QUEUES = ("orders", "shipping")
 
-    client = await Client.connect("localhost:7233")
+# Modules imported once per process and shared with every sandboxed workflow run,
+# instead of being re-imported per run. Only side-effect-free modules belong here.
+SANDBOX_PASSTHROUGH = ("config", "contracts", "activity_profiles", "search_attributes",
+                       *tracing.SANDBOX_PASSTHROUGH)
+WORKFLOW_RUNNER = SandboxedWorkflowRunner(
+    restrictions=SandboxRestrictions.default.with_passthrough_modules(*SANDBOX_PASSTHROUGH)
+)
 
-    # Orders worker: parent workflow + its activities
-    orders_worker = Worker(
-        client,
-        task_queue=TASK_QUEUE_ORDERS,
-        workflows=[OrderWorkflow],
-        activities=[receive_order_act, validate_order_act, charge_payment_act],
-    )
+def build_worker(client: Client, queue: str) -> Worker:
+    if queue == "orders":
+        # Orders worker: parent workflow + its activities
+        task_queue, workflows, activities = (
+            TASK_QUEUE_ORDERS,
+            [OrderWorkflow],
+            [receive_order_act, validate_order_act, charge_payment_act, project_status_act,
+             set_order_address_act],
+        )
+        tuning, threads = ORDERS_WORKER_TUNING, ORDERS_ACTIVITY_THREADS
+    elif queue == "shipping":
+        # Shipping worker: child workflow, region dispatchers + their activities
+        task_queue, workflows, activities = (
+            TASK_QUEUE_SHIPPING,
+            [ShippingWorkflow, DispatchWorkflow],
+            [prepare_package_act, release_package_act, dispatch_carrier_act, enqueue_dispatch_act,
+             dispatch_batch_act],
+        )
+        tuning, threads = SHIPPING_WORKER_TUNING, SHIPPING_ACTIVITY_THREADS
+    else:
+        raise ValueError(f"unknown queue {queue!r}, expected one of {QUEUES}")
 
-    # Shipping worker: child workflow + its activities
-    shipping_worker = Worker(
+    return Worker(
         client,
-        task_queue=TASK_QUEUE_SHIPPING,
-        workflows=[ShippingWorkflow],
-        activities=[prepare_package_act, dispatch_carrier_act],
+        task_queue=task_queue,
+        workflows=workflows,
+        activities=activities,
+        workflow_runner=WORKFLOW_RUNNER,
+        # per-activity / per-step metrics; tracing comes in through the client's interceptors
+        interceptors=[WorkerMetricsInterceptor()],
+        activity_executor=ThreadPoolExecutor(threads) if threads > 0 else None,
+        graceful_shutdown_timeout=timedelta(seconds=WORKER_GRACEFUL_SHUTDOWN_S),
+        **tuning,
     )
 
-    print(f"[worker] polling queues: {TASK_QUEUE_ORDERS} and {TASK_QUEUE_SHIPPING}", flush=True)
-    await asyncio.gather(orders_worker.run(), shipping_worker.run())
+async def run_queues(queues: List[str], metrics_port: int = WORKER_METRICS_PORT, tag: str = "worker") -> None:
+    """Run workers for `queues` in this process until SIGINT/SIGTERM, then drain them."""
+    print(f"[{tag}] DATABASE_URL = {DATABASE_URL}", flush=True)
+
+    tracing.setup("trellis-worker")
+    client = await Client.connect(TEMPORAL_ADDRESS, data_converter=codec.data_converter(),
+                                  interceptors=tracing.client_interceptors())
+    workers = [build_worker(client, q) for q in queues]
+    if ORDER_SEARCH_ATTRIBUTES and "orders" in queues:
+        try:
+            added = await search_attributes.ensure_registered(client)
+            if added:
+                print(f"[{tag}] registered search attributes: {', '.join(added)}", flush=True)
+        except Exception as e:
+            # upserts of unregistered attributes fail workflow tasks; say so loudly, keep polling
+            print(f"[{tag}] could not register search attributes ({e!r}); "
+                  f"register them, or set TRELLIS_ORDER_SEARCH_ATTRIBUTES=0 for the API and workers "
+                  f"(orders already started keep upserting until they finish)", flush=True)
+
+    if metrics_port:
+        await metrics.serve(metrics_port)
+        print(f"[{tag}] metrics on :{metrics_port}/metrics", flush=True)
+
+    stop = asyncio.Event()
+    loop = asyncio.get_running_loop()
+    for sig in (signal.SIGINT, signal.SIGTERM):
+        loop.add_signal_handler(sig, stop.set)
+
+    print(f"[{tag}] polling queues: {', '.join(w.task_queue for w in workers)}", flush=True)
+    runs = [asyncio.create_task(w.run()) for w in workers]
+    stopper = asyncio.create_task(stop.wait())
+    try:
+        # a worker task only finishes early on a fatal error; treat that like a stop
+        await asyncio.wait([stopper, *runs], return_when=asyncio.FIRST_COMPLETED)
+        print(f"[{tag}] shutting down", flush=True)
+        await asyncio.gather(*(w.shutdown() for w in workers), return_exceptions=True)
+        await asyncio.gather(*runs)  # re-raises a fatal worker error
+    finally:
+        stopper.cancel()
+        # flush buffered audit events before the pool goes away
+        await db.close_pool()
+
+def _child_main(queue: str, index: int, metrics_port: int) -> None:
+    asyncio.run(run_queues([queue], metrics_port=metrics_port, tag=f"worker {queue}#{index}"))
+
+def launch(procs: dict) -> int:
+    """
+    Fork procs[queue] worker processes per queue and supervise them.
+    SIGINT/SIGTERM -> SIGTERM to every child (each drains gracefully), then wait.
+    If any child exits on its own, the rest are stopped the same way.
+    """
+    ctx = mp.get_context("spawn")
+    children: List[mp.Process] = []
+    port = WORKER_METRICS_PORT
+    for queue, n in procs.items():
+        for i in range(n):
+            child_port = port + len(children) if port else 0
+            p = ctx.Process(target=_child_main, args=(queue, i, child_port), name=f"worker-{queue}-{i}")
+            p.start()
+            children.append(p)
+    print(f"[launcher] started {len(children)} worker processes: {procs}", flush=True)
+
+    stopping = False
+
+    def on_signal(signum, frame) -> None:
+        nonlocal stopping
+        stopping = True
+
+    signal.signal(signal.SIGINT, on_signal)
+    signal.signal(signal.SIGTERM, on_signal)
+
+    while not stopping and all(p.is_alive() for p in children):
+        time.sleep(0.5)
+    if not stopping:
+        dead = [p.name for p in children if not p.is_alive()]
+        print(f"[launcher] {dead} exited; stopping the rest", flush=True)
+
+    for p in children:
+        if p.is_alive():
+            os.kill(p.pid, signal.SIGTERM)
+    deadline = time.monotonic() + WORKER_GRACEFUL_SHUTDOWN_S + 5
+    for p in children:
+        p.join(max(0.0, deadline - time.monotonic()))
+        if p.is_alive():
+            print(f"[launcher] {p.name} did not stop in time; killing", flush=True)
+            p.kill()
+            p.join()
+    return 0 if stopping else 1
+
+def main(argv: Optional[List[str]] = None) -> int:
+    ap = argparse.ArgumentParser(description="Run the orders and shipping workers.")
+    ap.add_argument("--queues", default=",".join(QUEUES),
+                    help="queues to poll in this process (default: both)")
+    ap.add_argument("--orders-procs", type=int, default=0, help="launcher mode: orders worker processes")
+    ap.add_argument("--shipping-procs", type=int, default=0, help="launcher mode: shipping worker processes")
+    args = ap.parse_args(argv)
+
+    if args.orders_procs or args.shipping_procs:
+        return launch({"orders": args.orders_procs, "shipping": args.shipping_procs})
+    asyncio.run(run_queues([q.strip() for q in args.queues.split(",") if q.strip()]))
+    return 0
 
 if __name__ == "__main__":
-    asyncio.run(main())
+    sys.exit(main())
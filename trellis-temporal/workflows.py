@@ -1,21 +1,53 @@
 # workflows.py
 from __future__ import annotations
+import asyncio
 from datetime import timedelta
-from typing import Any, Dict, Optional
+from typing import Any, Dict, List, Optional
 
 from temporalio import workflow
 from temporalio.common import RetryPolicy
+from temporalio.exceptions import ApplicationError
 
-from config import TASK_QUEUE_ORDERS, TASK_QUEUE_SHIPPING
-from activities import (
-    receive_order_act,
-    validate_order_act,
-    charge_payment_act,
-    prepare_package_act,
-    dispatch_carrier_act,
-)
+# Light, deterministic modules only; the worker passes them through the sandbox.
+# Activities are referenced by name (contracts) so activities.py / db / asyncpg stay out.
+with workflow.unsafe.imports_passed_through():
+    import config
+    from config import (
+        TASK_QUEUE_ORDERS,
+        TASK_QUEUE_SHIPPING,
+        LOCAL_ACTIVITY_STEPS,
+        DISPATCH_BATCH_SIZE,
+        DISPATCH_BATCH_WINDOW_S,
+        DISPATCH_REPLY_TIMEOUT_S,
+        DISPATCH_CONTINUE_AS_NEW_EVENTS,
+        DISPATCH_SENT_MEMORY,
+        REVIEW_CONTINUE_AS_NEW_EVENTS,
+        REVIEW_CONTINUE_AS_NEW_BYTES,
+        ORDER_CLAIM_CHECK,
+    )
+    from contracts import (
+        RECEIVE_ORDER,
+        VALIDATE_ORDER,
+        CHARGE_PAYMENT,
+        PREPARE_PACKAGE,
+        DISPATCH_CARRIER,
+        PROJECT_STATUS,
+        ENQUEUE_DISPATCH,
+        DISPATCH_BATCH,
+        DISPATCH_ENQUEUE_SIGNAL,
+        DISPATCH_RESULT_SIGNAL,
+        SET_ORDER_ADDRESS,
+        RELEASE_PACKAGE,
+        SHIPPING_RELEASE_SIGNAL,
+        SHIPPING_ABORT_SIGNAL,
+        PACKAGE_PREPARED_SIGNAL,
+        dispatch_region,
+        is_order_ref,
+    )
+    from activity_profiles import activity_options
+    from search_attributes import ORDER_APPROVED, ORDER_CITY, ORDER_STEP
 
-ACT_TIMEOUT = timedelta(seconds=1)
+# ShippingWorkflow child retries; activity timeouts / retries come from activity_profiles
 RETRY = RetryPolicy(
     initial_interval=timedelta(milliseconds=500),
     backoff_coefficient=1.5,
@@ -25,17 +57,77 @@ RETRY = RetryPolicy(
 
 @workflow.defn
 class ShippingWorkflow:
+    """
+    Prepare the package, then dispatch it. Gated (started while the parent still charges
+    the payment): after preparing, wait for `release` (dispatch, with the order as it is
+    now) or `abort` (release the package and end without dispatching).
+    `dispatch_mode` is the parent's recorded order_options()["dispatch_mode"].
+    """
+
+    def __init__(self) -> None:
+        self._dispatch_result: Optional[Dict[str, Any]] = None
+        self._released: Optional[Dict[str, Any]] = None
+        self._abort_reason: Optional[str] = None
+
+    @workflow.signal(name=DISPATCH_RESULT_SIGNAL)
+    def dispatch_result(self, result: Dict[str, Any]) -> None:
+        self._dispatch_result = result
+
+    @workflow.signal(name=SHIPPING_RELEASE_SIGNAL)
+    def release(self, order: Dict[str, Any]) -> None:
+        self._released = order
+
+    @workflow.signal(name=SHIPPING_ABORT_SIGNAL)
+    def abort(self, reason: str) -> None:
+        self._abort_reason = reason
+
+    async def _dispatch_batched(self, order: Dict[str, Any]) -> None:
+        """Queue on the region's DispatchWorkflow and wait for it to report this package."""
+        package = {"order_id": order.get("order_id"), "reply_to": workflow.info().workflow_id, "order": order}
+        await workflow.execute_activity(
+            ENQUEUE_DISPATCH, args=[dispatch_region(order), package],
+            **activity_options(ENQUEUE_DISPATCH)
+        )
+        await workflow.wait_condition(
+            lambda: self._dispatch_result is not None,
+            timeout=timedelta(seconds=DISPATCH_REPLY_TIMEOUT_S),
+        )
+        if self._dispatch_result.get("status") != "Dispatched":
+            raise ApplicationError(f"batched dispatch failed: {self._dispatch_result}")
+
+    async def _await_gate(self, order: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+        """The released order, or None after rolling the package back on abort."""
+        parent_id = workflow.info().parent_workflow_id
+        if parent_id:
+            await workflow.signal_external_workflow(parent_id, PACKAGE_PREPARED_SIGNAL)
+        await workflow.wait_condition(lambda: self._released is not None or self._abort_reason is not None)
+        if self._abort_reason is None:
+            return self._released
+        workflow.logger.info("shipping aborted (%s); releasing package", self._abort_reason)
+        await workflow.execute_activity(
+            RELEASE_PACKAGE, args=[order],
+            **activity_options(RELEASE_PACKAGE)
+        )
+        return None
+
     @workflow.run
-    async def run(self, order: Dict[str, Any]) -> str:
+    async def run(self, order: Dict[str, Any], gated: bool = False, dispatch_mode: str = "direct") -> str:
         try:
             await workflow.execute_activity(
-                prepare_package_act, args=[order],
-                start_to_close_timeout=ACT_TIMEOUT, retry_policy=RETRY
-            )
-            await workflow.execute_activity(
-                dispatch_carrier_act, args=[order],
-                start_to_close_timeout=ACT_TIMEOUT, retry_policy=RETRY
+                PREPARE_PACKAGE, args=[order],
+                **activity_options(PREPARE_PACKAGE)
             )
+            if gated:
+                order = await self._await_gate(order)
+                if order is None:
+                    return "aborted"
+            if dispatch_mode == "batched":
+                await self._dispatch_batched(order)
+            else:
+                await workflow.execute_activity(
+                    DISPATCH_CARRIER, args=[order],
+                    **activity_options(DISPATCH_CARRIER)
+                )
             return "ok"
         except Exception as e:
             parent_id = workflow.info().parent_workflow_id
@@ -45,6 +137,103 @@ class ShippingWorkflow:
                 )
             raise
 
+@workflow.defn
+class DispatchWorkflow:
+    """
+    Long-lived carrier consolidation, one per region (id: {DISPATCH_WORKFLOW_PREFIX}-{region}).
+    Packages arrive as `enqueue` signals; a batch goes out when DISPATCH_BATCH_SIZE packages
+    are waiting or DISPATCH_BATCH_WINDOW_S after the first one, whichever comes first.
+    Each package's result is signalled back to its `reply_to` workflow.
+    Continues-as-new past DISPATCH_CONTINUE_AS_NEW_EVENTS, carrying unsent packages and
+    the reply_to ids of the last DISPATCH_SENT_MEMORY shipped ones.
+    """
+
+    def __init__(self) -> None:
+        # keyed by reply_to so a retried enqueue does not ship twice while pending
+        self._pending: Dict[str, Dict[str, Any]] = {}
+        # ...or after its batch went out (insertion-ordered, oldest first)
+        self._sent: Dict[str, None] = {}
+        self._batches = 0
+
+    @workflow.signal(name=DISPATCH_ENQUEUE_SIGNAL)
+    def enqueue(self, package: Dict[str, Any]) -> None:
+        reply_to = package["reply_to"]
+        if reply_to in self._sent:
+            workflow.logger.info("package for %s already shipped; ignoring repeated enqueue", reply_to)
+            return
+        self._pending.setdefault(reply_to, package)
+
+    def _remember_sent(self, reply_to: str) -> None:
+        self._sent[reply_to] = None
+        while len(self._sent) > DISPATCH_SENT_MEMORY:
+            del self._sent[next(iter(self._sent))]
+
+    @workflow.query
+    def pending(self) -> int:
+        return len(self._pending)
+
+    async def _reply(self, reply_to: str, result: Dict[str, Any]) -> None:
+        try:
+            await workflow.signal_external_workflow(reply_to, DISPATCH_RESULT_SIGNAL, args=[result])
+        except Exception as e:  # requester already gone (timed out / terminated)
+            workflow.logger.warning("dispatch reply to %s failed: %s", reply_to, e)
+
+    @workflow.run
+    async def run(self, region: str, pending: List[Dict[str, Any]], sent: Optional[List[str]] = None) -> None:
+        for reply_to in sent or []:
+            self._remember_sent(reply_to)
+        for reply_to in [r for r in self._pending if r in self._sent]:  # signalled before run() started
+            del self._pending[reply_to]
+        for package in pending or []:
+            self.enqueue(package)
+        # runs recorded before the sent memory shipped every enqueue they got
+        remember = workflow.patched("dispatch-sent-memory")
+        while True:
+            await workflow.wait_condition(lambda: bool(self._pending))
+            try:
+                await workflow.wait_condition(
+                    lambda: len(self._pending) >= DISPATCH_BATCH_SIZE,
+                    timeout=timedelta(seconds=DISPATCH_BATCH_WINDOW_S),
+                )
+            except asyncio.TimeoutError:
+                pass  # window closed: ship what we have
+
+            keys = list(self._pending)[:DISPATCH_BATCH_SIZE]
+            batch = [self._pending.pop(k) for k in keys]
+            try:
+                results = await workflow.execute_activity(
+                    DISPATCH_BATCH, args=[[p["order"] for p in batch]],
+                    **activity_options(DISPATCH_BATCH)
+                )
+            except Exception as e:
+                results = [{"order_id": p["order_id"], "status": "failed", "error": str(e)} for p in batch]
+            await asyncio.gather(*(self._reply(p["reply_to"], r) for p, r in zip(batch, results)))
+            if remember:
+                # failed packages are not remembered: the retried ShippingWorkflow (same id) re-enqueues
+                for p, r in zip(batch, results):
+                    if r.get("status") == "Dispatched":
+                        self._remember_sent(p["reply_to"])
+            self._batches += 1
+
+            if (workflow.info().get_current_history_length() >= DISPATCH_CONTINUE_AS_NEW_EVENTS
+                    or workflow.info().is_continue_as_new_suggested()):
+                # let in-flight signal handlers land in _pending before handing it over
+                await workflow.wait_condition(workflow.all_handlers_finished)
+                workflow.continue_as_new(args=[region, list(self._pending.values()), list(self._sent)])
+
+def order_options() -> Dict[str, Any]:
+    """
+    Settings that change which commands an order emits, read from config by whoever starts
+    the order and passed as OrderWorkflow's `options`. A run keeps them for its whole life
+    (continue-as-new included), so changing a setting only affects orders started after it:
+    replay never re-reads them. Runs started without options take the original flow.
+    """
+    return {
+        "overlap_prepare_charge": config.OVERLAP_PREPARE_CHARGE,
+        "search_attributes": config.ORDER_SEARCH_ATTRIBUTES,
+        "dispatch_mode": config.DISPATCH_MODE,
+    }
+
 @workflow.defn
 class OrderWorkflow:
     def __init__(self) -> None:
@@ -53,82 +242,288 @@ class OrderWorkflow:
         self._dispatch_fail_reason: Optional[str] = None
         self._step: str = "init"
         self._address: Dict[str, Any] = {}
+        self._order_id: str = ""
+        # read model projection (orders table): last written version + pending change flag
+        self._status_version: int = 0
+        self._status_dirty: bool = False
+        # claim-check snapshot version (config.ORDER_CLAIM_CHECK)
+        self._snapshot_version: int = 0
+        # (step, workflow time entered) pairs; drive.py derives per-step latency from it
+        self._timeline: List[Dict[str, Any]] = []
+        # steps running alongside _step (e.g. "prepare" while charging), in start order
+        self._side_steps: List[str] = []
+        # order_options() as recorded at start
+        self._options: Dict[str, Any] = {}
 
     @workflow.signal
     async def approve(self) -> None:
         self._approved = True
+        self._status_dirty = True
 
     @workflow.signal
     async def cancel(self) -> None:
         self._canceled = True
+        self._status_dirty = True
 
     @workflow.signal
     async def update_address(self, address: Dict[str, Any]) -> None:
         if isinstance(address, dict):
             self._address.update(address)
+            self._status_dirty = True
 
     @workflow.signal
     async def dispatch_failed(self, reason: str) -> None:
         self._dispatch_fail_reason = reason
 
+    @workflow.signal(name=PACKAGE_PREPARED_SIGNAL)
+    def package_prepared(self) -> None:
+        if "prepare" in self._side_steps:
+            self._side_steps.remove("prepare")
+            self._status_dirty = True
+
     @workflow.query
     def status(self) -> Dict[str, Any]:
+        """`step` is the order's main step; `active` lists every step in progress, `step` first."""
         return {
             "approved": self._approved,
             "canceled": self._canceled,
             "step": self._step,
+            "active": [self._step, *self._side_steps],
             "address": self._address,
         }
 
-    @workflow.run
-    async def run(self, order_id: str, payment_id: str, address: Dict[str, Any]) -> str:
-        self._address = dict(address or {})
+    @staticmethod
+    def _next_version(last: int) -> int:
+        # workflow time in µs keeps versions increasing across runs of the same order id
+        return max(int(workflow.now().timestamp() * 1_000_000), last + 1)
 
-        self._step = "receive"
-        order = await workflow.execute_activity(
-            receive_order_act, args=[order_id],
-            start_to_close_timeout=ACT_TIMEOUT, retry_policy=RETRY
+    async def _order_arg(self, order: Dict[str, Any]) -> Dict[str, Any]:
+        """
+        The order as handed to activities / ShippingWorkflow, with the current address.
+        A claim-check reference whose address changed gets its snapshot moved to a new version.
+        """
+        if not is_order_ref(order):
+            return {**order, "address": self._address}
+        if order["address"] == self._address:
+            return order
+        version = self._next_version(self._snapshot_version)
+        await workflow.execute_local_activity(
+            SET_ORDER_ADDRESS, args=[self._order_id, self._address, version],
+            **activity_options(SET_ORDER_ADDRESS, local=True)
         )
-        order = {**order, "address": self._address}
+        self._snapshot_version = version
+        return {**order, "address": dict(self._address), "snapshot_version": version}
 
-        self._step = "validate"
-        await workflow.execute_activity(
-            validate_order_act, args=[order],
-            start_to_close_timeout=ACT_TIMEOUT, retry_policy=RETRY
+    def _upsert_search_attributes(self) -> None:
+        """Index step / city / approval for visibility queries; only upserts what changed."""
+        if not self._options.get("search_attributes"):
+            return
+        # info() reflects earlier upserts and attributes carried over by continue-as-new
+        current = workflow.info().typed_search_attributes
+        wanted = [(ORDER_STEP, self._step), (ORDER_APPROVED, self._approved)]
+        city = self._address.get("city")
+        if isinstance(city, str):
+            wanted.append((ORDER_CITY, city))
+        updates = [key.value_set(value) for key, value in wanted if current.get(key) != value]
+        if updates:
+            workflow.upsert_search_attributes(updates)
+
+    async def _project_status(self) -> None:
+        """Push status() into the orders read model. Best effort: never fails the order."""
+        self._upsert_search_attributes()
+        self._status_dirty = False
+        if not workflow.patched("order-status-projection"):
+            return  # started before the read model existed: its history has no projections
+        self._status_version = self._next_version(self._status_version)
+        try:
+            await workflow.execute_local_activity(
+                PROJECT_STATUS, args=[self._order_id, self.status(), self._status_version],
+                **activity_options(PROJECT_STATUS, local=True)
+            )
+        except Exception as e:
+            workflow.logger.warning("status projection failed: %s", e)
+
+    async def _run_step_activity(self, step: str, activity: str, args: List[Any]) -> Any:
+        """
+        Run a step's activity as a local or regular activity per config.LOCAL_ACTIVITY_STEPS.
+        Runs recorded without the patch marker keep regular activities, whatever the setting.
+        """
+        if step in LOCAL_ACTIVITY_STEPS and workflow.patched("local-activity-steps"):
+            return await workflow.execute_local_activity(
+                activity, args=args, **activity_options(activity, local=True)
+            )
+        return await workflow.execute_activity(
+            activity, args=args, **activity_options(activity)
         )
 
-        self._step = "manual_review"
-        # open-ended deterministic wait (overall 15s run_timeout still applies)
-        await workflow.wait_condition(lambda: self._approved or self._canceled)
+    def _dispatch_mode(self) -> str:
+        return self._options.get("dispatch_mode", "direct")
+
+    async def _set_step(self, step: str) -> None:
+        self._step = step
+        self._timeline.append({"step": step, "at": workflow.now().timestamp()})
+        await self._project_status()
+
+    @workflow.query
+    def timeline(self) -> List[Dict[str, Any]]:
+        return self._timeline
+
+    async def _signal_shipping(self, child_id: str, signal: str, arg: Any) -> None:
+        # the gated child has no retry policy, so there is one run to signal; a child
+        # that already failed is handled by awaiting it
+        try:
+            await workflow.get_external_workflow_handle(child_id).signal(signal, arg)
+        except Exception as e:
+            workflow.logger.warning("%s signal to %s failed: %s", signal, child_id, e)
+
+    async def _await_child(self, child: workflow.ChildWorkflowHandle) -> Any:
+        """Wait for a child, projecting status changes (e.g. package prepared) as they happen."""
+        while not child.done():
+            await workflow.wait_condition(lambda: child.done() or self._status_dirty)
+            if self._status_dirty:
+                await self._project_status()
+        return await child
+
+    def _review_history_full(self) -> bool:
+        info = workflow.info()
+        return (info.get_current_history_length() >= REVIEW_CONTINUE_AS_NEW_EVENTS
+                or info.get_current_history_size() >= REVIEW_CONTINUE_AS_NEW_BYTES
+                or info.is_continue_as_new_suggested())
+
+    def _carry_over(self, order: Dict[str, Any]) -> Dict[str, Any]:
+        """State handed to the next run when manual_review continues-as-new."""
+        return {
+            "order": order,
+            "approved": self._approved,
+            "canceled": self._canceled,
+            "step": self._step,
+            "address": self._address,
+            "status_version": self._status_version,
+            "timeline": self._timeline,
+        }
+
+    def _restore(self, resume: Dict[str, Any]) -> Dict[str, Any]:
+        # signals may already have been applied to this run before run() starts; keep them
+        self._approved = self._approved or resume["approved"]
+        self._canceled = self._canceled or resume["canceled"]
+        self._address = {**resume["address"], **self._address}
+        self._step = resume["step"]
+        self._status_version = resume["status_version"]
+        self._timeline = resume["timeline"]
+        self._snapshot_version = resume["order"].get("snapshot_version", 0)
+        return resume["order"]
+
+    @workflow.run
+    async def run(self, order_id: str, payment_id: str, address: Dict[str, Any],
+                  options: Optional[Dict[str, Any]] = None, resume: Optional[Dict[str, Any]] = None) -> str:
+        self._order_id = order_id
+        self._options = options or {}
+        if resume:
+            # continued from a long manual_review: receive/validate already ran
+            order = self._restore(resume)
+        else:
+            self._address = {**(address or {}), **self._address}
+
+            await self._set_step("receive")
+            receive_args: List[Any] = [order_id]
+            if ORDER_CLAIM_CHECK and workflow.patched("order-claim-check"):
+                # receive stores the snapshot and returns only a reference
+                self._snapshot_version = self._next_version(0)
+                receive_args.append({"address": dict(self._address), "version": self._snapshot_version})
+            order = await self._run_step_activity("receive", RECEIVE_ORDER, receive_args)
+            order = await self._order_arg(order)
+
+            await self._set_step("validate")
+            await self._run_step_activity("validate", VALIDATE_ORDER, [order])
+
+            await self._set_step("manual_review")
+        # open-ended deterministic wait; address updates while waiting are projected as they
+        # arrive, and history is bounded by handing the state to a fresh run (runs recorded
+        # before that existed wait in one run, as they did)
+        can_continue = workflow.patched("review-continue-as-new")
+        while not (self._approved or self._canceled):
+            await workflow.wait_condition(
+                lambda: self._approved or self._canceled or self._status_dirty
+                or (can_continue and self._review_history_full())
+            )
+            if self._approved or self._canceled:
+                break
+            if self._status_dirty:
+                await self._project_status()
+            if can_continue and self._review_history_full():
+                # signals handled so far are in the carried state; any that arrive after
+                # this task make the server retry it, so none are lost at the handoff
+                await workflow.wait_condition(workflow.all_handlers_finished)
+                workflow.continue_as_new(args=[order_id, payment_id, {}, self._options, self._carry_over(order)])
         if self._canceled:
+            await self._project_status()
             raise RuntimeError("Canceled in review")
 
-        self._step = "charge"
-        order = {**order, "address": self._address}
-        await workflow.execute_activity(
-            charge_payment_act, args=[order, payment_id],
-            start_to_close_timeout=ACT_TIMEOUT, retry_policy=RETRY
-        )
+        child_id = f"ship-{order_id}-{workflow.info().run_id[:6]}"
+        shipping = None
+        if self._options.get("overlap_prepare_charge"):
+            # prepare does not need the payment: start it now, dispatch waits for the charge.
+            # No retry policy: a new run would wait for a release nobody re-sends; a failed
+            # gated child is replaced by the ungated retry below instead.
+            self._side_steps = ["prepare"]
+            await self._set_step("charge")
+            order = await self._order_arg(order)
+            shipping = await workflow.start_child_workflow(
+                ShippingWorkflow.run,
+                args=[order, True, self._dispatch_mode()],
+                id=child_id,
+                task_queue=TASK_QUEUE_SHIPPING,
+            )
+            try:
+                await workflow.execute_activity(
+                    CHARGE_PAYMENT, args=[order, payment_id],
+                    **activity_options(CHARGE_PAYMENT)
+                )
+            except Exception as e:
+                # roll the prepared package back before failing the order
+                await self._signal_shipping(child_id, SHIPPING_ABORT_SIGNAL, f"charge failed: {e}")
+                try:
+                    await shipping
+                except Exception as rollback_error:
+                    workflow.logger.warning("package rollback failed: %s", rollback_error)
+                self._side_steps = []
+                await self._project_status()
+                raise
+        else:
+            await self._set_step("charge")
+            order = await self._order_arg(order)
+            await workflow.execute_activity(
+                CHARGE_PAYMENT, args=[order, payment_id],
+                **activity_options(CHARGE_PAYMENT)
+            )
 
-        self._step = "ship"
+        await self._set_step("ship")
         attempt = 0
         while True:
-            child_id = f"ship-{order_id}-{workflow.info().run_id[:6]}"
+            order = await self._order_arg(order)
             try:
-                await workflow.execute_child_workflow(
-                    ShippingWorkflow.run,
-                    args=[{**order, "address": self._address}],
-                    id=child_id,
-                    task_queue=TASK_QUEUE_SHIPPING,
-                    retry_policy=RETRY,
-                )
+                if shipping is not None:
+                    # dispatch with the address as it is now, not as it was when prepare started
+                    await self._signal_shipping(child_id, SHIPPING_RELEASE_SIGNAL, order)
+                    await self._await_child(shipping)
+                else:
+                    await workflow.execute_child_workflow(
+                        ShippingWorkflow.run,
+                        args=[order, False, self._dispatch_mode()],
+                        id=child_id,
+                        task_queue=TASK_QUEUE_SHIPPING,
+                        retry_policy=RETRY,
+                    )
                 break
             except Exception:
                 if self._dispatch_fail_reason and attempt == 0:
+                    # retry with a fresh, ungated child: the charge is done
                     self._dispatch_fail_reason = None
+                    shipping = None
+                    self._side_steps = []
                     attempt += 1
                     continue
                 raise
 
-        self._step = "done"
+        await self._set_step("done")
         return "done"